@@ -167,12 +167,27 @@ bool UsdImagingLiteEngine::GetRendererAov(TfToken const &id, void *buf)
 {
     SdfPath renderBufferId = _taskDataDelegate->GetDelegateID().AppendElementString("aov_" + id.GetString());
     HdRenderBuffer *rBuf = static_cast<HdRenderBuffer*>(_renderIndex->GetBprim(HdPrimTypeTokens->renderBuffer, renderBufferId));
+    if (!rBuf) {
+        TF_RUNTIME_ERROR("Could not get \"%s\" AOV: it isn't set\n", id.GetText());
+        return false;
+    }
+
     void *data = rBuf->Map();
     memcpy(buf, data, rBuf->GetWidth() * rBuf->GetHeight() * HdDataSizeOfFormat(rBuf->GetFormat()));
     rBuf->Unmap();
     return true;
 }
 
+HdFormat UsdImagingLiteEngine::GetRendererAovFormat(TfToken const &id) const
+{
+    SdfPath renderBufferId = _taskDataDelegate->GetDelegateID().AppendElementString("aov_" + id.GetString());
+    if (!_renderIndex->GetBprim(HdPrimTypeTokens->renderBuffer, renderBufferId)) {
+        return HdFormatInvalid;
+    }
+
+    return _taskDataDelegate->GetRenderBufferDescriptor(renderBufferId).format;
+}
+
 UsdImagingGLRendererSettingsList UsdImagingLiteEngine::GetRendererSettingsList() const
 {
     HdRenderDelegate *_renderDelegate = _renderIndex->GetRenderDelegate();
@@ -228,6 +243,7 @@ void UsdImagingLiteEngine::SetRendererSetting(TfToken const& id, VtValue const&
 void UsdImagingLiteEngine::Render(UsdPrim root, const UsdImagingLiteRenderParams &params)
 {
     _delegate->Populate(root);
+    _delegate->SetTime(params.frame);
 
     SdfPath renderTaskId = _taskDataDelegate->GetDelegateID().AppendElementString("renderTask");
     _renderIndex->InsertTask<HdRenderTask>(_taskDataDelegate, renderTaskId);
@@ -87,6 +87,10 @@ public:
 
     USDIMAGINGLITE_API
     bool GetRendererAov(TfToken const &id, void *buf);
+
+    /// Returns format of AOV render buffer or HdFormatInvalid if AOV isn't set
+    USDIMAGINGLITE_API
+    HdFormat GetRendererAovFormat(TfToken const &id) const;
     /// @}
 
     /// Returns the list of renderer settings.
@@ -29,6 +29,7 @@
 
 #include "pxr/pxr.h"
 #include "engine.h"
+#include "pxr/imaging/hd/types.h"
 #include "pxr/base/tf/pyContainerConversions.h"
 #include "pxr/base/tf/pyResultConversions.h"
 
@@ -46,6 +47,27 @@ public:
     {
         return GetRendererAov(id, reinterpret_cast<void *>(buf_ptr));
     }
+
+    // Returns (component format, component count) of AOV, e.g. ("float32", 4),
+    // or ("", 0) if AOV isn't set
+    tuple GetRendererAovFormat_wrap(TfToken const &id)
+    {
+        HdFormat format = GetRendererAovFormat(id);
+        if (format == HdFormatInvalid) {
+            return make_tuple("", 0);
+        }
+
+        const char *componentFormat = "";
+        switch (HdGetComponentFormat(format)) {
+        case HdFormatUNorm8: componentFormat = "uint8"; break;
+        case HdFormatSNorm8: componentFormat = "int8"; break;
+        case HdFormatFloat16: componentFormat = "float16"; break;
+        case HdFormatFloat32: componentFormat = "float32"; break;
+        case HdFormatInt32: componentFormat = "int32"; break;
+        default: break;
+        }
+        return make_tuple(componentFormat, HdGetComponentCount(format));
+    }
 };
 
 void
@@ -61,6 +83,7 @@ wrapEngine()
             .def("SetRenderViewport", &Cls::SetRenderViewport)
             .def("SetRendererAov", &Cls::SetRendererAov)
             .def("GetRendererAov", &Cls::GetRendererAov_wrap)
+            .def("GetRendererAovFormat", &Cls::GetRendererAovFormat_wrap)
             .def("GetRendererSettingsList",
                 &Cls::GetRendererSettingsList,
                 return_value_policy< TfPySequenceToList >())
@@ -27,6 +27,7 @@ bl_info = {
 }
 version_build = ""
 
+import time
 
 from . import config
 from .utils import logging
@@ -36,12 +37,16 @@ log = logging.Log('init')
 log.info(f"Loading USD Hydra addon version={bl_info['version']}, build={version_build}")
 
 
-from . import engine, properties, ui, usd_nodes, mx_nodes, bl_nodes
+from . import engine, properties, ui, usd_nodes
 
 
 def register():
     """ Register all addon classes in Blender """
     log("register")
+    start_time = time.perf_counter()
+
+    # MxNode classes and Blender nodes parsers are imported on first use of materials
+    from . import mx_nodes, bl_nodes
 
     engine.register()
     bl_nodes.register()
@@ -50,10 +55,13 @@ def register():
     properties.register()
     ui.register()
 
+    log(f"Registered in {time.perf_counter() - start_time:.3f} s")
+
 
 def unregister():
     """ Unregister all addon classes from Blender """
     log("unregister")
+    from . import mx_nodes, bl_nodes
 
     mx_nodes.unregister()
     usd_nodes.unregister()
@@ -18,20 +18,42 @@ import bpy
 import MaterialX as mx
 
 from ..utils import mx as mx_utils
-from ..utils import pass_node_reroute
+from ..utils import pass_node_reroute, get_node_key
 from ..mx_nodes.nodes import get_mx_node_cls 
+from .. import config
 from . import log
 
 
+# values of other operand, which don't change the result of operation
+IDENTITY_VALUES = {'add': 0.0, 'subtract': 0.0, 'multiply': 1.0, 'divide': 1.0, 'power': 1.0}
+COMMUTATIVE_OPS = {'add', 'multiply', 'min', 'max', 'ifequal'}
+
+
 class Id:
     def __init__(self):
         self.id = 0
+        # (nodegraph path, category, type, inputs): mx.Node, arithmetic nodes for reuse
+        self.nodes = {}
 
     def __call__(self):
         self.id += 1
         return self.id
 
 
+def _data_key(data):
+    if isinstance(data, NodeItem):
+        data = data.data
+
+    return data.getNamePath() if isinstance(data, mx.Node) else data
+
+
+def _is_value(data, value):
+    if isinstance(data, float):
+        return data == value
+
+    return isinstance(data, tuple) and all(val == value for val in data)
+
+
 class NodeItem:
     """This class is a wrapper used for doing operations on MaterialX nodes, floats, and tuples"""
 
@@ -73,10 +95,43 @@ class NodeItem:
             self.set_input(name, value)
 
     # MATH OPERATIONS
-    def _arithmetic_helper(self, other, op_node, func):
+    def _add_node(self, op_node, nd_type, inputs):
+        """
+        Creates arithmetic node with inputs {name: value}. Node with the same inputs
+        created before in the same nodegraph is reused.
+        """
+        if not config.mx_optimize_nodes:
+            return self._create_node(op_node, nd_type, inputs)
+
+        keys = [(name, _data_key(value)) for name, value in inputs.items()]
+        if op_node in COMMUTATIVE_OPS:
+            # in1 and in2 could be swapped
+            keys[:2] = sorted(keys[:2], key=lambda k: repr(k[1]))
+            keys[:2] = [(f'in{i}', k[1]) for i, k in enumerate(keys[:2], 1)]
+
+        key = (self.nodegraph.getNamePath(), op_node, nd_type, tuple(keys))
+        node = self.id.nodes.get(key)
+        if node is None:
+            node = self.id.nodes[key] = self._create_node(op_node, nd_type, inputs)
+
+        return node
+
+    def _create_node(self, op_node, nd_type, inputs):
+        node = self.nodegraph.addNode(op_node, f"{op_node}_{self.id()}", nd_type)
+        for name, value in inputs.items():
+            if name in ('in', 'in1', 'in2'):
+                input = node.addInput(name, nd_type)
+                mx_utils.set_param_value(input, value, nd_type)
+            else:
+                NodeItem(self.id, self.nodegraph, node).set_input(name, value)
+
+        return node
+
+    def _arithmetic_helper(self, other, op_node, func, inputs=None):
         ''' helper function for overridden math functions.
             This simply creates an arithmetic node of rpr_type
-            if one of the operands has node data, else maps the function to data '''
+            if one of the operands has node data, else maps the function to data.
+            inputs - additional inputs of created node '''
 
         if other is None:
             if isinstance(self.data, float):
@@ -84,10 +139,8 @@ class NodeItem:
             elif isinstance(self.data, tuple):
                 result_data = tuple(map(func, self.data))
             else:
-                result_data = self.nodegraph.addNode(op_node, f"{op_node}_{self.id()}",
-                                                     self.data.getType())
-                input = result_data.addInput('in', self.data.getType())
-                mx_utils.set_param_value(input, self.data, self.data.getType())
+                result_data = self._add_node(op_node, self.data.getType(),
+                                             {'in': self.data, **(inputs or {})})
 
         else:
             other_data = other.data if isinstance(other, NodeItem) else other
@@ -113,11 +166,16 @@ class NodeItem:
                 nd_type = self.data.getType() if isinstance(self.data, mx.Node) else \
                           other_data.getType()
 
-                result_data = self.nodegraph.addNode(op_node, f"{op_node}_{self.id()}", nd_type)
-                input1 = result_data.addInput('in1', nd_type)
-                mx_utils.set_param_value(input1, self.data, nd_type)
-                input2 = result_data.addInput('in2', nd_type)
-                mx_utils.set_param_value(input2, other_data, nd_type)
+                # folding operations with identity value: x + 0, x * 1, 1 * x, x ** 1, etc.
+                identity = IDENTITY_VALUES.get(op_node) if config.mx_optimize_nodes else None
+                if identity is not None and not inputs:
+                    if isinstance(self.data, mx.Node) and _is_value(other_data, identity):
+                        return self
+                    if op_node in COMMUTATIVE_OPS and _is_value(self.data, identity):
+                        return self.node_item(other)
+
+                result_data = self._add_node(op_node, nd_type, {
+                    'in1': self.data, 'in2': other_data, **(inputs or {})})
 
         return self.node_item(result_data)
 
@@ -179,12 +237,14 @@ class NodeItem:
         return dot
 
     def if_else(self, cond: str, other, if_value, else_value):
+        values = {'value1': if_value, 'value2': else_value}
         if cond == '>':
-            res = self._arithmetic_helper(other, 'ifgreater', lambda a, b: float(a > b))
+            res = self._arithmetic_helper(other, 'ifgreater', lambda a, b: float(a > b), values)
         elif cond == '>=':
-            res = self._arithmetic_helper(other, 'ifgreatereq', lambda a, b: float(a >= b))
+            res = self._arithmetic_helper(other, 'ifgreatereq', lambda a, b: float(a >= b),
+                                          values)
         elif cond == '==':
-            res = self._arithmetic_helper(other, 'ifequal', lambda a, b: float(a == b))
+            res = self._arithmetic_helper(other, 'ifequal', lambda a, b: float(a == b), values)
         elif cond == '<':
             return self.node_item(other).if_else('>', self, else_value, if_value)
         elif cond == '<=':
@@ -199,8 +259,6 @@ class NodeItem:
         elif isinstance(res.data, tuple):
             return if_value if res.data[0] == 1.0 else else_value
         else:
-            res.set_input('value1', if_value)
-            res.set_input('value2', else_value)
             return res
 
     def min(self, other):
@@ -277,15 +335,15 @@ class NodeParser:
             group_nodes = self.group_nodes
 
         # check if this node was already parsed and cached
-        node_item = self.cached_nodes.get((node.name, out_key))
-        if node_item:
-            return node_item
+        key = get_node_key(node, out_key, group_nodes)
+        if key in self.cached_nodes:
+            return self.cached_nodes[key]
 
         # getting corresponded NodeParser class
         NodeParser_cls = self.get_node_parser_cls(node.bl_idname)
         if not NodeParser_cls:
             log.warn(f"Ignoring unsupported node {node.bl_idname}", node, self.material)
-            self.cached_nodes[(node.name, out_key)] = None
+            self.cached_nodes[key] = None
             return None
 
         node_parser = NodeParser_cls(self.id, self.doc, self.material, node, self.object,
@@ -293,7 +351,8 @@ class NodeParser:
 
         node_item = node_parser.export()
 
-        self.cached_nodes[(node.name, out_key)] = node_item
+        self.cached_nodes[key] = node_item
+
         return node_item
 
     def _parse_val(self, val):
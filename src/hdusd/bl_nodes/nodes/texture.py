@@ -28,7 +28,7 @@ class ShaderNodeTexImage(NodeParser):
         if not image or image.source in ('TILED', 'SEQUENCE'):
             return image_error_result
 
-        img_path = cache_image_file(image)
+        img_path = cache_image_file(image, allow_placeholder=True)
         if not img_path:
             return image_error_result
 
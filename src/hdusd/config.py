@@ -20,6 +20,18 @@ logging_backups = 5
 # other settings
 matlib_enabled = False
 engine_use_preview = True
+mesh_cache_size = 1024    # max size of exported mesh data cache in MB
+mesh_triangulate = False  # export triangulated meshes instead of original polygons
+mesh_compact_primvars = True  # deduplicate mesh normals and uvs into indexed primvars
+export_instancing = True  # export instances of the same object as one PointInstancer
+stage_format = 'usdc'     # format of created stages: 'usdc', 'usda' or 'memory' for in-memory layers
+node_compute_threads = 8  # max threads for parallel compute of independent USD nodes, 1 - no threads
+texture_cache_size = 4096  # max size of converted textures cache in MB
+texture_convert_threads = 4  # max number of background processes converting textures
+texture_float_format = '.exr'  # format of float textures: '.exr' or '.hdr' if render delegate doesn't read EXR
+texture_mipmaps = False   # convert textures to tiled mip-mapped .tx, requires maketx of OpenImageIO
+mx_optimize_nodes = True  # reuse equal MaterialX nodes, fold constants and remove unused nodes on export
+final_update_interval = 1.0  # min time in seconds between render result updates during final render
 
 try:
     # Trying to load configdev.py if it exist
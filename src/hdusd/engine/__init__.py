@@ -46,6 +46,8 @@ def register():
     bpy.app.handlers.load_post.append(handlers.on_load_post)
     bpy.app.handlers.depsgraph_update_post.append(handlers.on_depsgraph_update_post)
     bpy.app.handlers.frame_change_post.append(handlers.on_frame_change_post)
+    bpy.app.handlers.undo_post.append(handlers.on_undo_redo_post)
+    bpy.app.handlers.redo_post.append(handlers.on_undo_redo_post)
     bpy.app.handlers.save_pre.append(handlers.on_save_pre)
     bpy.app.handlers.save_post.append(handlers.on_save_post)
 
@@ -57,5 +59,7 @@ def unregister():
     bpy.app.handlers.load_post.remove(handlers.on_load_post)
     bpy.app.handlers.depsgraph_update_post.remove(handlers.on_depsgraph_update_post)
     bpy.app.handlers.frame_change_post.remove(handlers.on_frame_change_post)
+    bpy.app.handlers.undo_post.remove(handlers.on_undo_redo_post)
+    bpy.app.handlers.redo_post.remove(handlers.on_undo_redo_post)
     bpy.app.handlers.save_pre.remove(handlers.on_save_pre)
     bpy.app.handlers.save_post.remove(handlers.on_save_post)
@@ -37,9 +37,6 @@ class Engine:
         return self.cached_stage()
 
 
-from . import final_engine, viewport_engine, preview_engine
-
-
 class HdUSDEngine(bpy.types.RenderEngine):
     """
     Main class of USD Hydra render engine for Blender
@@ -62,10 +59,14 @@ class HdUSDEngine(bpy.types.RenderEngine):
         log('update', self.as_pointer())
 
         try:
+            # engines are imported on first render, because importing of USD imaging
+            # libraries slows down Blender startup
             if self.is_preview:
-                engine_cls = preview_engine.PreviewEngine
+                from .preview_engine import PreviewEngine
+                engine_cls = PreviewEngine
 
             else:
+                from . import final_engine
                 if depsgraph.scene.hdusd.final.data_source:
                     engine_cls = final_engine.FinalEngineNodetree
                 else:
@@ -88,6 +89,20 @@ class HdUSDEngine(bpy.types.RenderEngine):
             log.error(e, 'EXCEPTION:', traceback.format_exc())
             self.error_set(f"ERROR | {e}. Please see log for more details.")
 
+    def update_render_passes(self, scene=None, renderlayer=None):
+        """ Registers render passes which are filled with AOVs of final render """
+        self.register_pass(scene, renderlayer, "Combined", 4, "RGBA", 'COLOR')
+        if renderlayer.use_pass_z:
+            self.register_pass(scene, renderlayer, "Depth", 1, "Z", 'VALUE')
+        if renderlayer.use_pass_normal:
+            self.register_pass(scene, renderlayer, "Normal", 3, "XYZ", 'VECTOR')
+        if renderlayer.use_pass_diffuse_color:
+            self.register_pass(scene, renderlayer, "DiffCol", 3, "RGB", 'COLOR')
+        if renderlayer.use_pass_object_index:
+            self.register_pass(scene, renderlayer, "IndexOB", 1, "X", 'VALUE')
+        if renderlayer.hdusd.use_pass_variance:
+            self.register_pass(scene, renderlayer, "Variance", 4, "RGBA", 'COLOR')
+
     # viewport render
     def view_update(self, context, depsgraph):
         """ Called when data is updated for viewport """
@@ -99,6 +114,7 @@ class HdUSDEngine(bpy.types.RenderEngine):
                 self.engine.sync_update(context, depsgraph)
                 return
 
+            from . import viewport_engine
             if data_source:
                 self.engine = viewport_engine.ViewportEngineNodetree(self)
             else:
@@ -15,7 +15,7 @@
 import time
 import numpy as np
 
-from pxr import Usd, UsdAppUtils, Glf, Tf, UsdGeom
+from pxr import Usd, UsdAppUtils, Glf, Tf, UsdGeom, Gf
 from pxr import UsdImagingGL, UsdImagingLite
 
 import bpy
@@ -24,12 +24,46 @@ import bgl
 from .engine import Engine
 from ..utils import gl, time_str
 from ..utils import usd as usd_utils
-from ..export import object, world
+from ..export import object, world, mesh, material, animation
+from ..utils.stage_cache import CachedStage
+from ..utils.profiler import profiler
+from .. import config
 
 from ..utils import logging
 log = logging.Log('final_engine')
 
 
+POLL_INTERVAL = 0.05    # time in seconds between checks of renderer progress
+
+# Blender render pass: Hydra AOV.
+# primId is index of rendered prim in Hydra render index (-1 for background), it isn't
+# object's pass_index which Blender's IndexOB pass holds, but it separates objects the same way
+AOVS = {
+    'Combined': 'color',
+    'Depth': 'depth',
+    'Normal': 'normal',
+    'DiffCol': 'albedo',
+    'IndexOB': 'primId',
+    'Variance': 'variance',
+}
+
+
+def linearize_depth(depth, gf_camera):
+    """
+    Converts depth AOV in place from NDC depth in [0, 1] range to distance from camera plane
+    which Blender's Depth pass holds. Background gets clip end distance.
+    """
+    near, far = gf_camera.clippingRange.min, gf_camera.clippingRange.max
+    if gf_camera.projection == Gf.Camera.Perspective:
+        # distance = near * far / (far - depth * (far - near))
+        np.multiply(depth, near - far, out=depth)
+        depth += far
+        np.divide(near * far, depth, out=depth)
+    else:
+        np.multiply(depth, far - near, out=depth)
+        depth += near
+
+
 class FinalEngine(Engine):
     """ Final render engine """
 
@@ -42,9 +76,15 @@ class FinalEngine(Engine):
         self.height = 0
 
         self.render_layer_name = None
+        self.frame = Usd.TimeCode.Default()
 
         self.status_title = ""
 
+        # render result buffer with all passes, it's reused while passes layout isn't changed
+        self.result_buffer = None
+        self.result_layout = None
+        self.result_passes = {}     # pass name: view of result buffer with (pixels, channels) shape
+
     def notify_status(self, progress, info):
         """ Display export/render status """
         self.render_engine.update_progress(progress)
@@ -72,7 +112,7 @@ class FinalEngine(Engine):
         root = self.stage.GetPseudoRoot()
         params = UsdImagingGL.RenderParams()
         params.renderResolution = (self.width, self.height)
-        params.frame = Usd.TimeCode.Default()
+        params.frame = self.frame
 
         if scene.hdusd.final.data_source:
             world_data = world.WorldData.init_from_stage(self.stage)
@@ -103,19 +143,28 @@ class FinalEngine(Engine):
         self._sync_render_settings(renderer, scene)
 
         renderer.SetRenderViewport((0, 0, self.width, self.height))
-        renderer.SetRendererAov('color')
+
+        render_images = self._create_aov_images(renderer)
 
         # setting camera
-        self._set_scene_camera(renderer, scene)
+        gf_camera = self._set_scene_camera(renderer, scene)
 
         params = UsdImagingLite.RenderParams()
-        render_images = {
-            'Combined': np.empty((self.width, self.height, 4), dtype=np.float32)
-        }
+        params.frame = self.frame
+
+        def read_aovs():
+            for name, image in render_images.items():
+                renderer.GetRendererAov(AOVS[name], image.ctypes.data)
+
+            depth = render_images.get('Depth')
+            if depth is not None and np.issubdtype(depth.dtype, np.floating):
+                linearize_depth(depth, gf_camera)
 
         renderer.Render(self.stage.GetPseudoRoot(), params)
 
         time_begin = time.perf_counter()
+        update_time = time_begin
+        update_samples = None
         while True:
             if self.render_engine.test_break():
                 break
@@ -128,24 +177,76 @@ class FinalEngine(Engine):
             if renderer.IsConverged():
                 break
 
-            renderer.GetRendererAov('color', render_images['Combined'].ctypes.data)
-            self.update_render_result(render_images)
+            # reading back result only when new samples are rendered and not more often
+            # than update interval
+            samples = usd_utils.get_renderer_samples(renderer)
+            if samples != update_samples and \
+                    time.perf_counter() - update_time >= config.final_update_interval:
+                read_aovs()
+                self.update_render_result(render_images)
+                update_samples = samples
+                update_time = time.perf_counter()
+
+            time.sleep(POLL_INTERVAL)
 
-        renderer.GetRendererAov('color', render_images['Combined'].ctypes.data)
+        read_aovs()
         self.update_render_result(render_images)
 
         # explicit renderer deletion
         renderer = None
 
+    def _create_aov_images(self, renderer):
+        """
+        Sets AOVs of render passes of current render layer to renderer and returns
+        {pass name: image}. Passes which AOVs aren't supported by render delegate are skipped.
+        Image of AOV which format matches its pass is a view of render result buffer,
+        so renderer writes it in place and it isn't copied on render result update.
+        """
+        result = self.render_engine.begin_result(0, 0, self.width, self.height,
+                                                 layer=self.render_layer_name)
+        self._check_result_buffer(result.layers[0].passes)
+        self.render_engine.end_result(result, cancel=True)
+
+        images = {}
+        for name, pass_buffer in self.result_passes.items():
+            aov = AOVS.get(name)
+            if aov is None:
+                continue
+
+            try:
+                is_set = renderer.SetRendererAov(aov)
+            except Tf.ErrorException as e:
+                log.warn(e)
+                is_set = False
+
+            if not is_set:
+                log.warn("AOV isn't supported by render delegate, pass is skipped", aov, name)
+                continue
+
+            # buffer has to be of AOV format, because renderer copies whole AOV render buffer
+            component_format, components = renderer.GetRendererAovFormat(aov)
+            if not component_format:
+                log.warn("Unsupported AOV format, pass is skipped", aov, name)
+                continue
+
+            dtype = np.dtype(component_format)
+            if components == pass_buffer.shape[1] and dtype == pass_buffer.dtype:
+                images[name] = pass_buffer
+            else:
+                images[name] = np.empty((pass_buffer.shape[0], components), dtype=dtype)
+
+        return images
+
     def _set_scene_camera(self, renderer, scene):
         if scene.hdusd.final.nodetree_camera != '' and scene.hdusd.final.data_source:
             usd_camera = UsdAppUtils.GetCameraAtPath(self.stage, scene.hdusd.final.nodetree_camera)
         else:
             usd_camera = UsdAppUtils.GetCameraAtPath(self.stage, Tf.MakeValidIdentifier(scene.camera.data.name))
        
-        gf_camera = usd_camera.GetCamera()
+        gf_camera = usd_camera.GetCamera(self.frame)
         renderer.SetCameraState(gf_camera.frustum.ComputeViewMatrix(),
                                 gf_camera.frustum.ComputeProjectionMatrix())
+        return gf_camera
 
     def render(self, depsgraph):
         if not self.stage:
@@ -154,6 +255,10 @@ class FinalEngine(Engine):
         scene = depsgraph.scene
         log(f"Start render [{self.width}, {self.height}]. "
             f"Hydra delegate: {scene.hdusd.final.delegate}")
+
+        if depsgraph.view_layer.hdusd.use_pass_variance:
+            self.render_engine.add_pass('Variance', 4, 'RGBA', layer=self.render_layer_name)
+
         if self.render_engine.bl_use_gpu_context:
             self._render_gl(scene)
         else:
@@ -183,8 +288,15 @@ class FinalEngine(Engine):
 
         self.width = int(screen_width * border[1][0])
         self.height = int(screen_height * border[1][1])
+        self.frame = Usd.TimeCode(scene.frame_current)
+
+        profiler.start(f"Final render {self.status_title}", settings.use_profiler)
+        try:
+            with material.mx_cache.sync_scope():
+                self._sync(depsgraph)
 
-        self._sync(depsgraph)
+        finally:
+            profiler.stop()
 
         usd_utils.set_delegate_variant_stage(self.stage, settings.delegate_name)
 
@@ -196,29 +308,51 @@ class FinalEngine(Engine):
         self.render_engine.bl_use_gpu_context = settings.is_gl_delegate
 
         log.info("Scene synchronization time:", time_str(time.perf_counter() - time_begin))
+        log.info("Mesh cache:", mesh.mesh_cache)
+        log.info("MaterialX cache:", material.mx_cache)
+        material.mx_cache.report()
         self.notify_status(0.0, "Start render")
 
     def _sync(self, depsgraph):
         pass
 
+    def _check_result_buffer(self, render_passes):
+        """Creates render result buffer and views of its passes if passes layout was changed"""
+        pixels = self.width * self.height
+        layout = (pixels, tuple((p.name, p.channels) for p in render_passes))
+        if layout == self.result_layout:
+            return
+
+        # passes without images stay filled with zeros
+        self.result_buffer = np.zeros(pixels * sum(p.channels for p in render_passes),
+                                      dtype=np.float32)
+        self.result_layout = layout
+
+        self.result_passes = {}
+        offset = 0
+        for name, channels in layout[1]:
+            self.result_passes[name] = \
+                self.result_buffer[offset:offset + pixels * channels].reshape(pixels, channels)
+            offset += pixels * channels
+
     def update_render_result(self, render_images):
         result = self.render_engine.begin_result(0, 0, self.width, self.height,
                                                  layer=self.render_layer_name)
         render_passes = result.layers[0].passes
+        self._check_result_buffer(render_passes)
 
-        images = []
-        for p in render_passes:
-            image = render_images.get(p.name)
-            if image is None:
-                image = np.zeros((self.width, self.height, p.channels), dtype=np.float32)
+        # copying AOV images which aren't already written in place to result buffer
+        for name, pass_buffer in self.result_passes.items():
+            image = render_images.get(name)
+            if image is None or np.shares_memory(image, pass_buffer):
+                continue
 
-            if p.channels != image.shape[2]:
-                image = image[:, :, 0:p.channels]
-
-            images.append(image.flatten())
+            image = image.reshape(pass_buffer.shape[0], -1)
+            channels = min(pass_buffer.shape[1], image.shape[1])
+            np.copyto(pass_buffer[:, :channels], image[:, :channels], casting='unsafe')
 
         # efficient way to copy all AOV images
-        render_passes.foreach_set('rect', np.concatenate(images))
+        render_passes.foreach_set('rect', self.result_buffer)
         self.render_engine.end_result(result)
 
     def _sync_render_settings(self, renderer, scene):
@@ -261,9 +395,43 @@ class FinalEngine(Engine):
 
 
 class FinalEngineScene(FinalEngine):
+    # stage with exported animation, it is reused by next frames of animation render
+    # of the same scene, view layer and frame range
+    _animation_stage = CachedStage()
+    _animation_key = None
+
     def _sync(self, depsgraph):
-        stage = self.cached_stage.create()
+        scene = depsgraph.scene
+        if not (scene.hdusd.final.use_animation and self.render_engine.is_animation):
+            self._sync_scene(depsgraph, self.cached_stage.create())
+            return
 
+        key = (scene.name_full, depsgraph.view_layer.name, scene.frame_start, scene.frame_end,
+               scene.frame_step)
+        stage = self._animation_stage()
+        if not stage or scene.frame_current == scene.frame_start or \
+                key != FinalEngineScene._animation_key:
+            FinalEngineScene._animation_key = None
+            stage = self._sync_scene(depsgraph, self._animation_stage.create())
+            if self.render_engine.test_break():
+                return
+
+            frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+            self.notify_status(0.0, f"Syncing animation: {len(frames)} frames")
+            animation.sync(stage.GetPseudoRoot(), frames, scene.frame_current,
+                           lambda frame: self.render_engine.frame_set(frame, 0.0),
+                           lambda: self._depsgraph_objects(depsgraph),
+                           scene=depsgraph.scene)
+            FinalEngineScene._animation_key = key
+
+        self.cached_stage.assign(stage)
+
+    @staticmethod
+    def _depsgraph_objects(depsgraph):
+        yield from object.ObjectData.depsgraph_objects(depsgraph, use_scene_cameras=False)
+        yield object.ObjectData.from_object(depsgraph.scene.camera)
+
+    def _sync_scene(self, depsgraph, stage):
         UsdGeom.SetStageMetersPerUnit(stage, 1)
         UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
 
@@ -271,6 +439,13 @@ class FinalEngineScene(FinalEngine):
 
         objects_len = sum(1 for _ in object.ObjectData.depsgraph_objects(
                           depsgraph, use_scene_cameras=False))
+
+        self.notify_status(0.0, "Syncing materials")
+        start_time = time.perf_counter()
+        material.prepare(obj_data.object for obj_data in object.ObjectData.depsgraph_objects(
+                         depsgraph, use_scene_cameras=False))
+        log("Materials prepared", time_str(time.perf_counter() - start_time))
+
         for i, obj_data in enumerate(object.ObjectData.depsgraph_objects(
                                      depsgraph, use_scene_cameras=False)):
             if self.render_engine.test_break():
@@ -286,6 +461,8 @@ class FinalEngineScene(FinalEngine):
         object.sync(stage.GetPseudoRoot(), object.ObjectData.from_object(depsgraph.scene.camera),
                     scene=depsgraph.scene)
 
+        return stage
+
 
 class FinalEngineNodetree(FinalEngine):
     def _sync(self, depsgraph):
@@ -22,7 +22,15 @@ from .engine import log
 def on_load_pre(*args):
     """Handler on loading a blend file (before)"""
     log("on_load_pre", args)
+    from ..export import mesh, material
+    from ..usd_nodes import scheduler
+    from ..mx_nodes import node_tree as mx_node_tree
+
     utils.clear_temp_dir()
+    mesh.mesh_cache.clear()
+    material.mx_cache.clear()
+    mx_node_tree.clear_export_caches()
+    scheduler.clear()
 
 
 @bpy.app.handlers.persistent
@@ -30,16 +38,28 @@ def on_load_post(*args):
     """Handler on loading a blend file (after)"""
     log("on_load_post", args)
     from ..usd_nodes import node_tree
+    from ..mx_nodes import nodes as mx_nodes
+
+    # MxNode classes have to be registered before node trees are recomputed and
+    # MaterialX materials are exported
+    mx_nodes.register_if_used()
     node_tree.reset()
 
 
 @bpy.app.handlers.persistent
 def on_depsgraph_update_post(scene, depsgraph):
     log("on_depsgraph_update", depsgraph)
+    from ..export import animation
+    if animation.is_exporting:
+        return
+
     from ..properties import object, material
     from ..usd_nodes import node_tree
     from ..ui import material as material_ui
+    from ..mx_nodes import nodes as mx_nodes
 
+    # MaterialX node trees can be appended or linked without load_post
+    mx_nodes.register_if_used()
     object.depsgraph_update(depsgraph)
     material.depsgraph_update(depsgraph)
     node_tree.depsgraph_update(depsgraph)
@@ -50,11 +70,24 @@ def on_depsgraph_update_post(scene, depsgraph):
 def on_frame_change_post(scene, depsgraph):
     """Handler on frame change a blend file (after)"""
     log("on_frame_change", depsgraph)
+    from ..export import animation
+    if animation.is_exporting:
+        return
+
     from ..usd_nodes import node_tree
 
     node_tree.frame_change(depsgraph)
 
 
+@bpy.app.handlers.persistent
+def on_undo_redo_post(*args):
+    """Handler on undo and redo (after)"""
+    log("on_undo_redo_post", args)
+    from ..mx_nodes import node_tree as mx_node_tree
+
+    mx_node_tree.clear_export_caches()
+
+
 @bpy.app.handlers.persistent
 def on_save_pre(*args):
     log("on_save_pre", args)
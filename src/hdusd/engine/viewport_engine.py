@@ -21,13 +21,15 @@ import bpy
 import bgl
 from bpy_extras import view3d_utils
 
-from pxr import Usd, UsdGeom, Tf, Gf, Glf
-from pxr import UsdImagingGL
+from pxr import Usd, UsdGeom, Sdf, Tf, Gf, Glf
+from pxr import UsdImagingGL, UsdUtils
 
 from .engine import Engine
-from ..export import camera, material, object, world
+from ..export import camera, material, object, world, mesh
 from ..utils import usd as usd_utils
 from ..utils import time_str
+from ..utils.profiler import profiler
+from ..utils.image import texture_cache
 from ..utils import logging
 log = logging.Log('viewport_engine')
 
@@ -143,6 +145,12 @@ class ViewportEngine(Engine):
         self.renderer = None
         self.render_params = None
 
+        # draw state which is set to renderer only when it's changed
+        self.gf_camera = None
+        self.lighting_key = None
+        self.is_aov_set = False
+        self.draw_overhead = 0.0    # smoothed time of draw() without Render() call
+
         self.is_synced = False
 
         self.space_data = None
@@ -192,12 +200,21 @@ class ViewportEngine(Engine):
 
         self.renderer = UsdImagingGL.Engine()
 
-        self._sync(context, depsgraph)
+        profiler.start(f"Viewport render {scene.name}", settings.use_profiler)
+        try:
+            # viewport isn't blocked by texture conversions, materials are updated after them
+            with texture_cache.placeholders(), material.mx_cache.sync_scope():
+                self._sync(context, depsgraph)
+
+        finally:
+            profiler.stop()
 
         usd_utils.set_delegate_variant_stage(self.stage, settings.delegate_name)
 
         self.is_synced = True
         log('Finish sync')
+        log("Mesh cache:", mesh.mesh_cache)
+        log("MaterialX cache:", material.mx_cache)
 
     def sync_update(self, context, depsgraph):
         """ sync just the updated things """
@@ -213,10 +230,12 @@ class ViewportEngine(Engine):
         if self._check_restart_renderer(depsgraph.scene):
             self.renderer = None    # explicit renderer deletion
             self.renderer = UsdImagingGL.Engine()
+            self._reset_draw_state()
 
         gl_delegate_changed = self.is_gl_delegate != settings.is_gl_delegate
 
-        self._sync_update(context, depsgraph)
+        with texture_cache.placeholders(), material.mx_cache.sync_scope():
+            self._sync_update(context, depsgraph)
 
         if gl_delegate_changed:
             usd_utils.set_delegate_variant_stage(self.cached_stage(), settings.delegate_name)
@@ -237,6 +256,12 @@ class ViewportEngine(Engine):
 
         self._sync_render_settings(scene)
 
+    def _reset_draw_state(self):
+        self.view_settings = None
+        self.gf_camera = None
+        self.lighting_key = None
+        self.is_aov_set = False
+
     def draw(self, context):
         log("Draw")
 
@@ -247,27 +272,41 @@ class ViewportEngine(Engine):
         if not stage:
             return
 
+        draw_begin = time.perf_counter()
+
         view_settings = ViewSettings(context)
         if view_settings.width * view_settings.height == 0:
             return
 
-        gf_camera = view_settings.export_camera()
-        self.renderer.SetCameraState(gf_camera.frustum.ComputeViewMatrix(),
-                                     gf_camera.frustum.ComputeProjectionMatrix())
-        self.renderer.SetRenderViewport((*view_settings.border[0], *view_settings.border[1]))
-        self.renderer.SetRendererAov('color')
-        self.render_params.renderResolution = (view_settings.width, view_settings.height)
-        self.render_params.clipPlanes = [Gf.Vec4d(i) for i in gf_camera.clippingPlanes]
-
-        if self.shading_data.type == 'MATERIAL' and self.is_gl_delegate:
+        view_changed = view_settings != self.view_settings
+        if view_changed:
+            self.view_settings = view_settings
+            self.gf_camera = view_settings.export_camera()
+            self.renderer.SetCameraState(self.gf_camera.frustum.ComputeViewMatrix(),
+                                         self.gf_camera.frustum.ComputeProjectionMatrix())
+            self.renderer.SetRenderViewport((*view_settings.border[0], *view_settings.border[1]))
+            self.render_params.renderResolution = (view_settings.width, view_settings.height)
+            self.render_params.clipPlanes = [Gf.Vec4d(i) for i in self.gf_camera.clippingPlanes]
+
+        if not self.is_aov_set:
+            self.renderer.SetRendererAov('color')
+            self.is_aov_set = True
+
+        self.render_params.frame = Usd.TimeCode(context.scene.frame_current)
+
+        lighting_key = (self.shading_data.type, self.is_gl_delegate)
+        if self.shading_data.type == 'MATERIAL' and self.is_gl_delegate and \
+                (view_changed or lighting_key != self.lighting_key):
             l = Glf.SimpleLight()
             l.ambient = (0, 0, 0, 0)
-            l.position = (*gf_camera.frustum.position, 1)
+            l.position = (*self.gf_camera.frustum.position, 1)
 
             mat = Glf.SimpleMaterial()
 
             self.renderer.SetLightingState((l,), mat, (0, 0, 0, 0))
 
+        self.lighting_key = lighting_key
+
         bgl.glClear(bgl.GL_COLOR_BUFFER_BIT | bgl.GL_DEPTH_BUFFER_BIT)
 
         self.render_engine.bind_display_space_shader(context.scene)
@@ -275,6 +314,7 @@ class ViewportEngine(Engine):
         if usd_utils.get_renderer_percent_done(self.renderer) == 0.0:
             self.time_begin = time.perf_counter()
 
+        render_begin = time.perf_counter()
         try:
             self.renderer.Render(stage.GetPseudoRoot(), self.render_params)
 
@@ -284,24 +324,35 @@ class ViewportEngine(Engine):
             else:
                 log.error(e)
 
+        render_time = time.perf_counter() - render_begin
+
         self.render_engine.unbind_display_space_shader()
 
         # additional clear of GL depth buffer which provides blender to draw viewport grid
         bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
 
+        overhead = time.perf_counter() - draw_begin - render_time
+        self.draw_overhead = overhead if not self.draw_overhead else \
+            self.draw_overhead * 0.9 + overhead * 0.1
+        draw_info = f"Draw: {self.draw_overhead * 1000:.2f} ms"
+
         elapsed_time = time_str(time.perf_counter() - self.time_begin)
         if not self.renderer.IsConverged():
             self.notify_status(f"Time: {elapsed_time} | "
-                               f"Done: {int(usd_utils.get_renderer_percent_done(self.renderer))}%",
-                               "Render")
+                               f"Done: {int(usd_utils.get_renderer_percent_done(self.renderer))}% | "
+                               f"{draw_info}", "Render")
         else:
-            self.notify_status(f"Time: {elapsed_time}", "Rendering Done", False)
+            self.notify_status(f"Time: {elapsed_time} | {draw_info}", "Rendering Done", False)
 
     def _sync_render_settings(self, scene):
         settings = self.get_settings(scene)
 
         self.is_gl_delegate = settings.is_gl_delegate
-        self.renderer.SetRendererPlugin(settings.delegate)
+        if self.renderer.GetCurrentRendererId() != settings.delegate:
+            self.renderer.SetRendererPlugin(settings.delegate)
+            # render index and task controller are recreated, draw state has to be set again
+            self._reset_draw_state()
+
         if settings.delegate == 'HdRprPlugin':
             hdrpr = settings.hdrpr
             quality = hdrpr.interactive_quality
@@ -350,7 +401,20 @@ class ViewportEngineScene(ViewportEngine):
 
     def update_material(self, mat):
         stage = self.cached_stage()
-        material.sync_update_all(stage.GetPseudoRoot(), mat)
+        with texture_cache.placeholders():
+            material.sync_update_all(stage.GetPseudoRoot(), mat)
+        self.render_engine.tag_redraw()
+
+    @classmethod
+    def material_update_inputs(cls, material, mx_node_name, inputs):
+        for engine in cls.get_engines():
+            engine.update_material_inputs(material, mx_node_name, inputs)
+
+    def update_material_inputs(self, mat, mx_node_name, inputs):
+        stage = self.cached_stage()
+        if not material.sync_update_inputs(stage.GetPseudoRoot(), mat, mx_node_name, inputs):
+            with texture_cache.placeholders():
+                material.sync_update_all(stage.GetPseudoRoot(), mat)
         self.render_engine.tag_redraw()
 
     def _sync(self, context, depsgraph):
@@ -384,6 +448,10 @@ class ViewportEngineScene(ViewportEngine):
         update_collection = self.shading_data.use_scene_lights != shading_data.use_scene_lights
         self.shading_data = shading_data
 
+        # instances could be changed by update of any object: instanced object, emitter, parent
+        update_instancers = False
+        geometry_updated_names = set()
+
         for update in depsgraph.updates:
             log("sync_update", update.id, type(update.id))
 
@@ -403,6 +471,12 @@ class ViewportEngineScene(ViewportEngine):
                                    update.is_updated_geometry,
                                    update.is_updated_transform,
                                    is_gl_delegate=self.is_gl_delegate)
+
+                if update.is_updated_geometry or update.is_updated_transform:
+                    update_instancers = True
+                if update.is_updated_geometry:
+                    geometry_updated_names.add(obj.name_full)
+
                 continue
 
             if isinstance(update.id, bpy.types.World):
@@ -410,24 +484,31 @@ class ViewportEngineScene(ViewportEngine):
                 continue
 
         if update_collection:
-            self._sync_objects_collection(depsgraph)
+            self._sync_objects_collection(depsgraph, geometry_updated_names)
+
+        elif update_instancers:
+            object.sync_update_instancers(root_prim, self._depsgraph_objects(depsgraph),
+                                          geometry_updated_names)
 
         if update_world:
             world.sync_update(root_prim, depsgraph.scene.world, self.shading_data)
             self.render_params.clearColor = world.get_clear_color(root_prim)
 
-    def _sync_objects_collection(self, depsgraph):
+    def _depsgraph_objects(self, depsgraph):
+        yield from object.ObjectData.depsgraph_objects(depsgraph,
+            space_data=self.space_data,
+            use_scene_lights=self.shading_data.use_scene_lights,
+            use_scene_cameras=False)
+
+    def _sync_objects_collection(self, depsgraph, geometry_updated_names=()):
         root_prim = self.stage.GetPseudoRoot()
 
-        def dg_objects():
-            yield from object.ObjectData.depsgraph_objects(depsgraph,
-                space_data=self.space_data,
-                use_scene_lights=self.shading_data.use_scene_lights,
-                use_scene_cameras=False)
+        objects_data = list(self._depsgraph_objects(depsgraph))
+        depsgraph_keys = set(obj_data.sdf_name for obj_data in objects_data)
 
-        depsgraph_keys = set(obj_data.sdf_name for obj_data in dg_objects())
         usd_object_keys = set(prim.GetName() for prim in root_prim.GetAllChildren()
-                              if prim.GetName() != world.OBJ_PRIM_NAME)
+                              if prim.GetName() not in (world.OBJ_PRIM_NAME,
+                                                        material.MATERIALS_PRIM_NAME))
         keys_to_remove = usd_object_keys - depsgraph_keys
         keys_to_add = depsgraph_keys - usd_object_keys
 
@@ -438,16 +519,29 @@ class ViewportEngineScene(ViewportEngine):
 
         if keys_to_add:
             log("Object keys to add", keys_to_add)
-            for obj_data in dg_objects():
+            for obj_data in objects_data:
                 if obj_data.sdf_name not in keys_to_add:
                     continue
 
                 object.sync(root_prim, obj_data)
 
+        # instances of existing instancers could be changed
+        object.sync_update_instancers(
+            root_prim, (obj_data for obj_data in objects_data
+                        if obj_data.sdf_name not in keys_to_add),
+            geometry_updated_names)
+
 
 class ViewportEngineNodetree(ViewportEngine):
     """Viewport engine for rendering USD Node Tree"""
 
+    def __init__(self, rpr_engine):
+        super().__init__(rpr_engine)
+
+        # content of nodetree stage root layer is transferred to this layer in place, therefore
+        # references of engine stage to it don't change when output node is recomputed
+        self.nodetree_layer = Sdf.Layer.CreateAnonymous("nodetree")
+
     @classmethod
     def nodetree_output_node_computed(cls, nodetree):
         for engine in cls.get_engines():
@@ -474,19 +568,42 @@ class ViewportEngineNodetree(ViewportEngine):
         self.render_params.clearColor = world_data.clear_color
 
     def nodetree_stage_changed(self, stage):
+        """
+        Transfers root layer of nodetree stage to the engine's nodetree layer, which keeps its
+        identifier. Sdf diffs transferred content, so render delegate gets changes of edited
+        prims only instead of reloading the whole scene. Engine stage root prims reference root
+        prims of nodetree layer, only references of added or removed root prims are edited.
+        """
         engine_stage = self.stage
-        root_prim = engine_stage.GetPseudoRoot()
-
-        # removing all prims in engine_stage
-        for prim in engine_stage.GetPseudoRoot().GetAllChildren():
-            engine_stage.RemovePrim(prim.GetPath())
-
-        if stage:
-            # creating overrides from nodetree stage
-            for prim in stage.GetPseudoRoot().GetAllChildren():
-                override_prim = engine_stage.OverridePrim(
-                    root_prim.GetPath().AppendChild(prim.GetName()))
-                override_prim.GetReferences().AddReference(stage.GetRootLayer().realPath,
-                                                           prim.GetPath())
+        layer = engine_stage.GetRootLayer()
+        nodetree_layer = self.nodetree_layer
+
+        with Sdf.ChangeBlock():
+            if stage:
+                src_layer = stage.GetRootLayer()
+                nodetree_layer.TransferContent(src_layer)
+                if not src_layer.anonymous:
+                    # asset paths relative to the source file have to be anchored
+                    UsdUtils.ModifyAssetPaths(nodetree_layer, src_layer.ComputeAbsolutePath)
+            else:
+                nodetree_layer.Clear()
+
+            names = {prim_spec.name for prim_spec in nodetree_layer.rootPrims}
+            removed_names = [prim_spec.name for prim_spec in layer.rootPrims
+                             if prim_spec.name not in names]
+            added_names = [name for name in names
+                           if not layer.GetPrimAtPath(Sdf.Path.absoluteRootPath.AppendChild(name))]
+
+            for name in removed_names:
+                layer.pseudoRoot.RemoveNameChild(
+                    layer.GetPrimAtPath(Sdf.Path.absoluteRootPath.AppendChild(name)))
+
+            for name in added_names:
+                prim_spec = Sdf.PrimSpec(layer.pseudoRoot, name, Sdf.SpecifierOver)
+                prim_spec.referenceList.prependedItems.append(
+                    Sdf.Reference(nodetree_layer.identifier, prim_spec.path))
+
+        log("nodetree_stage_changed", f"removed {len(removed_names)}", f"added {len(added_names)}",
+            f"updated {len(names) - len(added_names)}")
 
         self.render_engine.tag_redraw()
@@ -0,0 +1,211 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+This module exports animation of blender objects as USD time samples.
+Stage is synced once at the first frame, then for each next frame objects are synced into
+temporary in-memory stage and only changed attribute values are written as time samples.
+Prims and attributes which appear after the first frame are copied to the stage when first seen,
+new prims are hidden at previous frames. Prims which disappear are hidden till they appear again.
+"""
+
+from pxr import Usd, Sdf, UsdGeom
+
+from . import object
+
+from ..utils import logging
+log = logging.Log('export.animation')
+
+
+# it is set during animation export to prevent handling of frame change events
+is_exporting = False
+
+
+class TimeSamplesWriter:
+    """
+    Writes attribute values into layer as time samples if value was changed.
+    Attributes which keep their default value in all frames get no time samples.
+    """
+
+    def __init__(self, layer: Sdf.Layer):
+        self.layer = layer
+        self.samples_count = 0
+        self.start_time = None
+        self.last_time = None
+
+        self._present_paths = None     # prim paths of the last added layer
+        self._hidden_paths = set()     # paths of disappeared prims which were hidden
+
+        # attribute path: [last time, last value, last written time]
+        self._values = {}
+        for path, value in self._get_values(layer):
+            self._values[path] = [None, value, None]
+
+    @staticmethod
+    def _get_values(layer):
+        paths = []
+        layer.Traverse(Sdf.Path.absoluteRootPath,
+                       lambda path: paths.append(path) if path.IsPropertyPath() else None)
+
+        for path in paths:
+            spec = layer.GetAttributeAtPath(path)
+            if spec and spec.HasDefaultValue():
+                yield path, spec.default
+
+    def add_layer(self, layer: Sdf.Layer, time):
+        """Adds attribute values of layer at time"""
+        if self.start_time is None:
+            self.start_time = time
+
+        prim_paths = []
+        layer.Traverse(Sdf.Path.absoluteRootPath,
+                       lambda path: prim_paths.append(path) if path.IsPrimPath() else None)
+
+        self._add_new_prims(layer, prim_paths, time)
+        self._hide_removed_prims(layer, prim_paths, time)
+
+        for path, value in self._get_values(layer):
+            item = self._values.get(path)
+            if item is None:
+                # attribute which appeared at this frame, its value is held till it's changed
+                if not self.layer.GetAttributeAtPath(path):
+                    log("New attribute", path, time)
+                    Sdf.CopySpec(layer, path, self.layer, path)
+
+                self._values[path] = [time, value, None]
+                continue
+
+            if value == item[1]:
+                item[0] = time
+                continue
+
+            self._write_value(path, item, value, time)
+
+        self.last_time = time
+
+    def _write_value(self, path, item, value, time):
+        """Writes changed value at time, holding previous value till time"""
+        last_time, last_value, written_time = item
+        if last_time is not None and written_time != last_time:
+            self.layer.SetTimeSample(path, last_time, last_value)
+            self.samples_count += 1
+
+        self.layer.SetTimeSample(path, time, value)
+        self.samples_count += 1
+        item[:] = [time, value, time]
+
+    def _add_new_prims(self, layer, prim_paths, time):
+        """Copies prims which appeared at time into main layer, they are invisible before time"""
+        # parents go first, children are copied together with them
+        for path in sorted(prim_paths, key=lambda path: path.pathElementCount):
+            if self.layer.GetPrimAtPath(path):
+                continue
+
+            log("New prim", path, time)
+            Sdf.CopySpec(layer, path, self.layer, path)
+            if time == self.start_time:
+                continue
+
+            vis_path = path.AppendProperty(UsdGeom.Tokens.visibility)
+            vis_spec = self.layer.GetAttributeAtPath(vis_path)
+            if not vis_spec:
+                vis_spec = Sdf.AttributeSpec(self.layer.GetPrimAtPath(path),
+                                             UsdGeom.Tokens.visibility, Sdf.ValueTypeNames.Token)
+
+            visibility = vis_spec.default if vis_spec.HasDefaultValue() else \
+                UsdGeom.Tokens.inherited
+            self.layer.SetTimeSample(vis_path, self.start_time, UsdGeom.Tokens.invisible)
+            self.layer.SetTimeSample(vis_path, time, visibility)
+            self.samples_count += 2
+
+    def _hide_removed_prims(self, layer, prim_paths, time):
+        """
+        Hides prims which disappeared at time, shows hidden prims which appeared again.
+        Only the topmost disappeared prim is hidden, its children are hidden with it.
+        """
+        present_paths = set(prim_paths)
+        if self._present_paths is not None:
+            for path in self._present_paths - present_paths:
+                parent_path = path.GetParentPath()
+                if parent_path in present_paths or parent_path == Sdf.Path.absoluteRootPath:
+                    log("Removed prim", path, time)
+                    self._set_visibility(path, UsdGeom.Tokens.invisible, time)
+                    self._hidden_paths.add(path)
+
+            for path in self._hidden_paths & present_paths:
+                log("Restored prim", path, time)
+                vis_spec = layer.GetAttributeAtPath(path.AppendProperty(UsdGeom.Tokens.visibility))
+                self._set_visibility(path, vis_spec.default if vis_spec and
+                                     vis_spec.HasDefaultValue() else UsdGeom.Tokens.inherited,
+                                     time)
+                self._hidden_paths.remove(path)
+
+        self._present_paths = present_paths
+
+    def _set_visibility(self, path, visibility, time):
+        vis_path = path.AppendProperty(UsdGeom.Tokens.visibility)
+        item = self._values.get(vis_path)
+        if item is None:
+            vis_spec = self.layer.GetAttributeAtPath(vis_path)
+            if not vis_spec:
+                vis_spec = Sdf.AttributeSpec(self.layer.GetPrimAtPath(path),
+                                             UsdGeom.Tokens.visibility, Sdf.ValueTypeNames.Token)
+
+            # visibility wasn't changed before, it is held since the previous frame
+            item = self._values[vis_path] = [
+                self.last_time,
+                vis_spec.default if vis_spec.HasDefaultValue() else UsdGeom.Tokens.inherited,
+                None]
+
+        if visibility != item[1]:
+            self._write_value(vis_path, item, visibility, time)
+
+
+def sync(root_prim, frames, frame_current, frame_set, get_objects, **kwargs):
+    """
+    Writes animation of objects as time samples into already synced stage of root_prim.
+      frame_set(frame) - evaluates Blender data at frame,
+      get_objects() - yields ObjectData of objects to export.
+    At the end Blender data is evaluated back at frame_current.
+    """
+    global is_exporting
+
+    log("sync", root_prim, frames[0], frames[-1])
+
+    stage = root_prim.GetStage()
+    writer = TimeSamplesWriter(stage.GetRootLayer())
+
+    is_exporting = True
+    try:
+        for frame in frames:
+            frame_set(frame)
+
+            frame_stage = Usd.Stage.CreateInMemory()
+            frame_root = frame_stage.GetPseudoRoot() if root_prim.IsPseudoRoot() else \
+                frame_stage.OverridePrim(root_prim.GetPath())
+
+            for obj_data in get_objects():
+                object.sync(frame_root, obj_data, export_materials=False, **kwargs)
+
+            writer.add_layer(frame_stage.GetRootLayer(), frame)
+
+        frame_set(frame_current)
+
+    finally:
+        is_exporting = False
+
+    stage.SetStartTimeCode(frames[0])
+    stage.SetEndTimeCode(frames[-1])
+
+    log.info(f"Animation export: {len(frames)} frames, {writer.samples_count} time samples")
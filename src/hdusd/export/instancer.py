@@ -0,0 +1,149 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+This module exports depsgraph instances (particles, collection instances, etc.) which share
+object data and materials as single UsdGeom.PointInstancer. Data of one of instanced objects is
+exported once as prototype of the instancer.
+"""
+
+import hashlib
+
+import numpy as np
+
+from pxr import UsdGeom, Vt
+
+from ..utils import logging
+log = logging.Log('export.instancer')
+
+
+PROTOTYPES_PRIM_NAME = "Prototypes"
+INSTANCES_HASH_KEY = 'hdusd:instancesHash'   # custom data key of hash of instance matrices
+
+
+def sync(instancer_prim_path, stage, obj, matrices, sync_prototype):
+    """
+    Creates PointInstancer with instances of obj.
+      matrices - np.array of shape (N, 4, 4) with world matrices of instances,
+      sync_prototype(prototype_prim, obj) - exports object data into prototype prim.
+    """
+    from .object import sdf_name
+
+    log("sync", obj, len(matrices))
+
+    instancer = UsdGeom.PointInstancer.Define(stage, instancer_prim_path)
+
+    # prototypes are placed under 'over' prim, so they are not rendered by themselves
+    prototypes_prim = stage.OverridePrim(instancer_prim_path.AppendChild(PROTOTYPES_PRIM_NAME))
+    prototype_prim = UsdGeom.Xform.Define(
+        stage, prototypes_prim.GetPath().AppendChild(sdf_name(obj.original))).GetPrim()
+    sync_prototype(prototype_prim, obj)
+
+    instancer.CreatePrototypesRel().SetTargets([prototype_prim.GetPath()])
+    _set_instances(instancer, matrices, _matrices_hash(matrices))
+
+    return instancer
+
+
+def sync_update(instancer_prim_path, stage, matrices):
+    """
+    Updates instance transforms of existing PointInstancer, prototype isn't touched.
+    Returns False if transforms weren't changed.
+    """
+    instancer = UsdGeom.PointInstancer.Get(stage, instancer_prim_path)
+    matrices_hash = _matrices_hash(matrices)
+    if instancer.GetPrim().GetCustomDataByKey(INSTANCES_HASH_KEY) == matrices_hash:
+        return False
+
+    log("sync_update", instancer_prim_path, len(matrices))
+    _set_instances(instancer, matrices, matrices_hash)
+    return True
+
+
+def get_prototype_prim(instancer_prim_path, stage, obj):
+    from .object import sdf_name
+
+    return stage.GetPrimAtPath(instancer_prim_path.AppendChild(PROTOTYPES_PRIM_NAME).AppendChild(
+        sdf_name(obj.original)))
+
+
+def _set_instances(instancer, matrices, matrices_hash):
+    positions, orientations, scales = decompose(matrices)
+    instancer.CreatePositionsAttr(Vt.Vec3fArray.FromNumpy(positions))
+    # GfQuath stores imaginary part first
+    instancer.CreateOrientationsAttr(Vt.QuathArray.FromNumpy(
+        orientations[:, (1, 2, 3, 0)].astype(np.float16)))
+    instancer.CreateScalesAttr(Vt.Vec3fArray.FromNumpy(scales))
+    instancer.CreateProtoIndicesAttr(Vt.IntArray.FromNumpy(np.zeros(len(matrices), np.int32)))
+    instancer.GetPrim().SetCustomDataByKey(INSTANCES_HASH_KEY, matrices_hash)
+
+
+def _matrices_hash(matrices):
+    return hashlib.blake2b(np.ascontiguousarray(matrices).tobytes(), digest_size=16).hexdigest()
+
+
+def decompose(matrices):
+    """
+    Decomposes matrices of shape (N, 4, 4) into positions, quaternions (w, x, y, z) and scales.
+    Shear of matrices is lost.
+    """
+    positions = matrices[:, :3, 3].astype(np.float32)
+
+    rotations = matrices[:, :3, :3].astype(np.float64)
+    scales = np.linalg.norm(rotations, axis=1)
+    # negative determinant means mirroring, it is moved to X scale
+    scales[np.linalg.det(rotations) < 0.0, 0] *= -1.0
+    rotations = rotations / np.where(scales == 0.0, 1.0, scales)[:, None, :]
+
+    return positions, rotation_to_quats(rotations), scales.astype(np.float32)
+
+
+def rotation_to_quats(rotations):
+    """Converts rotation matrices of shape (N, 3, 3) into quaternions (w, x, y, z)"""
+    m = rotations
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    quats = np.empty((len(m), 4))
+
+    # choosing the most stable formula for every matrix
+    cases = np.argmax(np.stack((trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]), axis=1), axis=1)
+
+    i = cases == 0
+    s = np.sqrt(np.maximum(trace[i] + 1.0, 0.0)) * 2.0
+    quats[i] = np.stack((0.25 * s,
+                         (m[i, 2, 1] - m[i, 1, 2]) / s,
+                         (m[i, 0, 2] - m[i, 2, 0]) / s,
+                         (m[i, 1, 0] - m[i, 0, 1]) / s), axis=1)
+
+    i = cases == 1
+    s = np.sqrt(np.maximum(1.0 + m[i, 0, 0] - m[i, 1, 1] - m[i, 2, 2], 0.0)) * 2.0
+    quats[i] = np.stack(((m[i, 2, 1] - m[i, 1, 2]) / s,
+                         0.25 * s,
+                         (m[i, 0, 1] + m[i, 1, 0]) / s,
+                         (m[i, 0, 2] + m[i, 2, 0]) / s), axis=1)
+
+    i = cases == 2
+    s = np.sqrt(np.maximum(1.0 + m[i, 1, 1] - m[i, 0, 0] - m[i, 2, 2], 0.0)) * 2.0
+    quats[i] = np.stack(((m[i, 0, 2] - m[i, 2, 0]) / s,
+                         (m[i, 0, 1] + m[i, 1, 0]) / s,
+                         0.25 * s,
+                         (m[i, 1, 2] + m[i, 2, 1]) / s), axis=1)
+
+    i = cases == 3
+    s = np.sqrt(np.maximum(1.0 + m[i, 2, 2] - m[i, 0, 0] - m[i, 1, 1], 0.0)) * 2.0
+    quats[i] = np.stack(((m[i, 1, 0] - m[i, 0, 1]) / s,
+                         (m[i, 0, 2] + m[i, 2, 0]) / s,
+                         (m[i, 1, 2] + m[i, 2, 1]) / s,
+                         0.25 * s), axis=1)
+
+    return quats
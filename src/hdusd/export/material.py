@@ -12,16 +12,226 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+import hashlib
+import time
+import threading
+from contextlib import contextmanager
+
 import bpy
 
-from pxr import Sdf, UsdShade, Tf
+from pxr import Usd, Sdf, UsdShade, UsdGeom, Tf, Gf
 import MaterialX as mx
 
-from .. import utils
+from .. import utils, config
+from ..utils import get_properties_values
+from ..utils.profiler import profiler
+from ..utils.image import texture_cache, image_files, get_texture_usage
 from ..utils import logging
 log = logging.Log('export.material')
 
 
+MATERIALS_PRIM_NAME = "Materials"
+
+# node properties which don't affect export of material
+NODE_UI_PROPERTIES = {'rna_type', 'label', 'location', 'width', 'width_hidden', 'height',
+                      'dimensions', 'select', 'show_options', 'show_preview', 'show_texture',
+                      'hide', 'color', 'use_custom_color', 'parent', 'hdusd'}
+
+# MaterialX type: (USD value type, value conversion) of inputs which are updated in place
+MX_USD_TYPES = {
+    'float': (Sdf.ValueTypeNames.Float, float),
+    'integer': (Sdf.ValueTypeNames.Int, int),
+    'boolean': (Sdf.ValueTypeNames.Bool, bool),
+    'string': (Sdf.ValueTypeNames.String, str),
+    'color3': (Sdf.ValueTypeNames.Color3f, Gf.Vec3f),
+    'color4': (Sdf.ValueTypeNames.Color4f, Gf.Vec4f),
+    'vector2': (Sdf.ValueTypeNames.Float2, Gf.Vec2f),
+    'vector3': (Sdf.ValueTypeNames.Float3, Gf.Vec3f),
+    'vector4': (Sdf.ValueTypeNames.Float4, Gf.Vec4f),
+}
+
+
+class MaterialXCache:
+    """
+    Cache of exported MaterialX files. Entries are keyed by material pointer and contain hash
+    of material node tree state, therefore any change of material nodes invalidates the entry.
+    Material used by several objects is exported and written to .mtlx file only once.
+    State hash of material is calculated once inside sync_scope(), not for every object.
+    """
+
+    def __init__(self):
+        self.entries = {}   # material pointer: (state hash, mx file, surfacematerial name)
+        self.stats = {}     # material name: [generations, hits, generation time]
+        self._local = threading.local()
+
+    @contextmanager
+    def sync_scope(self):
+        """
+        State hashes of materials are reused in current thread until the end of scope,
+        materials must not be changed inside it
+        """
+        if getattr(self._local, 'state_hashes', None) is not None:
+            # nested scope
+            yield
+            return
+
+        self._local.state_hashes = {}     # material pointer: state hash
+        try:
+            yield
+
+        finally:
+            self._local.state_hashes = None
+
+    def get_state_hash(self, mat: bpy.types.Material):
+        state_hashes = getattr(self._local, 'state_hashes', None)
+        if state_hashes is None:
+            return get_state_hash(mat)
+
+        key = mat.as_pointer()
+        state_hash = state_hashes.get(key)
+        if state_hash is None:
+            state_hash = state_hashes[key] = get_state_hash(mat)
+
+        return state_hash
+
+    def get(self, mat: bpy.types.Material, obj: bpy.types.Object):
+        """Returns (mx_file, surfacematerial name) or None if material export failed"""
+        key = mat.as_pointer()
+        state_hash = self.get_state_hash(mat)
+        stats = self.stats.setdefault(mat.name_full, [0, 0, 0.0])
+
+        entry = self.entries.get(key)
+        if self._is_valid(entry, state_hash):
+            stats[1] += 1
+            return entry[1:] if entry[1] else None
+
+        start_time = time.perf_counter()
+        doc, mx_file = self._export(mat, obj, state_hash)
+        entry = _write_doc(doc, mx_file, state_hash)
+
+        self.entries[key] = entry
+        stats[0] += 1
+        stats[2] += time.perf_counter() - start_time
+
+        return entry[1:] if entry[1] else None
+
+    def prepare(self, materials):
+        """
+        Exports all not cached materials before sync of objects, so material.sync() only binds
+        them. Materials are exported serially in main thread: node trees parsing reads Blender
+        data which isn't thread safe, and MaterialX bindings hold GIL while writing files.
+        """
+        for mat in materials:
+            key = mat.as_pointer()
+            state_hash = self.get_state_hash(mat)
+            if self._is_valid(self.entries.get(key), state_hash):
+                continue
+
+            start_time = time.perf_counter()
+            with profiler.timer('material', mat.name_full):
+                doc, mx_file = self._export(mat, None, state_hash)
+                self.entries[key] = _write_doc(doc, mx_file, state_hash)
+
+            stats = self.stats.setdefault(mat.name_full, [0, 0, 0.0])
+            stats[0] += 1
+            stats[2] += time.perf_counter() - start_time
+
+    @staticmethod
+    def _is_valid(entry, state_hash):
+        return entry and entry[0] == state_hash and (entry[1] is None or entry[1].is_file())
+
+    @staticmethod
+    def _export(mat, obj, state_hash):
+        """Returns MaterialX document of material and file path to write it"""
+        doc = mat.hdusd.export(obj)
+        if not doc:
+            return None, None
+
+        # file name contains state hash, so USD doesn't reuse layer of previous state
+        mx_file = utils.get_temp_file(".mtlx", f'{mat.name}{mat.hdusd.mx_node_tree.name if mat.hdusd.mx_node_tree else ""}_{state_hash[:8]}')
+        return doc, mx_file
+
+    def clear(self):
+        self.entries.clear()
+        self.stats.clear()
+
+    def report(self):
+        for name, (generations, hits, gen_time) in self.stats.items():
+            log.info(f"  {name}: generated {generations} times in {gen_time:.3f}s, "
+                     f"reused {hits} times, saved {gen_time / max(generations, 1) * hits:.3f}s")
+
+        log.info("Textures:")
+        for mat in bpy.data.materials:
+            if mat.as_pointer() not in self.entries:
+                continue
+
+            usage = [get_texture_usage(image, image_files[image.name_full])
+                     for image in get_images(mat) if image_files.get(image.name_full)]
+            if usage:
+                log.info(f"  {mat.name_full}: {len(usage)} textures, "
+                         f"disk {sum(u[0] for u in usage) / 1024 ** 2:.1f} MB, "
+                         f"memory {sum(u[1] for u in usage) / 1024 ** 2:.1f} MB")
+
+    def __str__(self):
+        generations = sum(stats[0] for stats in self.stats.values())
+        hits = sum(stats[1] for stats in self.stats.values())
+        saved_time = sum(stats[2] / max(stats[0], 1) * stats[1] for stats in self.stats.values())
+        return f"{len(self.entries)} materials, {generations} generations, {hits} hits, " \
+               f"saved {saved_time:.3f}s"
+
+
+def _write_doc(doc, mx_file, state_hash):
+    """Writes MaterialX document, returns cache entry"""
+    if not doc:
+        return state_hash, None, None
+
+    mx.writeToXmlFile(doc, str(mx_file))
+    surfacematerial = next(node for node in doc.getNodes()
+                           if node.getCategory() == 'surfacematerial')
+    return state_hash, mx_file, surfacematerial.getName()
+
+
+def get_state_hash(mat: bpy.types.Material):
+    """Returns hash of material data which affect its MaterialX export"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(mat.name_full.encode())
+
+    node_tree = mat.hdusd.mx_node_tree or (mat.node_tree if mat.use_nodes else None)
+    if node_tree:
+        _update_state_hash(h, node_tree, set())
+
+    return h.hexdigest()
+
+
+def _update_state_hash(h, node_tree, visited):
+    visited.add(node_tree.name_full)
+
+    for node in node_tree.nodes:
+        values = [node.bl_idname, get_properties_values(node, NODE_UI_PROPERTIES)]
+        for socket in node.inputs:
+            value = getattr(socket, 'default_value', None)
+            values.append(tuple(value) if hasattr(value, '__len__') and not isinstance(value, str)
+                          else value)
+
+        image = getattr(node, 'image', None)
+        if isinstance(image, bpy.types.Image):
+            values.append((image.filepath_raw, image.source, image.is_dirty,
+                           bool(image.packed_file), texture_cache.get_state(image)))
+
+        h.update(repr(values).encode())
+
+        sub_tree = getattr(node, 'node_tree', None)
+        if sub_tree and sub_tree.name_full not in visited:
+            _update_state_hash(h, sub_tree, visited)
+
+    for link in node_tree.links:
+        h.update(repr((link.from_node.name, link.from_socket.identifier, link.to_node.name,
+                       link.to_socket.identifier, link.is_muted)).encode())
+
+
+mx_cache = MaterialXCache()
+
+
 def sdf_name(mat: bpy.types.Material, input_socket_key='Surface'):
     ret = Tf.MakeValidIdentifier(mat.name_full)
     if input_socket_key != 'Surface':
@@ -30,6 +240,60 @@ def sdf_name(mat: bpy.types.Material, input_socket_key='Surface'):
     return ret
 
 
+def get_materials_prim(obj_prim, **kwargs):
+    """
+    Returns parent prim for material prims: scene level /Materials scope which is shared by all
+    objects, or object prim itself if kwargs contain shared_materials=False. Shared materials
+    can't be used for stages which top level prims are referenced separately (like stages of
+    USD nodes), because bindings to prims outside of the referenced prim are lost.
+    """
+    if not kwargs.get('shared_materials', True):
+        return obj_prim
+
+    return UsdGeom.Scope.Define(obj_prim.GetStage(), Sdf.Path.absoluteRootPath.AppendChild(
+        MATERIALS_PRIM_NAME)).GetPrim()
+
+
+def prepare(objects):
+    """Exports materials of objects before their sync, see MaterialXCache.prepare()"""
+    materials = [obj.original.material_slots[0].material for obj in objects
+                 if obj.original.material_slots and obj.original.material_slots[0].material]
+
+    # textures of all materials are converted in parallel while materials are parsed
+    texture_cache.prefetch(image for mat in materials for image in get_images(mat))
+    mx_cache.prepare(materials)
+
+
+def get_images(mat: bpy.types.Material):
+    """Returns images used by material nodes"""
+    images = {}
+    node_tree = mat.hdusd.mx_node_tree or (mat.node_tree if mat.use_nodes else None)
+    if node_tree:
+        _collect_images(node_tree, images, set())
+
+    return images.values()
+
+
+def _collect_images(node_tree, images, visited):
+    visited.add(node_tree.name_full)
+    for node in node_tree.nodes:
+        image = getattr(node, 'image', None)
+        if isinstance(image, bpy.types.Image):
+            images[image.name_full] = image
+
+        sub_tree = getattr(node, 'node_tree', None)
+        if sub_tree and sub_tree.name_full not in visited:
+            _collect_images(sub_tree, images, visited)
+
+
+def update_outdated():
+    """Updates exported materials which state was changed, e.g. their textures were converted"""
+    for mat in bpy.data.materials:
+        entry = mx_cache.entries.get(mat.as_pointer())
+        if entry and entry[0] != get_state_hash(mat):
+            mat.hdusd.update()
+
+
 def sync(materials_prim, mat: bpy.types.Material, obj: bpy.types.Object):
     """
     If material exists: returns existing material unless force_update is used
@@ -38,23 +302,23 @@ def sync(materials_prim, mat: bpy.types.Material, obj: bpy.types.Object):
 
     log("sync", mat, obj)
 
-    doc = mat.hdusd.export(obj)
-    if not doc:
+    with profiler.timer('material', mat.name_full):
+        entry = mx_cache.get(mat, obj)
+
+    if not entry:
         log.warn("MX export failed", mat)
         return None
 
-    mx_file = utils.get_temp_file(".mtlx", f'{mat.name}{mat.hdusd.mx_node_tree.name if mat.hdusd.mx_node_tree else ""}')
-    mx.writeToXmlFile(doc, str(mx_file))
-    surfacematerial = next(node for node in doc.getNodes()
-                           if node.getCategory() == 'surfacematerial')
+    mx_file, surfacematerial_name = entry
 
     stage = materials_prim.GetStage()
 
+    # material prim could be already synced for another object
     override_prim = stage.OverridePrim(materials_prim.GetPath().AppendChild(sdf_name(mat)))
-    override_prim.GetReferences().AddReference(f"./{mx_file.name}", "/MaterialX")
+    _set_reference(override_prim, mx_file)
 
     usd_mat = UsdShade.Material.Define(stage, override_prim.GetPath().AppendChild('Materials').
-                                       AppendChild(surfacematerial.getName()))
+                                       AppendChild(surfacematerial_name))
 
     return usd_mat
 
@@ -73,32 +337,97 @@ def sync_update(materials_prim, mat: bpy.types.Material, obj: bpy.types.Object):
     sync(materials_prim, mat, obj)
 
 
-def sync_update_all(root_prim, mat: bpy.types.Material):
+def _get_material_prims(root_prim, mat: bpy.types.Material):
+    """Returns (material prims of mat, is shared): shared material prim or prims of objects"""
     sdf_mat_name = sdf_name(mat)
+    shared_prim = root_prim.GetStage().GetPrimAtPath(
+        Sdf.Path.absoluteRootPath.AppendChild(MATERIALS_PRIM_NAME).AppendChild(sdf_mat_name))
+    if shared_prim:
+        return [shared_prim], True
+
     mat_prims = []
     for obj_prim in root_prim.GetAllChildren():
         mat_prim = obj_prim.GetChild(sdf_mat_name)
         if mat_prim:
             mat_prims.append(mat_prim)
 
+    return mat_prims, False
+
+
+def _set_reference(mat_prim, mx_file):
+    """
+    Sets reference of material prim to MaterialX file,
+    input values set over previous file by sync_update_inputs() are removed
+    """
+    def clear_inputs(prim_spec):
+        for prop_spec in tuple(prim_spec.properties):
+            if prop_spec.name.startswith('inputs:'):
+                prim_spec.RemoveProperty(prop_spec)
+
+        for child_spec in prim_spec.nameChildren:
+            clear_inputs(child_spec)
+
+    layer = mat_prim.GetStage().GetEditTarget().GetLayer()
+    mat_prim_spec = layer.GetPrimAtPath(mat_prim.GetPath())
+    if mat_prim_spec:
+        for child_spec in mat_prim_spec.nameChildren:
+            clear_inputs(child_spec)
+
+    mat_prim.GetReferences().SetReferences([Sdf.Reference(str(mx_file), "/MaterialX")])
+
+
+def sync_update_inputs(root_prim, mat: bpy.types.Material, mx_node_name, inputs):
+    """
+    Sets changed input values of MaterialX node to USD shaders of material prims instead of
+    updating the whole material. Values are set over referenced MaterialX file until material
+    is updated. inputs: {input name: (value, mx type)}.
+    Returns False if shaders weren't found or values couldn't be set, in this case material
+    has to be updated.
+    """
+    values = {}
+    for name, (val, mx_type) in inputs.items():
+        if mx_type not in MX_USD_TYPES:
+            return False
+
+        usd_type, convert = MX_USD_TYPES[mx_type]
+        values[name] = (usd_type, convert(val))
+
+    mat_prims, _ = _get_material_prims(root_prim, mat)
+    shader_name = Tf.MakeValidIdentifier(mx_node_name)
+    shaders = [UsdShade.Shader(prim) for mat_prim in mat_prims
+               for prim in Usd.PrimRange(mat_prim)
+               if prim.GetName() == shader_name and prim.IsA(UsdShade.Shader)]
+    if not shaders:
+        return False
+
+    log("sync_update_inputs", mat, mx_node_name, tuple(values))
+    for shader in shaders:
+        for name, (usd_type, val) in values.items():
+            shader.CreateInput(name, usd_type).Set(val)
+
+    return True
+
+
+def sync_update_all(root_prim, mat: bpy.types.Material):
+    """Updates material prims of mat: shared material prim or material prims of all objects"""
+    mat_prims, is_shared = _get_material_prims(root_prim, mat)
+    if is_shared:
+        _update_shared(mat_prims[0], mat)
+        return None
+
     if not mat_prims:
         return None
 
-    doc = mat.hdusd.export(None)
-    if not doc:
+    entry = mx_cache.get(mat, None)
+    if not entry:
         # removing rpr_materialx_node in all material_prims
         return None
 
-    surfacematerial = next(node for node in doc.getNodes()
-                           if node.getCategory() == 'surfacematerial')
-
+    mx_file, surfacematerial_name = entry
     stage = root_prim.GetStage()
-    mx_file = utils.get_temp_file(".mtlx", f'{mat.name}{mat.hdusd.mx_node_tree.name if mat.hdusd.mx_node_tree else ""}')
-    mx.writeToXmlFile(doc, str(mx_file))
 
     for mat_prim in mat_prims:
-        mat_prim.GetReferences().ClearReferences()
-        mat_prim.GetReferences().AddReference(f"./{mx_file.name}", "/MaterialX")
+        _set_reference(mat_prim, mx_file)
 
         # apply new bind if shader switched to MaterialX or vice versa
         mesh_prim = next((prim for prim in mat_prim.GetParent().GetChildren() if prim.GetTypeName() == 'Mesh'), None)
@@ -108,7 +437,7 @@ def sync_update_all(root_prim, mat: bpy.types.Material):
         bindings = UsdShade.MaterialBindingAPI(mesh_prim)
         rel_bind = bindings.GetDirectBindingRel()
 
-        sdf_path = mat_prim.GetPath().AppendChild('Materials').AppendChild(surfacematerial.getName())
+        sdf_path = mat_prim.GetPath().AppendChild('Materials').AppendChild(surfacematerial_name)
         sdf_path_old = next((target for target in rel_bind.GetTargets()), None)
 
         # check if bind path is changed
@@ -118,3 +447,39 @@ def sync_update_all(root_prim, mat: bpy.types.Material):
         usd_mat = UsdShade.Material.Define(stage, sdf_path)
         bindings.UnbindAllBindings()
         bindings.Bind(usd_mat)
+
+
+def _update_shared(mat_prim, mat: bpy.types.Material):
+    """
+    Updates reference of shared material prim, all meshes bound to it are updated by USD.
+    Meshes are rebound only if name of surfacematerial was changed.
+    """
+    entry = mx_cache.get(mat, None)
+    if not entry:
+        return
+
+    mx_file, surfacematerial_name = entry
+    stage = mat_prim.GetStage()
+
+    # collecting current bind paths before reference is changed
+    surfacematerials_prim = mat_prim.GetChild('Materials')
+    old_paths = {prim.GetPath() for prim in surfacematerials_prim.GetChildren()} \
+        if surfacematerials_prim else set()
+
+    _set_reference(mat_prim, mx_file)
+
+    sdf_path = mat_prim.GetPath().AppendChild('Materials').AppendChild(surfacematerial_name)
+    old_paths.discard(sdf_path)
+    if not old_paths:
+        return
+
+    usd_mat = UsdShade.Material.Define(stage, sdf_path)
+    for prim in stage.Traverse():
+        if prim.GetTypeName() != 'Mesh':
+            continue
+
+        bindings = UsdShade.MaterialBindingAPI(prim)
+        targets = bindings.GetDirectBindingRel().GetTargets()
+        if targets and targets[0] in old_paths:
+            bindings.UnbindAllBindings()
+            bindings.Bind(usd_mat)
@@ -13,6 +13,9 @@
 # limitations under the License.
 #********************************************************************
 from dataclasses import dataclass
+from collections import OrderedDict
+import hashlib
+import time
 import numpy as np
 import math
 
@@ -22,12 +25,20 @@ import bmesh
 import mathutils
 
 from . import material
+from .. import config
+from ..utils.profiler import profiler
 from ..utils import get_data_from_collection
+from ..utils import usd as usd_utils
 
 from ..utils import logging
 log = logging.Log('export.mesh')
 
 
+# quantization steps used for deduplication of face varying data
+NORMALS_PRECISION = 1e-5
+UVS_PRECISION = 1e-6
+
+
 @dataclass(init=False)
 class MeshData:
     """ Dataclass which holds all mesh settings. It is used also for area lights creation """
@@ -41,10 +52,31 @@ class MeshData:
     num_face_vertices: np.array
     vertex_colors: np.array = None
     area: float = None
+    normal_interpolation: str = UsdGeom.Tokens.faceVarying
+
+    @property
+    def nbytes(self):
+        """ Size of all numpy buffers held by this MeshData """
+        size = 0
+        for arr in (self.vertices, self.normals, self.uv_indices, self.vertex_indices,
+                    self.normal_indices, self.num_face_vertices, self.vertex_colors):
+            if isinstance(arr, np.ndarray):
+                size += arr.nbytes
+
+        for uvs, uv_indices in getattr(self, 'uv_layers', {}).values():
+            size += uvs.nbytes + uv_indices.nbytes
+
+        return size
 
     @staticmethod
-    def init_from_mesh(mesh: bpy.types.Mesh, calc_area=False, obj=None):
-        """ Returns MeshData from bpy.types.Mesh """
+    def init_from_mesh(mesh: bpy.types.Mesh, calc_area=False, obj=None, triangulate=None,
+                       calc_normals=True):
+        """
+        Returns MeshData from bpy.types.Mesh.
+        Mesh polygons are exported as is unless triangulate is True,
+        if triangulate is None then config.mesh_triangulate is used.
+        calc_normals is False if split normals of mesh are already calculated.
+        """
 
         # Looks more like Blender's bug that we have to check that mesh has calc_normals_split().
         # It is possible after deleting corresponded object with such mesh from the scene.
@@ -52,57 +84,104 @@ class MeshData:
             log.warn("No calc_normals_split() in mesh", mesh)
             return None
 
-        # preparing mesh to export
-        mesh.calc_normals_split()
-        mesh.calc_loop_triangles()
+        if triangulate is None:
+            triangulate = config.mesh_triangulate
 
-        # getting mesh export data
-        tris_len = len(mesh.loop_triangles)
-        if tris_len == 0:
-            return None
+        # preparing mesh to export
+        if calc_normals:
+            mesh.calc_normals_split()
+
+        loops_len = len(mesh.loops)
+        if triangulate:
+            mesh.calc_loop_triangles()
+            faces_len = len(mesh.loop_triangles)
+            if faces_len == 0:
+                return None
+
+            num_face_vertices = np.full((faces_len,), 3, dtype=np.int32)
+            loop_indices = get_data_from_collection(mesh.loop_triangles, 'loops',
+                                                    (faces_len * 3,), np.int32)
+        else:
+            faces_len = len(mesh.polygons)
+            if faces_len == 0:
+                return None
+
+            num_face_vertices = get_data_from_collection(mesh.polygons, 'loop_total',
+                                                         (faces_len,), np.int32)
+            loop_indices = _get_polygon_loop_indices(
+                get_data_from_collection(mesh.polygons, 'loop_start', (faces_len,), np.int32),
+                num_face_vertices)
+
+        def get_loops_data(attribute, size, dtype=np.float32):
+            data = get_data_from_collection(mesh.loops, attribute, size, dtype)
+            return data if loop_indices is None else data[loop_indices]
 
         data = MeshData()
         data.vertices = get_data_from_collection(mesh.vertices, 'co', (len(mesh.vertices), 3))
+        data.num_face_vertices = num_face_vertices
+        data.vertex_indices = get_loops_data('vertex_index', (loops_len,), np.int32)
+        data.normals = get_loops_data('normal', (loops_len, 3))
+        data.normal_indices = None
 
-        len_loop_triangles = len(mesh.loop_triangles)
-        data.normals = get_data_from_collection(mesh.loop_triangles, 'split_normals',
-                                                (len_loop_triangles * 3, 3))
+        # face varying data indices in loops data arrays
+        if loop_indices is None:
+            loop_indices = np.arange(len(data.vertex_indices), dtype=np.int32)
 
         data.uv_layers = {}
         data.uv_indices = None
         for uv_layer in mesh.uv_layers:
             uvs = get_data_from_collection(uv_layer.data, 'uv', (len(uv_layer.data), 2))
-            uv_indices = get_data_from_collection(mesh.loop_triangles, 'loops',
-                                                  (len_loop_triangles * 3,), np.int32)
             if len(uvs) > 0:
-                data.uv_layers[uv_layer.name] = (uvs, uv_indices)
-                data.uv_indices = uv_indices
-
-        data.num_face_vertices = np.full((tris_len,), 3, dtype=np.int32)
-        data.vertex_indices = get_data_from_collection(mesh.loop_triangles, 'vertices',
-                                                       (len_loop_triangles * 3,), np.int32)
-        data.normal_indices = np.arange(tris_len * 3, dtype=np.int32)
+                data.uv_layers[uv_layer.name] = (uvs, loop_indices)
+                data.uv_indices = loop_indices
 
         if calc_area:
-            data.area = sum(tri.area for tri in mesh.loop_triangles)
+            faces = mesh.loop_triangles if triangulate else mesh.polygons
+            data.area = float(get_data_from_collection(faces, 'area', (faces_len,)).sum())
 
         # set active vertex color map
         if mesh.vertex_colors.active:
             color_data = mesh.vertex_colors.active.data
-            # getting vertex colors and its indices (the same as uv_indices)
             colors = get_data_from_collection(color_data, 'color', (len(color_data), 4))
-            color_indices = data.uv_indices[0] if (data.uv_indices is not None and len(data.uv_indices) > 0) else \
-                get_data_from_collection(mesh.loop_triangles, 'loops',
-                                         (len_loop_triangles * 3,), np.int32)
 
             # preparing vertex_color buffer with the same size as vertices and
             # setting its data by indices from vertex colors
-            if colors[color_indices].size > 0:
+            if colors.size > 0:
                 data.vertex_colors = np.zeros((len(data.vertices), 4), dtype=np.float32)
-                data.vertex_colors[data.vertex_indices] = colors[color_indices]
+                data.vertex_colors[data.vertex_indices] = colors[loop_indices]
+
+        if config.mesh_compact_primvars:
+            size = data.nbytes
+            time_begin = time.perf_counter()
+            data.compact()
+            log(f"compact {mesh.name}: {size} -> {data.nbytes} bytes, "
+                f"{time.perf_counter() - time_begin:.3f} s")
 
         return data
 
+    def compact(self):
+        """
+        Converts face varying normals and UVs into indexed primvars with deduplicated values.
+        Normals are converted to vertex interpolation if they are smooth.
+        """
+        vertex_normals = np.zeros((len(self.vertices), 3), dtype=np.float32)
+        vertex_normals[self.vertex_indices] = self.normals
+        if np.array_equal(_quantize(vertex_normals[self.vertex_indices], NORMALS_PRECISION),
+                          _quantize(self.normals, NORMALS_PRECISION)):
+            self.normals = vertex_normals
+            self.normal_indices = None
+            self.normal_interpolation = UsdGeom.Tokens.vertex
+        else:
+            self.normals, self.normal_indices = _deduplicate(self.normals, NORMALS_PRECISION)
+
+        uv_layers = {}
+        for name, (uvs, uv_indices) in self.uv_layers.items():
+            uvs, indices = _deduplicate(uvs, UVS_PRECISION)
+            uv_layers[name] = (uvs, indices[uv_indices])
+            self.uv_indices = uv_layers[name][1]
+
+        self.uv_layers = uv_layers
+
     @staticmethod
     def init_from_shape_type(shape_type, size, size_y, segments):
         """
@@ -168,6 +247,125 @@ class MeshData:
             bm.free()
 
 
+def _quantize(values, precision):
+    return np.round(values / precision).astype(np.int64)
+
+
+def _deduplicate(values, precision):
+    """ Returns unique rows of values array and indices to restore values from them """
+    quantized = np.ascontiguousarray(_quantize(values, precision))
+    rows = quantized.view(np.dtype((np.void, quantized.itemsize * quantized.shape[1]))).ravel()
+    _, index, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return values[index], inverse.astype(np.int32).ravel()
+
+
+def _get_polygon_loop_indices(loop_start, loop_total):
+    """
+    Returns indices of polygon loops in mesh.loops ordered by polygons
+    or None if loops are already stored in polygons order
+    """
+    offsets = np.cumsum(loop_total, dtype=np.int32) - loop_total
+    if np.array_equal(loop_start, offsets):
+        return None
+
+    return np.repeat(loop_start - offsets, loop_total) + \
+        np.arange(offsets[-1] + loop_total[-1], dtype=np.int32)
+
+
+class MeshDataCache:
+    """
+    Process wide LRU cache of MeshData. It is shared between final render, viewport render
+    and USD node trees, so unchanged mesh is extracted from Blender only once.
+    Key consists of mesh pointer, export options and geometry fingerprint,
+    cache size is limited by max_size bytes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    @staticmethod
+    def fingerprint(mesh: bpy.types.Mesh):
+        """
+        Returns geometry fingerprint: elements counts plus hash of mesh buffers.
+        Split normals of mesh with custom normals have to be calculated before.
+        """
+        h = hashlib.blake2b(digest_size=16)
+
+        def update(collection, attribute, size, dtype=np.float32):
+            h.update(get_data_from_collection(collection, attribute, size, dtype).tobytes())
+
+        update(mesh.vertices, 'co', (len(mesh.vertices), 3))
+        update(mesh.loops, 'vertex_index', (len(mesh.loops),), np.int32)
+        update(mesh.polygons, 'use_smooth', (len(mesh.polygons),), bool)
+        # sharp edges split normals with auto smooth, seams are hashed with them as edge flags
+        update(mesh.edges, 'use_edge_sharp', (len(mesh.edges),), bool)
+        update(mesh.edges, 'use_seam', (len(mesh.edges),), bool)
+        if mesh.has_custom_normals:
+            # custom normals layer isn't accessible, they are hashed as split normals
+            update(mesh.loops, 'normal', (len(mesh.loops), 3))
+
+        for uv_layer in mesh.uv_layers:
+            update(uv_layer.data, 'uv', (len(uv_layer.data), 2))
+
+        if mesh.vertex_colors.active:
+            color_data = mesh.vertex_colors.active.data
+            update(color_data, 'color', (len(color_data), 4))
+
+        return (len(mesh.vertices), len(mesh.loops), len(mesh.polygons),
+                mesh.use_auto_smooth, mesh.auto_smooth_angle, mesh.has_custom_normals,
+                h.digest())
+
+    def get(self, mesh: bpy.types.Mesh, calc_area=False, obj=None, triangulate=None):
+        """ Returns cached MeshData or extracts it from mesh and puts into cache """
+        if triangulate is None:
+            triangulate = config.mesh_triangulate
+
+        if not hasattr(mesh, 'calc_normals_split'):
+            return MeshData.init_from_mesh(mesh, calc_area, obj, triangulate)
+
+        # split normals are calculated once for fingerprint and export
+        is_normals_calculated = mesh.has_custom_normals
+        if is_normals_calculated:
+            mesh.calc_normals_split()
+
+        key = (mesh.as_pointer(), calc_area, triangulate, config.mesh_compact_primvars,
+               self.fingerprint(mesh))
+        if key in self._items:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+        self.misses += 1
+        data = MeshData.init_from_mesh(mesh, calc_area, obj, triangulate,
+                                       calc_normals=not is_normals_calculated)
+        size = data.nbytes if data else 0
+        if size > self.max_size:
+            return data
+
+        self._items[key] = (data, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, item_size) = self._items.popitem(last=False)
+            self.size -= item_size
+
+        return data
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+    def __str__(self):
+        return f"items={len(self._items)}, size={self.size / 1024 ** 2:.1f}MB, " \
+               f"hits={self.hits}, misses={self.misses}"
+
+
+mesh_cache = MeshDataCache(config.mesh_cache_size * 1024 ** 2)
+
+
 def sync_visibility(rpr_context, obj: bpy.types.Object, rpr_shape, indirect_only: bool = False):
     from hdusd.engine.viewport_engine import ViewportEngine
 
@@ -200,7 +398,9 @@ def sync(obj_prim, obj: bpy.types.Object, mesh: bpy.types.Mesh = None, **kwargs)
 
     log("sync", mesh, obj)
 
-    data = MeshData.init_from_mesh(mesh, obj=obj)
+    with profiler.timer('mesh', mesh.name_full):
+        data = mesh_cache.get(mesh, obj=obj)
+
     if not data:
         return
 
@@ -216,7 +416,7 @@ def sync(obj_prim, obj: bpy.types.Object, mesh: bpy.types.Mesh = None, **kwargs)
         xform = UsdGeom.Xform.Define(stage, f"/{sdf_name(obj.original)}")
         parent_prim = xform.GetPrim()
         xform.MakeMatrixXform().Set(Gf.Matrix4d(parent_object.matrix_world.transposed()))
-        sync(parent_prim, parent_object)
+        sync(parent_prim, parent_object, **kwargs)
 
     if parent_prim is not None and parent_prim.IsValid() and parent_prim.GetChildren():
         for child in parent_prim.GetChildren():
@@ -232,39 +432,65 @@ def sync(obj_prim, obj: bpy.types.Object, mesh: bpy.types.Mesh = None, **kwargs)
         return
 
     original_prim = stage.GetPrimAtPath(f"/{sdf_name(obj.original)}")
-    if original_prim and original_prim.IsValid():
+    # PointInstancer prototype is exported even if original object is already exported
+    if original_prim and original_prim.IsValid() and not kwargs.get('is_prototype', False):
         for child in original_prim.GetChildren():
             if len(child.GetAuthoredPropertyNames()) > 0:
                 return
 
-    usd_mesh = UsdGeom.Mesh.Define(stage, obj_prim.GetPath().AppendChild(
-        Tf.MakeValidIdentifier(mesh.name)))
-
-    usd_mesh.CreateDoubleSidedAttr(True)
-    usd_mesh.CreatePointsAttr(data.vertices)
-    usd_mesh.CreateFaceVertexIndicesAttr(data.vertex_indices)
-    usd_mesh.CreateFaceVertexCountsAttr(data.num_face_vertices)
-
-    usd_mesh.CreateSubdivisionSchemeAttr(UsdGeom.Tokens.none)
-    usd_mesh.CreateNormalsAttr(data.normals)
-    usd_mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
-
-    for name, uv_layer in data.uv_layers.items():
-        uv_primvar = usd_mesh.CreatePrimvar("st",   # default name, later we'll use sdf_path(name)
-                                            Sdf.ValueTypeNames.TexCoord2fArray,
-                                            UsdGeom.Tokens.faceVarying)
-        uv_primvar.Set(uv_layer[0])
-        uv_primvar.SetIndices(Vt.IntArray.FromNumpy(uv_layer[1]))
+    mesh_path = obj_prim.GetPath().AppendChild(Tf.MakeValidIdentifier(mesh.name))
+    with Sdf.ChangeBlock():
+        _write_mesh_spec(stage, mesh_path, data)
+
+    usd_mesh = UsdGeom.Mesh.Get(stage, mesh_path)
+
+    if kwargs.get('export_materials', True):
+        _assign_materials(obj_prim, obj.original, usd_mesh, **kwargs)
+
+
+def _write_mesh_spec(stage, mesh_path, data: MeshData):
+    """
+    Writes mesh prim with Sdf API, the same as with UsdGeom.Mesh API, but it is used inside
+    Sdf.ChangeBlock, so all attributes are authored with one change notification
+    """
+    prim_spec = usd_utils.define_prim_spec(stage, mesh_path, 'Mesh')
+
+    set_attr = usd_utils.set_attr_spec
+    set_attr(prim_spec, 'doubleSided', Sdf.ValueTypeNames.Bool, True, Sdf.VariabilityUniform)
+    set_attr(prim_spec, 'points', Sdf.ValueTypeNames.Point3fArray,
+             usd_utils.vt_array(Vt.Vec3fArray, data.vertices))
+    set_attr(prim_spec, 'faceVertexIndices', Sdf.ValueTypeNames.IntArray,
+             usd_utils.vt_array(Vt.IntArray, data.vertex_indices, np.int32))
+    set_attr(prim_spec, 'faceVertexCounts', Sdf.ValueTypeNames.IntArray,
+             usd_utils.vt_array(Vt.IntArray, data.num_face_vertices, np.int32))
+    set_attr(prim_spec, 'subdivisionScheme', Sdf.ValueTypeNames.Token, UsdGeom.Tokens.none,
+             Sdf.VariabilityUniform)
+
+    normals = usd_utils.vt_array(Vt.Vec3fArray, data.normals)
+    if data.normal_indices is None:
+        set_attr(prim_spec, 'normals', Sdf.ValueTypeNames.Normal3fArray, normals,
+                 interpolation=data.normal_interpolation)
+    else:
+        set_attr(prim_spec, 'primvars:normals', Sdf.ValueTypeNames.Normal3fArray, normals,
+                 interpolation=data.normal_interpolation)
+        set_attr(prim_spec, 'primvars:normals:indices', Sdf.ValueTypeNames.IntArray,
+                 usd_utils.vt_array(Vt.IntArray, data.normal_indices, np.int32))
+
+    for name, (uvs, uv_indices) in data.uv_layers.items():
+        # default name, later we'll use sdf_path(name)
+        set_attr(prim_spec, 'primvars:st', Sdf.ValueTypeNames.TexCoord2fArray,
+                 usd_utils.vt_array(Vt.Vec2fArray, uvs), interpolation=UsdGeom.Tokens.faceVarying)
+        set_attr(prim_spec, 'primvars:st:indices', Sdf.ValueTypeNames.IntArray,
+                 usd_utils.vt_array(Vt.IntArray, uv_indices, np.int32))
 
         break   # currently we use only first UV layer
 
-    _assign_materials(obj_prim, obj.original, usd_mesh)
-
 
-def _assign_materials(obj_prim, obj, usd_mesh):
+def _assign_materials(obj_prim, obj, usd_mesh, **kwargs):
     usd_mat = None
     if obj.material_slots and obj.material_slots[0].material:
-        usd_mat = material.sync(obj_prim, obj.material_slots[0].material, obj)
+        usd_mat = material.sync(material.get_materials_prim(obj_prim, **kwargs),
+                                obj.material_slots[0].material, obj)
 
     if usd_mat:
         UsdShade.MaterialBindingAPI(usd_mesh).Bind(usd_mat)
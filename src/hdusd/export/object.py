@@ -14,17 +14,24 @@
 #********************************************************************
 from dataclasses import dataclass
 
-from pxr import UsdGeom, Gf, Tf, UsdShade
+import numpy as np
+
+from pxr import UsdGeom, Gf, Tf, UsdShade, Sdf
 import bpy
 import mathutils
 
-from . import mesh, camera, to_mesh, light, material
+from . import mesh, camera, to_mesh, light, material, instancer
+from .. import config
+from ..utils import usd as usd_utils
+from ..utils.profiler import profiler
 
 from ..utils import logging
 log = logging.Log('export.object')
 
 
 SUPPORTED_TYPES = ('MESH', 'LIGHT', 'CURVE', 'FONT', 'SURFACE', 'META', 'CAMERA', 'EMPTY')
+INSTANCER_TYPES = ('MESH', 'CURVE', 'FONT', 'SURFACE', 'META')
+INSTANCER_SUFFIX = "_Instances"
 
 
 @dataclass(init=False)
@@ -34,6 +41,8 @@ class ObjectData:
     transform: mathutils.Matrix
     parent: bpy.types.Object
     is_particle: bool
+    instance_matrices: np.ndarray   # world matrices of instances exported as PointInstancer
+    instanced_objects: set          # names of objects which instances are in PointInstancer
 
     @staticmethod
     def from_object(obj):
@@ -43,6 +52,8 @@ class ObjectData:
         data.transform = obj.matrix_world.transposed()
         data.parent = obj.parent
         data.is_particle = False
+        data.instance_matrices = None
+        data.instanced_objects = None
         return data
 
     @staticmethod
@@ -53,16 +64,39 @@ class ObjectData:
         data.transform = instance.matrix_world.transposed()
         data.parent = instance.parent
         data.is_particle = bool(instance.particle_system)
+        data.instance_matrices = None
+        data.instanced_objects = None
         return data
 
+    @staticmethod
+    def from_instances(obj, matrices, instanced_objects):
+        """
+        Data of PointInstancer of instances which share object data and materials,
+        obj is one of instanced objects, its data is exported as prototype
+        """
+        data = ObjectData.from_object(obj)
+        data.transform = mathutils.Matrix.Identity(4)
+        data.parent = None
+        data.instance_matrices = np.array(matrices, dtype=np.float64)
+        data.instanced_objects = instanced_objects
+        return data
+
+    @property
+    def is_instancer(self):
+        return self.instance_matrices is not None
+
     @property
     def sdf_name(self):
         name = Tf.MakeValidIdentifier(self.object.name_full)
+        if self.is_instancer:
+            return f"{name}{INSTANCER_SUFFIX}"
+
         return name if self.instance_id == 0 else f"{name}_{self.instance_id}"
 
     @staticmethod
     def depsgraph_objects(depsgraph, *, space_data=None,
                           use_scene_lights=True, use_scene_cameras=True):
+        instancers = {}     # instancer key: (object, instance matrices, object names)
         for instance in depsgraph.object_instances:
             obj = instance.object
             if obj.type not in SUPPORTED_TYPES or instance.object.hdusd.is_usd:
@@ -77,8 +111,36 @@ class ObjectData:
             if space_data and not instance.is_instance and not obj.visible_in_viewport_get(space_data):
                 continue
 
+            if config.export_instancing and instance.is_instance and \
+                    obj.type in INSTANCER_TYPES:
+                # gathering instances which share object data to export them as one
+                # PointInstancer
+                key = instancer_key(obj)
+                instances = instancers.get(key)
+                if instances is None:
+                    instances = instancers[key] = (obj.original, [], set())
+
+                instances[1].append(instance.matrix_world)
+                instances[2].add(obj.name_full)
+                continue
+
             yield ObjectData.from_instance(instance)
 
+        for obj, matrices, names in instancers.values():
+            yield ObjectData.from_instances(obj.evaluated_get(depsgraph), matrices, names)
+
+
+def instancer_key(obj: bpy.types.Object):
+    """
+    Returns key of instances which can share prototype: evaluated mesh and materials of slots,
+    as materials can be linked to object. Evaluated mesh of object with modifiers and data
+    of other types are converted per object, such objects aren't shared.
+    """
+    data_key = obj.data.as_pointer() if obj.type == 'MESH' and not obj.modifiers else \
+        obj.original.as_pointer()
+    return data_key, tuple(slot.material.name_full if slot.material else ""
+                           for slot in obj.material_slots)
+
 
 def sdf_name(obj: bpy.types.Object):
     return Tf.MakeValidIdentifier(obj.name_full)
@@ -94,17 +156,32 @@ def get_transform_local(obj: bpy.types.Object):
 
 def sync(objects_prim, obj_data: ObjectData, **kwargs):
     """ sync the object and any data attached """
+    with profiler.timer('object', obj_data.sdf_name):
+        _sync_object(objects_prim, obj_data, **kwargs)
+
+
+def _sync_object(objects_prim, obj_data: ObjectData, **kwargs):
     log("sync", obj_data.object, obj_data.instance_id)
 
     stage = objects_prim.GetStage()
-    xform = UsdGeom.Xform.Define(stage, objects_prim.GetPath().AppendChild(obj_data.sdf_name))
-    obj_prim = xform.GetPrim()
+    obj_path = objects_prim.GetPath().AppendChild(obj_data.sdf_name)
+
+    # defining Xform prim with transform in one change block
+    with Sdf.ChangeBlock():
+        prim_spec = usd_utils.define_prim_spec(stage, obj_path, 'Xform')
+        usd_utils.set_transform_spec(prim_spec, Gf.Matrix4d(obj_data.transform))
 
-    # setting transform
-    xform.MakeMatrixXform().Set(Gf.Matrix4d(obj_data.transform))
+    obj_prim = stage.GetPrimAtPath(obj_path)
 
     obj = obj_data.object
 
+    if obj_data.is_instancer:
+        instancer.sync(obj_prim.GetPath().AppendChild(sdf_name(obj.original)), stage, obj,
+                       obj_data.instance_matrices,
+                       lambda prototype_prim, obj: _sync_data(prototype_prim, obj,
+                                                              is_prototype=True, **kwargs))
+        return
+
     if obj_data.is_particle:
         orig_obj_path = objects_prim.GetPath().AppendChild(sdf_name(obj.original))
         usd_mesh = UsdGeom.Mesh.Define(stage, obj_prim.GetPath().AppendChild(
@@ -112,8 +189,10 @@ def sync(objects_prim, obj_data: ObjectData, **kwargs):
         mesh_prim = stage.DefinePrim(orig_obj_path.AppendChild(sdf_name(obj.data)), 'Mesh')
         usd_mesh.GetPrim().GetReferences().AddInternalReference(mesh_prim.GetPath())
 
-        if obj.active_material:
-            material_prim = stage.DefinePrim(orig_obj_path.AppendChild(
+        orig_obj_prim = stage.GetPrimAtPath(orig_obj_path)
+        if obj.active_material and orig_obj_prim.IsValid():
+            materials_prim = material.get_materials_prim(orig_obj_prim, **kwargs)
+            material_prim = stage.DefinePrim(materials_prim.GetPath().AppendChild(
                 material.sdf_name(obj.active_material)), 'Material')
 
             usd_material = UsdShade.Material.Get(stage, material_prim.GetPath())
@@ -121,6 +200,10 @@ def sync(objects_prim, obj_data: ObjectData, **kwargs):
 
         return
 
+    _sync_data(obj_prim, obj, **kwargs)
+
+
+def _sync_data(obj_prim, obj, **kwargs):
     if obj.type == 'MESH':
         if obj.mode == 'OBJECT':
             # if in edit mode use to_mesh
@@ -153,26 +236,77 @@ def sync_update(root_prim, obj_data: ObjectData, is_updated_geometry, is_updated
         sync(root_prim, obj_data, **kwargs)
         return
 
+    if obj_data.is_instancer:
+        _sync_update_instancer(obj_prim, obj_data, is_updated_geometry, **kwargs)
+        return
+
     if is_updated_transform:
-        xform = UsdGeom.Xform(obj_prim)
-        xform.MakeMatrixXform().Set(Gf.Matrix4d(obj_data.transform))
+        stage = obj_prim.GetStage()
+        with Sdf.ChangeBlock():
+            prim_spec = Sdf.CreatePrimInLayer(stage.GetEditTarget().GetLayer(),
+                                              obj_prim.GetPath())
+            usd_utils.set_transform_spec(prim_spec, Gf.Matrix4d(obj_data.transform))
 
     if is_updated_geometry:
-        obj = obj_data.object
-        if obj.type == 'MESH':
-            if obj.mode == 'OBJECT':
-                mesh.sync_update(obj_prim, obj, **kwargs)
-            else:
-                to_mesh.sync_update(obj_prim, obj, **kwargs)
-
-        elif obj.type == 'LIGHT':
-            light.sync_update(obj_prim, obj, **kwargs)
-
-        elif obj.type == 'CAMERA':
-            camera.sync_update(obj_prim, obj, **kwargs)
+        _sync_update_data(obj_prim, obj_data.object, **kwargs)
 
-        elif obj.type in ('EMPTY', 'ARMATURE'):
-            pass
 
+def _sync_update_data(obj_prim, obj, **kwargs):
+    if obj.type == 'MESH':
+        if obj.mode == 'OBJECT':
+            mesh.sync_update(obj_prim, obj, **kwargs)
         else:
             to_mesh.sync_update(obj_prim, obj, **kwargs)
+
+    elif obj.type == 'LIGHT':
+        light.sync_update(obj_prim, obj, **kwargs)
+
+    elif obj.type == 'CAMERA':
+        camera.sync_update(obj_prim, obj, **kwargs)
+
+    elif obj.type in ('EMPTY', 'ARMATURE'):
+        pass
+
+    else:
+        to_mesh.sync_update(obj_prim, obj, **kwargs)
+
+
+def _sync_update_instancer(obj_prim, obj_data: ObjectData, is_updated_geometry, **kwargs):
+    """
+    Rewrites instance transforms only if they were changed, prototype is synced again only if
+    geometry of instanced object was updated. Returns True if instancer was updated.
+    """
+    obj = obj_data.object
+    stage = obj_prim.GetStage()
+    instancer_path = obj_prim.GetPath().AppendChild(sdf_name(obj.original))
+
+    is_updated = instancer.sync_update(instancer_path, stage, obj_data.instance_matrices)
+    if is_updated_geometry:
+        prototype_prim = instancer.get_prototype_prim(instancer_path, stage, obj)
+        _sync_update_data(prototype_prim, obj, is_prototype=True, **kwargs)
+        is_updated = True
+
+    return is_updated
+
+
+def sync_update_instancers(root_prim, objects_data, updated_geometry_names=(), **kwargs):
+    """
+    Updates existing instancers of objects_data. updated_geometry_names - names of objects
+    which geometry was updated, prototypes of their instancers are synced again.
+    Instancers which don't exist aren't synced. Returns True if any instancer was updated.
+    """
+    instancer_keys = {prim.GetName() for prim in root_prim.GetAllChildren()
+                      if prim.GetName().endswith(INSTANCER_SUFFIX)}
+    if not instancer_keys:
+        return False
+
+    is_updated = False
+    for obj_data in objects_data:
+        if not obj_data.is_instancer or obj_data.sdf_name not in instancer_keys:
+            continue
+
+        is_updated_geometry = not obj_data.instanced_objects.isdisjoint(updated_geometry_names)
+        is_updated |= _sync_update_instancer(root_prim.GetChild(obj_data.sdf_name), obj_data,
+                                             is_updated_geometry, **kwargs)
+
+    return is_updated
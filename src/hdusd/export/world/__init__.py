@@ -23,6 +23,7 @@ from pxr import Sdf, UsdLux, Tf
 from ...utils.image import cache_image_file, cache_image_file_path
 from ...utils import BLENDER_DATA_DIR
 from ...utils import usd as usd_utils
+from ...utils.profiler import profiler
 
 from ...utils import logging
 log = logging.Log('export.world')
@@ -180,6 +181,11 @@ class WorldData:
 
 
 def sync(root_prim, world: bpy.types.World, shading: ShadingData = None):
+    with profiler.timer('world', world.name_full if world else ""):
+        _sync(root_prim, world, shading)
+
+
+def _sync(root_prim, world: bpy.types.World, shading: ShadingData = None):
     if shading:
         data = WorldData.init_from_shading(shading, world)
     else:
@@ -16,7 +16,7 @@ import math
 
 import bpy
 
-from ...utils import pass_node_reroute
+from ...utils import pass_node_reroute, get_node_key
 
 from . import log
 
@@ -190,10 +190,11 @@ class NodeParser:
     """
 
     def __init__(self, world: bpy.types.World,
-                 node: bpy.types.Node, out_key, **kwargs):
+                 node: bpy.types.Node, out_key, cached_nodes, **kwargs):
         self.world = world
         self.node = node
         self.out_key = out_key
+        self.cached_nodes = cached_nodes
         self.kwargs = kwargs
 
     @staticmethod
@@ -204,14 +205,23 @@ class NodeParser:
 
     # INTERNAL FUNCTIONS
     def _export_node(self, node, out_key, group_node=None):
+        # check if this node output was already parsed for another consumer
+        key = get_node_key(node, out_key)
+        if key in self.cached_nodes:
+            return self.cached_nodes[key]
+
         # getting corresponded NodeParser class
         NodeParser_cls = self.get_node_parser_cls(node.bl_idname)
         if not NodeParser_cls:
             log.warn("Ignoring unsupported node", node, self.world)
+            self.cached_nodes[key] = None
             return None
 
-        node_parser = NodeParser_cls(self.world, node, out_key, **self.kwargs)
-        return node_parser.export()
+        node_parser = NodeParser_cls(self.world, node, out_key, self.cached_nodes, **self.kwargs)
+        node_item = node_parser.export()
+
+        self.cached_nodes[key] = node_item
+        return node_item
 
     def _parse_val(self, val):
         """Turn blender socket value into python's value"""
@@ -17,7 +17,7 @@ from .node_parser import NodeParser
 
 class ShaderNodeOutputWorld(NodeParser):
     def __init__(self, world, node, **kwargs):
-        super().__init__(world, node, None, **kwargs)
+        super().__init__(world, node, None, {}, **kwargs)
 
     def export(self):
         return self.get_input_link('Surface')
@@ -18,8 +18,10 @@ import MaterialX as mx
 
 import bpy
 
-from .nodes import get_mx_node_cls
+from .nodes import (get_mx_node_cls, get_category, is_category_registered, is_all_registered,
+                    register_mx_nodes, request_registration)
 from ..utils import mx as mx_utils
+from ..utils.image import texture_cache
 from . import log
 
 
@@ -29,6 +31,81 @@ NODE_LAYER_SHIFT_Y = 100
 AREA_TO_UPDATE = 'PROPERTIES'
 REGION_TO_UPDATE = 'WINDOW'
 
+# custom property of node tree with MxNode categories of its nodes, it is used to register
+# classes of these categories before nodes are accessed
+USED_CATEGORIES_PROP = 'hdusd_mx_categories'
+
+
+class ExportCache:
+    """
+    Exported MaterialX document of node tree with node properties it was exported with.
+    Cache is valid until node tree is changed: MxNodeTree.update_() removes it,
+    if only input values of a node are changed, MxNodeTree.update_node() patches them
+    in the cached document, so the document isn't exported again.
+    """
+
+    def __init__(self, doc, export_keys, values, use_placeholders):
+        self.doc = doc
+        self.export_keys = export_keys  # {(node name, export key)}
+        self.values = values            # node name: {input name: value}
+        self.use_placeholders = use_placeholders
+
+    def update_node(self, node):
+        """
+        Patches changed input values of node in cached document.
+        Returns {input name: (value, mx type)} of changed inputs or None if node can't be
+        patched and the whole node tree has to be exported.
+        """
+        old_values = self.values.get(node.name)
+        if old_values is None or (node.name, node.export_key) not in self.export_keys:
+            return None
+
+        values = node.get_export_values()
+        nodedef = node.nodedef
+        inputs = {}
+        for name, val in values.items():
+            if old_values.get(name) == val:
+                continue
+
+            nd_input = nodedef.getInput(name)
+            nd_type = nd_input.getType()
+            socket = node.inputs.get(name)
+            if (socket and socket.is_linked) or nd_type == 'filename' or \
+                    mx_utils.is_shader_type(nd_type) or nd_type.endswith('array'):
+                return None
+
+            inputs[name] = (node.get_param_value(name), nd_type)
+
+        self.values[node.name] = values
+
+        node_path = node.mx_node_path
+        mx_nodegraph = mx_utils.get_nodegraph_by_node_path(self.doc, node_path)
+        mx_node = mx_nodegraph.getNode(mx_utils.get_node_name_by_node_path(node_path)) \
+            if mx_nodegraph else None
+        if not mx_node:
+            # node isn't connected to output, its values don't affect material
+            return {}
+
+        for name, (val, nd_type) in inputs.items():
+            # the same as in MxNode.compute(): inputs with default values aren't exported
+            if mx_utils.is_value_equal(nodedef.getInput(name).getValue(), val, nd_type):
+                if mx_node.getInput(name):
+                    mx_node.removeInput(name)
+                continue
+
+            mx_input = mx_node.getInput(name) or mx_node.addInput(name, nd_type)
+            mx_utils.set_param_value(mx_input, val, nd_type)
+
+        return inputs
+
+
+_export_caches = {}     # node tree pointer: ExportCache
+
+
+def clear_export_caches():
+    """Node trees are changed without update calls on file load and undo"""
+    _export_caches.clear()
+
 
 class MxNodeTree(bpy.types.ShaderNodeTree):
     """
@@ -43,7 +120,54 @@ class MxNodeTree(bpy.types.ShaderNodeTree):
 
     @classmethod
     def poll(cls, context):
-        return context.engine in cls.COMPAT_ENGINES
+        if context.engine not in cls.COMPAT_ENGINES:
+            return False
+
+        # MxNode classes of edited node tree have to be registered before its nodes are drawn,
+        # registration isn't allowed during drawing, therefore it is done in timer
+        tree = getattr(context.space_data, 'edit_tree', None)
+        if tree and tree.bl_idname == cls.bl_idname and not tree.is_registered():
+            request_registration(tree.get_used_categories())
+
+        return True
+
+    def get_used_categories(self):
+        """Returns set of MxNode categories used by node tree or None if they are unknown"""
+        categories = self.get(USED_CATEGORIES_PROP)
+        return None if categories is None else {c for c in categories.split(';') if c}
+
+    def is_registered(self):
+        """Checks if MxNode classes used by node tree are registered"""
+        categories = self.get_used_categories()
+        if categories is None:
+            return is_all_registered()
+
+        return all(is_category_registered(c) for c in categories)
+
+    def ensure_registered(self):
+        """
+        Registers MxNode classes used by node tree, it works only in main thread.
+        Returns True if classes are registered.
+        """
+        if not self.is_registered():
+            register_mx_nodes(self.get_used_categories())
+
+        return self.is_registered()
+
+    def _update_used_categories(self):
+        from .nodes.base_node import MxNode
+
+        categories = set()
+        for node in self.nodes:
+            if isinstance(node, MxNode):
+                categories.add(node.category)
+            elif not isinstance(node, (bpy.types.NodeReroute, bpy.types.NodeFrame)):
+                # node of not registered class, categories can't be defined
+                return
+
+        value = ';'.join(sorted(categories))
+        if self.get(USED_CATEGORIES_PROP) != value:
+            self[USED_CATEGORIES_PROP] = value
 
     @property
     def output_node(self):
@@ -71,15 +195,37 @@ class MxNodeTree(bpy.types.ShaderNodeTree):
         if not output_node:
             return None
 
+        use_placeholders = texture_cache.use_placeholders
+        cache = _export_caches.get(self.as_pointer())
+        # animated properties are changed without update calls
+        if cache and cache.use_placeholders == use_placeholders and not self.animation_data:
+            log("export: cached", self)
+            return cache.doc.copy()
+
         doc = mx.createDocument()
 
         surfacematerial = output_node.compute(0, doc=doc)
         if not surfacematerial:
+            _export_caches.pop(self.as_pointer(), None)
             return None
 
+        _export_caches[self.as_pointer()] = ExportCache(doc.copy(), *self._get_export_state(),
+                                                        use_placeholders)
         return doc
 
+    def _get_export_state(self):
+        """Returns (export keys, values) of nodes, they are used to patch cached document"""
+        from .nodes.base_node import MxNode
+
+        nodes = [node for node in self.nodes if isinstance(node, MxNode)]
+        export_keys = {(node.name, node.export_key) for node in nodes}
+        values = {node.name: node.get_export_values() for node in nodes}
+        return export_keys, values
+
     def import_(self, doc: mx.Document, file_path):
+        # any MxNode class can be used by imported document
+        register_mx_nodes()
+
         def prepare_for_import():
             surfacematerial = next(
                 (n for n in doc.getNodes() if n.getCategory() == 'surfacematerial'), None)
@@ -230,6 +376,9 @@ class MxNodeTree(bpy.types.ShaderNodeTree):
 
     def create_basic_nodes(self, node_name='PBR_standard_surface'):
         """ Reset basic node tree structure using scene or USD file as an input """
+        register_mx_nodes({get_category('hdusd.MxNode_STD_surfacematerial'),
+                           get_category(f'hdusd.MxNode_{node_name}')})
+
         def create_nodes():
             self.nodes.clear()
 
@@ -249,11 +398,42 @@ class MxNodeTree(bpy.types.ShaderNodeTree):
 
         self.update_()
 
+    def update_node(self, node):
+        """
+        Called on change of node property. If only input values of the node were changed,
+        they are patched in exported document and in USD shaders of materials which use
+        this node tree, otherwise materials are fully updated.
+        """
+        if not self._do_update:
+            return
+
+        cache = _export_caches.get(self.as_pointer())
+        inputs = cache.update_node(node) if cache else None
+        if inputs is None:
+            self.update_()
+            return
+
+        if inputs:
+            mx_node_name = mx_utils.get_node_name_by_node_path(node.mx_node_path)
+            for material in bpy.data.materials:
+                if material.hdusd.mx_node_tree and \
+                        material.hdusd.mx_node_tree.name == self.name:
+                    material.hdusd.update_inputs(mx_node_name, inputs)
+
+        self._redraw_properties()
+
     def update_(self):
+        _export_caches.pop(self.as_pointer(), None)
+        self._update_used_categories()
+
         for material in bpy.data.materials:
             if material.hdusd.mx_node_tree and material.hdusd.mx_node_tree.name == self.name:
                 material.hdusd.update()
 
+        self._redraw_properties()
+
+    @staticmethod
+    def _redraw_properties():
         for window in bpy.context.window_manager.windows:
             for area in window.screen.areas:
                 if area.type == AREA_TO_UPDATE:
@@ -13,47 +13,202 @@
 # limitations under the License.
 # ********************************************************************
 import importlib
+import threading
 from pathlib import Path
 
 import bpy
 import nodeitems_utils
 
 from .. import log
-from . import base_node, categories
 
-gen_modules = [importlib.import_module(f"hdusd.mx_nodes.nodes.{f.name[:-len(f.suffix)]}")
-               for f in Path(__file__).parent.glob("gen_*.py")]
 
-mx_node_classes = []
-for mod in gen_modules:
-    mx_node_classes.extend(mod.mx_node_classes)
+# Generated modules with MxNode classes are imported on first use. Their classes are registered
+# in Blender by categories when MaterialX node tree uses them or node of the category is added,
+# because there are hundreds of them and they slow down Blender startup.
+# Registration is done only in main thread: on file load, on depsgraph update or in timer.
+gen_module_names = sorted(f"hdusd.mx_nodes.nodes.{f.stem}"
+                          for f in Path(__file__).parent.glob("gen_*.py"))
+_gen_modules = {}   # module name: imported module
 
-register_sockets, unregister_sockets = bpy.utils.register_classes_factory([
-    base_node.MxNodeInputSocket,
-    base_node.MxNodeOutputSocket,
-])
-register_nodes, unregister_nodes = bpy.utils.register_classes_factory(mx_node_classes)
+_mx_node_classes = None
+_classes_by_category = None     # category: MxNode classes
+_registered_categories = set()
+_pending_categories = set()     # categories to be registered in timer
+_is_sockets_registered = False
+_is_node_categories_registered = False
 
 
-def register():
-    register_sockets()
-    register_nodes()
+def get_gen_module(name):
+    mod = _gen_modules.get(name)
+    if mod is None:
+        log("Importing", name)
+        mod = _gen_modules[name] = importlib.import_module(name)
+
+    return mod
+
+
+def get_mx_node_classes():
+    """Returns MxNode classes of all generated modules, imports them if needed"""
+    global _mx_node_classes
+    if _mx_node_classes is None:
+        _mx_node_classes = [cls for name in gen_module_names
+                            for cls in get_gen_module(name).mx_node_classes]
+
+    return _mx_node_classes
+
+
+def get_classes_by_category():
+    """Returns {category: MxNode classes}"""
+    global _classes_by_category
+    if _classes_by_category is None:
+        _classes_by_category = {}
+        for cls in get_mx_node_classes():
+            _classes_by_category.setdefault(cls.category, []).append(cls)
+
+    return _classes_by_category
+
+
+def get_category(bl_idname):
+    """Returns category of MxNode class by its bl_idname or None"""
+    return next((cls.category for cls in get_mx_node_classes() if cls.bl_idname == bl_idname),
+                None)
+
+
+def is_category_registered(category):
+    return category in _registered_categories
+
+
+def is_all_registered():
+    return len(_registered_categories) == len(get_classes_by_category())
+
+
+def register_mx_nodes(categories=None):
+    """
+    Registers MxNode classes of categories, all categories if categories is None.
+    It has to be called in main thread.
+    """
+    global _is_sockets_registered, _is_node_categories_registered
+
+    classes_by_category = get_classes_by_category()
+    if categories is None:
+        categories = classes_by_category.keys()
+
+    categories = [c for c in categories
+                  if c in classes_by_category and c not in _registered_categories]
+    if not categories:
+        return
+
+    if threading.current_thread() is not threading.main_thread():
+        log.warn("MxNode classes can be registered only in main thread", categories)
+        return
+
+    from . import base_node, categories as node_categories
+
+    if not _is_sockets_registered:
+        bpy.utils.register_class(base_node.MxNodeInputSocket)
+        bpy.utils.register_class(base_node.MxNodeOutputSocket)
+        _is_sockets_registered = True
+
+    for category in categories:
+        log("Registering MxNode classes", category)
+        for cls in classes_by_category[category]:
+            bpy.utils.register_class(cls)
+
+        _registered_categories.add(category)
 
-    nodeitems_utils.register_node_categories("'HdUSD_MX_NODES", categories.get_node_categories())
+    # node items of not registered categories are registered in menu by poll
+    if not _is_node_categories_registered:
+        nodeitems_utils.register_node_categories("'HdUSD_MX_NODES",
+                                                 node_categories.get_node_categories())
+        _is_node_categories_registered = True
+
+
+def request_registration(categories=None):
+    """
+    Registers MxNode classes of categories in timer, all categories if categories is None.
+    It is used where registration isn't allowed, like poll or draw functions.
+    """
+    _pending_categories.update(get_classes_by_category().keys() if categories is None
+                               else categories)
+    if not bpy.app.timers.is_registered(_register_pending):
+        bpy.app.timers.register(_register_pending, first_interval=0.0)
+
+
+def _register_pending():
+    categories = tuple(_pending_categories)
+    _pending_categories.clear()
+    register_mx_nodes(categories)
+
+
+def unregister_mx_nodes():
+    global _is_sockets_registered, _is_node_categories_registered
+
+    if bpy.app.timers.is_registered(_register_pending):
+        bpy.app.timers.unregister(_register_pending)
+    _pending_categories.clear()
+
+    if _is_node_categories_registered:
+        nodeitems_utils.unregister_node_categories("'HdUSD_MX_NODES")
+        _is_node_categories_registered = False
+
+    for category in reversed(tuple(_registered_categories)):
+        for cls in reversed(get_classes_by_category()[category]):
+            bpy.utils.unregister_class(cls)
+
+    _registered_categories.clear()
+
+    if _is_sockets_registered:
+        from . import base_node
+
+        bpy.utils.unregister_class(base_node.MxNodeOutputSocket)
+        bpy.utils.unregister_class(base_node.MxNodeInputSocket)
+        _is_sockets_registered = False
+
+
+def register_if_used():
+    """Registers MxNode classes of categories used by MaterialX node trees in current blend data"""
+    if _mx_node_classes is not None and is_all_registered():
+        return
+
+    categories = set()
+    for ng in bpy.data.node_groups:
+        if ng.bl_idname != 'hdusd.MxNodeTree':
+            continue
+
+        used_categories = ng.get_used_categories()
+        if used_categories is None:
+            register_mx_nodes()
+            return
+
+        categories |= used_categories
+
+    if categories:
+        register_mx_nodes(categories)
+
+
+def register():
+    # blend data isn't available during Blender startup, in this case classes are
+    # registered by load_post handler
+    if isinstance(bpy.data, bpy.types.BlendData):
+        register_if_used()
 
 
 def unregister():
-    nodeitems_utils.unregister_node_categories("'HdUSD_MX_NODES")
+    unregister_mx_nodes()
 
-    unregister_nodes()
-    unregister_sockets()
+
+_classes_by_node = {}   # node name: MxNode classes
 
 
 def get_mx_node_cls(mx_node):
     node_name = mx_node.getCategory()
 
-    suffix = f'_{node_name}'
-    classes = tuple(cls for cls in mx_node_classes if cls.__name__.endswith(suffix))
+    classes = _classes_by_node.get(node_name)
+    if classes is None:
+        suffix = f'_{node_name}'
+        classes = _classes_by_node[node_name] = \
+            tuple(cls for cls in get_mx_node_classes() if cls.__name__.endswith(suffix))
+
     if not classes:
         raise KeyError(f"Unable to find MxNode class for {mx_node}")
 
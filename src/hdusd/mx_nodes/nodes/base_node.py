@@ -18,7 +18,9 @@ import bpy
 
 from ...utils import title_str, code_str, LIBS_DIR, pass_node_reroute
 from ...utils import mx as mx_utils
+from ...utils.image import texture_cache
 from . import log
+from . import nodedef_index
 
 
 class MxNodeInputSocket(bpy.types.NodeSocket):
@@ -82,15 +84,24 @@ class MxNode(bpy.types.ShaderNode):
     @classmethod
     def get_nodedef(cls, data_type):
         if not cls._data_types[data_type]['nd']:
-            # loading nodedefs
-            doc = mx.createDocument()
-            search_path = mx.FileSearchPath(str(mx_utils.MX_LIBS_DIR))
-            mx.readFromXmlFile(doc, str(LIBS_DIR / cls._file_path), searchPath=search_path)
-            for val in cls._data_types.values():
-                val['nd'] = doc.getNodeDef(val['nd_name'])
+            # loading nodedefs from index, library file is parsed only if there is no index
+            index = nodedef_index.get_index(cls.__module__)
+            if index is not None:
+                for val in cls._data_types.values():
+                    val['nd'] = nodedef_index.NodeDef(val['nd_name'], index[val['nd_name']])
+            else:
+                cls._load_nodedefs()
 
         return cls._data_types[data_type]['nd']
 
+    @classmethod
+    def _load_nodedefs(cls):
+        doc = mx.createDocument()
+        search_path = mx.FileSearchPath(str(mx_utils.MX_LIBS_DIR))
+        mx.readFromXmlFile(doc, str(LIBS_DIR / cls._file_path), searchPath=search_path)
+        for val in cls._data_types.values():
+            val['nd'] = doc.getNodeDef(val['nd_name'])
+
     @classmethod
     def get_nodedefs(cls):
         for data_type in cls._data_types.keys():
@@ -116,7 +127,7 @@ class MxNode(bpy.types.ShaderNode):
 
     def update_prop(self, context):
         nodetree = self.id_data
-        nodetree.update_()
+        nodetree.update_node(self)
 
     def update_data_type(self, context):
         # updating names for inputs and outputs
@@ -264,6 +275,27 @@ class MxNode(bpy.types.ShaderNode):
 
                     socket_in.draw(context, row, self, '')
 
+    @property
+    def export_key(self):
+        """Properties of node which change structure of its exported MaterialX node"""
+        return self.bl_idname, self.data_type, \
+            tuple(getattr(self, self._folder_prop_name(f)) for f in self._ui_folders)
+
+    def get_export_values(self):
+        """Returns {input name: value} of node input properties"""
+        values = {}
+        for nd_input in self.nodedef.getInputs():
+            val = self.get_param_value(nd_input.getName())
+            if isinstance(val, bpy.types.Image):
+                val = (val.name_full, val.filepath_raw, val.source, val.is_dirty,
+                       bool(val.packed_file), texture_cache.get_state(val))
+            elif hasattr(val, '__len__') and not isinstance(val, str):
+                val = tuple(val)
+
+            values[nd_input.getName()] = val
+
+        return values
+
     # COMPUTE FUNCTION
     def compute(self, out_key, **kwargs):
         log("compute", self, out_key)
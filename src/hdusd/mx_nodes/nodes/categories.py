@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
-from collections import defaultdict
-
 from nodeitems_utils import NodeCategory, NodeItem
 
 from ...utils import title_str, code_str
@@ -26,17 +24,27 @@ class MxNodeCategory(NodeCategory):
 
 
 def get_node_categories():
-    from . import mx_node_classes
+    from . import get_classes_by_category, is_category_registered, request_registration
+
+    def item_poll(category):
+        # classes of category are registered when its menu is opened first time,
+        # node items appear on the next redraw of menu
+        def poll(context):
+            if is_category_registered(category):
+                return True
+
+            request_registration((category,))
+            return False
 
-    d = defaultdict(list)
-    for MxNode_cls in mx_node_classes:
-        d[MxNode_cls.category].append(MxNode_cls)
+        return poll
 
     categories = []
-    for category, category_classes in d.items():
+    for category, category_classes in get_classes_by_category().items():
+        poll = item_poll(category)
         categories.append(
             MxNodeCategory('HdUSD_MX_NG_' + code_str(category), title_str(category),
-                           items=[NodeItem(MxNode_cls.bl_idname)
+                           items=[NodeItem(MxNode_cls.bl_idname, label=MxNode_cls.bl_label,
+                                           poll=poll)
                                   for MxNode_cls in category_classes]))
 
     categories.append(MxNodeCategory('HdUSD_MX_NG_LAYOUT', 'Layout',
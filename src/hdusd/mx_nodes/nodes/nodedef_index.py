@@ -0,0 +1,99 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Nodedefs loaded from gen_*.json index generated by tools/generate_mx_classes.py together with
+gen_*.py modules. NodeDef and Port provide the part of MaterialX NodeDef and Input/Output API
+which is used by MxNode, so .mtlx library files don't have to be parsed to draw or export nodes.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from ...utils import mx as mx_utils
+from . import log
+
+
+class Port:
+    def __init__(self, data):
+        self._name = data['name']
+        self._type = data['type']
+        self._attrs = data['attrs']
+        self._value = None
+
+    def getName(self):
+        return self._name
+
+    def getType(self):
+        return self._type
+
+    def getAttribute(self, name):
+        return self._attrs.get(name, "")
+
+    def hasAttribute(self, name):
+        return name in self._attrs
+
+    def getValue(self):
+        if 'value' not in self._attrs:
+            return None
+
+        if self._value is None:
+            self._value = mx_utils.parse_value_str(self._attrs['value'], self._type)
+
+        return self._value
+
+
+class NodeDef:
+    def __init__(self, name, data):
+        self._name = name
+        self._node = data['node']
+        self._inputs = [Port(d) for d in data['inputs']]
+        self._outputs = [Port(d) for d in data['outputs']]
+
+    def getName(self):
+        return self._name
+
+    def getNodeString(self):
+        return self._node
+
+    def getInputs(self):
+        return self._inputs
+
+    def getOutputs(self):
+        return self._outputs
+
+    def getInput(self, name):
+        return next((p for p in self._inputs if p.getName() == name), None)
+
+    def getOutput(self, name):
+        return next((p for p in self._outputs if p.getName() == name), None)
+
+
+_indexes = {}   # module name: {nodedef name: nodedef data} or None if module has no index
+
+
+def get_index(module_name):
+    """Returns nodedefs index of generated module or None if it doesn't exist"""
+    if module_name not in _indexes:
+        index_file = Path(sys.modules[module_name].__file__).with_suffix(".json")
+        try:
+            with open(index_file, encoding='utf-8') as f:
+                _indexes[module_name] = json.load(f)
+
+        except (OSError, ValueError) as e:
+            log.warn("Nodedef index isn't loaded, library will be parsed", index_file, e)
+            _indexes[module_name] = None
+
+    return _indexes[module_name]
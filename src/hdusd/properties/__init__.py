@@ -71,6 +71,7 @@ register, unregister = bpy.utils.register_classes_factory((
     scene.FinalRenderSettings,
     scene.ViewportRenderSettings,
     scene.SceneProperties,
+    scene.ViewLayerProperties,
 
     object.ObjectProperties,
 
@@ -12,14 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+import sys
+
 import bpy
 import MaterialX as mx
 
 from . import HdUSDProperties
 from ..mx_nodes.node_tree import MxNodeTree
-from ..bl_nodes.nodes import ShaderNodeOutputMaterial
 from ..usd_nodes import node_tree as usd_node_tree
-from ..engine.viewport_engine import ViewportEngineScene
+from ..utils import mx as mx_utils
+from .. import config
 
 from ..utils import logging
 log = logging.Log('properties.material')
@@ -29,6 +31,9 @@ class MaterialProperties(HdUSDProperties):
     bl_type = bpy.types.Material
 
     def update_mx_node_tree(self, context):
+        if self.mx_node_tree:
+            self.mx_node_tree.ensure_registered()
+
         self.update()
 
     mx_node_tree: bpy.props.PointerProperty(type=MxNodeTree, update=update_mx_node_tree)
@@ -37,25 +42,40 @@ class MaterialProperties(HdUSDProperties):
     def output_node(self):
         material = self.id_data
         return next((node for node in material.node_tree.nodes if
-                     node.bl_idname == ShaderNodeOutputMaterial.__name__ and
+                     node.bl_idname == 'ShaderNodeOutputMaterial' and
                      node.is_active_output), None)
 
     def export(self, obj: bpy.types.Object) -> [mx.Document, None]:
-        if self.mx_node_tree:
-            return self.mx_node_tree.export()
-
+        mx_node_tree = self.mx_node_tree
         material = self.id_data
+        if mx_node_tree:
+            # MxNode classes can be registered only in main thread, in render thread
+            # material is exported from its shader nodes if they aren't registered yet
+            if mx_node_tree.ensure_registered():
+                return mx_node_tree.export()
+
+            log.warn("MaterialX node tree isn't registered, exporting shader nodes",
+                     material, mx_node_tree)
+            if not material.node_tree:
+                return None
+
         output_node = self.output_node
 
         if not output_node:
             return None
 
-        doc = mx.createDocument()
+        from ..bl_nodes.nodes import ShaderNodeOutputMaterial
 
+        doc = mx.createDocument()
         node_parser = ShaderNodeOutputMaterial(doc, material, output_node, obj)
         if not node_parser.export():
             return None
 
+        if config.mx_optimize_nodes:
+            removed = mx_utils.remove_unused_nodes(doc)
+            if removed:
+                log("Unused nodes removed", material, removed)
+
         return doc
 
     def update(self, is_depsgraph=False):
@@ -68,7 +88,24 @@ class MaterialProperties(HdUSDProperties):
 
         material = self.id_data
         usd_node_tree.material_update(material)
-        ViewportEngineScene.material_update(material)
+
+        # viewport engine module isn't imported until first viewport render
+        viewport_engine = sys.modules.get('hdusd.engine.viewport_engine')
+        if viewport_engine:
+            viewport_engine.ViewportEngineScene.material_update(material)
+
+    def update_inputs(self, mx_node_name, inputs):
+        """
+        Update callback, which notifies that only input values of MaterialX node were changed,
+        inputs: {input name: (value, mx type)}
+        """
+        material = self.id_data
+        usd_node_tree.material_update_inputs(material, mx_node_name, inputs)
+
+        viewport_engine = sys.modules.get('hdusd.engine.viewport_engine')
+        if viewport_engine:
+            viewport_engine.ViewportEngineScene.material_update_inputs(material, mx_node_name,
+                                                                      inputs)
 
 
 def depsgraph_update(depsgraph):
@@ -38,6 +38,13 @@ class RenderSettings(bpy.types.PropertyGroup):
 
     hdrpr: bpy.props.PointerProperty(type=hdrpr_render.RenderSettings)
 
+    use_profiler: bpy.props.BoolProperty(
+        name="Profile Export",
+        description="Measure export time of objects, materials, images and world and write "
+                    "report to hdusd_profile.json and hdusd_profile.csv in $TEMP/hdusd dir",
+        default=False
+    )
+
 
 class FinalRenderSettings(RenderSettings):
     delegate: bpy.props.EnumProperty(
@@ -56,6 +63,12 @@ class FinalRenderSettings(RenderSettings):
         description="Select camera from USD for final render",
         default=""
     )
+    use_animation: bpy.props.BoolProperty(
+        name="Export Animation",
+        description="Export whole frame range once as USD time samples when rendering animation "
+                    "instead of syncing scene for every frame",
+        default=False
+    )
 
     def nodetree_update(self, context):
         if not self.data_source:
@@ -107,3 +120,13 @@ class SceneProperties(HdUSDProperties):
 
     final: bpy.props.PointerProperty(type=FinalRenderSettings)
     viewport: bpy.props.PointerProperty(type=ViewportRenderSettings)
+
+
+class ViewLayerProperties(HdUSDProperties):
+    bl_type = bpy.types.ViewLayer
+
+    use_pass_variance: bpy.props.BoolProperty(
+        name="Variance",
+        description="Render variance AOV of final render into Variance pass",
+        default=False
+    )
@@ -63,6 +63,7 @@ register_classes, unregister_classes = bpy.utils.register_classes_factory([
     render.HDUSD_MT_data_source_viewport,
     render.HDUSD_RENDER_PT_render_settings_final,
     render.HDUSD_RENDER_PT_render_settings_viewport,
+    render.HDUSD_VIEW_LAYER_PT_passes,
     render.HDUSD_RENDER_PT_help_about,
 
     hdrpr_render.HDUSD_RENDER_PT_hdrpr_settings_final,
@@ -287,6 +287,9 @@ class HDUSD_MATERIAL_OP_link_mx_node(bpy.types.Operator):
             else:
                 return {"FINISHED"}
 
+        from ..mx_nodes.nodes import register_mx_nodes, get_category
+        register_mx_nodes({get_category(self.new_node_name)})
+
         new_node = node_tree.nodes.new(self.new_node_name)
         new_node.location = (current_node.location[0] - NODE_LAYER_SEPARATION_WIDTH,
                             current_node.location[1])
@@ -310,7 +313,8 @@ class HDUSD_MATERIAL_OP_invoke_popup_input_nodes(bpy.types.Operator):
         return context.window_manager.invoke_popup(self, width=1000)
 
     def draw(self, context):
-        from ..mx_nodes.nodes import mx_node_classes
+        from ..mx_nodes.nodes import get_mx_node_classes
+        mx_node_classes = get_mx_node_classes()
 
         row = self.layout.split().row()
         col = row.column()
@@ -370,7 +374,8 @@ class HDUSD_MATERIAL_OP_invoke_popup_shader_nodes(bpy.types.Operator):
         return context.window_manager.invoke_popup(self, width=400)
 
     def draw(self, context):
-        from ..mx_nodes.nodes import mx_node_classes
+        from ..mx_nodes.nodes import get_mx_node_classes
+        mx_node_classes = get_mx_node_classes()
 
         row = self.layout.split().row()
 
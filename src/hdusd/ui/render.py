@@ -185,6 +185,11 @@ class RenderSettingsPanel(HdUSD_Panel):
             col.menu(HDUSD_MT_nodetree_camera_final.bl_idname,
                      text=settings.nodetree_camera if settings.nodetree_camera else '')
 
+        if self.engine_type == 'FINAL' and not settings.data_source:
+            layout.prop(settings, "use_animation")
+
+        layout.prop(settings, "use_profiler")
+
 
 class HDUSD_RENDER_PT_render_settings_final(RenderSettingsPanel):
     """Final render delegate and settings"""
@@ -198,6 +203,27 @@ class HDUSD_RENDER_PT_render_settings_viewport(RenderSettingsPanel):
     engine_type = 'VIEWPORT'
 
 
+class HDUSD_VIEW_LAYER_PT_passes(HdUSD_Panel):
+    """Render passes which are filled with AOVs of final render"""
+    bl_label = "Passes"
+    bl_context = 'view_layer'
+
+    def draw(self, context):
+        view_layer = context.view_layer
+
+        layout = self.layout
+        layout.use_property_split = True
+        layout.use_property_decorate = False
+        layout.enabled = not context.scene.hdusd.final.is_gl_delegate
+
+        col = layout.column(heading="Include", align=True)
+        col.prop(view_layer, "use_pass_z")
+        col.prop(view_layer, "use_pass_normal")
+        col.prop(view_layer, "use_pass_diffuse_color", text="Albedo")
+        col.prop(view_layer, "use_pass_object_index", text="Prim Index")
+        col.prop(view_layer.hdusd, "use_pass_variance")
+
+
 class HDUSD_RENDER_PT_help_about(HdUSD_Panel):
     """Help/About UI panel"""
 
@@ -286,3 +286,8 @@ class HDUSD_NODE_PT_usd_nodetree_node_tools(HDUSD_UsdNodeTreePanel):
 
         col.operator(HDUSD_OP_usd_tree_node_print_stage.bl_idname)
         col.operator(HDUSD_OP_usd_tree_node_print_root_layer.bl_idname)
+
+        node = context.active_node
+        if isinstance(node, USDNode):
+            compute_time = context.space_data.edit_tree.get_compute_time(node)
+            col.label(text=f"Compute Time: {compute_time * 1000:.1f} ms")
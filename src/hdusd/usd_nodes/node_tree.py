@@ -12,13 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
+import sys
+
 import bpy
 
+from .nodes.base_node import USDNode
 from .nodes.hydra_render import HydraRenderNode
 from .nodes.print_file import PrintFileNode
 from .nodes.write_file import WriteFileNode
 from ..viewport import usd_collection
-from ..engine.viewport_engine import ViewportEngineNodetree
+from . import scheduler, log
 
 
 class USDTree(bpy.types.ShaderNodeTree):
@@ -56,31 +59,42 @@ class USDTree(bpy.types.ShaderNodeTree):
 
         return secondary_output_node
 
-    def _reset_nodes(self, nodes, is_hard):
-        self._is_resetting = True
+    def update_nodes(self, dirty_nodes=(), changed_nodes=(), is_hard=False):
+        """
+        Recomputes only nodes which were changed or depend on changed nodes.
+          dirty_nodes - nodes to be recomputed,
+          changed_nodes - nodes which stage was updated in place, their dependent nodes are
+                          recomputed,
+          is_hard - recompute all nodes.
+        """
+        if self._is_resetting:
+            return
 
+        self._is_resetting = True
         try:
-            nodes = tuple(node for node in nodes if not isinstance(node, bpy.types.NodeReroute)
-                          and (is_hard or node.use_hard_reset))
-
-            for node in nodes:
-                node.free()
-
-            for node in nodes:
-                node.final_compute()
+            nodes = tuple(node for node in self.nodes if isinstance(node, USDNode))
+            computed_nodes = scheduler.get(self).update(nodes, dirty_nodes, changed_nodes,
+                                                        is_hard)
+            if computed_nodes:
+                log(f"Computed {len(computed_nodes)} of {len(nodes)} nodes in {self.name}: "
+                    f"{sum(self.get_compute_time(node) for node in computed_nodes):.3f}s")
 
         finally:
             self._is_resetting = False
 
+    def get_compute_time(self, node):
+        """Returns time in seconds of the last compute of the node"""
+        return scheduler.get(self).get_state(node).compute_time
+
     # this is called from Blender
     def update(self):
         if not self._do_update:
             return
 
-        self._reset_nodes(self.nodes, False)
+        self.update_nodes()
 
     def reset(self):
-        self._reset_nodes(self.nodes, True)
+        self.update_nodes(is_hard=True)
 
     def depsgraph_update(self, depsgraph):
         if self._is_resetting:
@@ -105,6 +119,14 @@ class USDTree(bpy.types.ShaderNodeTree):
             if not isinstance(node, bpy.types.NodeReroute):
                 node.material_update(depsgraph)
 
+    def material_update_inputs(self, material, mx_node_name, inputs):
+        if self._is_resetting:
+            return
+
+        for node in self.nodes:
+            if not isinstance(node, bpy.types.NodeReroute):
+                node.material_update_inputs(material, mx_node_name, inputs)
+
     def no_update_call(self, op, *args, **kwargs):
         """This function prevents call of self.update() during calling our function"""
         if not self._do_update:
@@ -144,7 +166,10 @@ class USDTree(bpy.types.ShaderNodeTree):
         if context.scene.hdusd.final.data_source == self.name:
             context.scene.hdusd.final.nodetree_update(context)
 
-        ViewportEngineNodetree.nodetree_output_node_computed(self)
+        # viewport engine module isn't imported until first viewport render
+        viewport_engine = sys.modules.get('hdusd.engine.viewport_engine')
+        if viewport_engine:
+            viewport_engine.ViewportEngineNodetree.nodetree_output_node_computed(self)
 
 
 class RenderTaskTree(bpy.types.ShaderNodeTree):
@@ -185,3 +210,9 @@ def material_update(material):
     for nodetree in bpy.data.node_groups:
         if isinstance(nodetree, USDTree):
             nodetree.material_update(material)
+
+
+def material_update_inputs(material, mx_node_name, inputs):
+    for nodetree in bpy.data.node_groups:
+        if isinstance(nodetree, USDTree):
+            nodetree.material_update_inputs(material, mx_node_name, inputs)
@@ -52,6 +52,15 @@ class USDNode(bpy.types.Node):
         """
         return None
 
+    def compute_task(self):
+        """
+        Can be overridden in child classes to move heavy part of compute to a thread pool.
+        It should return function without access to Blender data or None. The function is run
+        in parallel with tasks of other independent nodes, its result is passed
+        to compute() as task_result argument.
+        """
+        return None
+
     def final_compute(self, group_nodes=(), **kwargs):
         """
         This is the entry point of node parser system.
@@ -112,8 +121,9 @@ class USDNode(bpy.types.Node):
         if not link:
             return None
 
-        # removing 'socket_out' from kwargs before transferring to _compute_node
+        # removing 'socket_out' and 'task_result' from kwargs before transferring to _compute_node
         kwargs.pop('socket_out', None)
+        kwargs.pop('task_result', None)
         return self._compute_node(link.from_node, **kwargs)
 
     @property
@@ -124,29 +134,13 @@ class USDNode(bpy.types.Node):
         self.cached_stage.clear()
 
     def reset(self, is_hard=False):
-        if is_hard or self.use_hard_reset:
-            log("reset", self)
+        """Recomputes node and nodes depending on it if output stage was changed"""
+        log("reset", self)
+        self.id_data.update_nodes(dirty_nodes=(self,) if is_hard or self.use_hard_reset else ())
 
-            self.free()
-            self.final_compute()
-            self.hdusd.usd_list.update_items()
-
-        self._reset_next(is_hard)
-
-    def _reset_next(self, is_hard):
-        nodes_to_reset = []
-
-        def get_nodes(node):
-            if not isinstance(node, bpy.types.NodeReroute) and node is not self:
-                nodes_to_reset.append(node)
-                return
-            for output in node.outputs:
-                for link in output.links:
-                    if link.is_valid:
-                        get_nodes(link.to_node)
-        get_nodes(self)
-        for node in nodes_to_reset:
-            node.reset(is_hard)
+    def _reset_next(self):
+        """Recomputes nodes depending on this node after its stage was changed in place"""
+        self.id_data.update_nodes(changed_nodes=(self,))
 
     def depsgraph_update(self, depsgraph):
         pass
@@ -156,3 +150,6 @@ class USDNode(bpy.types.Node):
 
     def material_update(self, material):
         pass
+
+    def material_update_inputs(self, material, mx_node_name, inputs):
+        self.material_update(material)
@@ -17,7 +17,7 @@ import bpy
 from pxr import UsdGeom
 
 from .base_node import USDNode
-from ...export import object, material, world
+from ...export import object, material, world, animation
 from ...export.object import ObjectData, SUPPORTED_TYPES
 from ...utils import usd as usd_utils
 
@@ -142,10 +142,18 @@ class BlenderDataNode(USDNode):
         description="",
         update=update_data
     )
+    use_animation: bpy.props.BoolProperty(
+        name="Export Animation",
+        description="Export scene frame range as USD time samples instead of "
+                    "syncing data on every frame change",
+        default=False,
+        update=update_data
+    )
 
     def draw_buttons(self, context, layout):
         col = layout.column(align=True)
         col.prop(self, 'data')
+        col.prop(self, 'use_animation')
 
         if self.data == 'COLLECTION':
             split = layout.row(align=True).split(factor=0.25)
@@ -183,45 +191,67 @@ class BlenderDataNode(USDNode):
         UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
 
         root_prim = stage.GetPseudoRoot()
-        kwargs = {'scene': depsgraph.scene}
+        # next nodes reference every object prim separately, so materials have to be inside them
+        kwargs = {'scene': depsgraph.scene, 'shared_materials': False}
 
-        if self.data == 'SCENE':
-            for obj_data in ObjectData.depsgraph_objects(depsgraph):
+        if self.data == 'COLLECTION' and not self.collection:
+            return
+
+        if self.data == 'OBJECT' and (not self.object or self.object.hdusd.is_usd):
+            return
+
+        with material.mx_cache.sync_scope():
+            for obj_data in self._get_objects(depsgraph):
                 object.sync(root_prim, obj_data, **kwargs)
 
-            if depsgraph.scene.world is not None:
-                world.sync(root_prim, depsgraph.scene.world)
+        if self.data == 'SCENE' and depsgraph.scene.world is not None:
+            world.sync(root_prim, depsgraph.scene.world)
 
-        elif self.data == 'COLLECTION':
-            if not self.collection:
-                return
+        if self.use_animation:
+            scene = depsgraph.scene
+            animation.sync(root_prim, range(scene.frame_start, scene.frame_end + 1, scene.frame_step),
+                           scene.frame_current, scene.frame_set,
+                           lambda: self._get_objects(bpy.context.evaluated_depsgraph_get()),
+                           **kwargs)
+
+        return stage
 
+    def _get_objects(self, depsgraph):
+        if self.data == 'SCENE':
+            yield from ObjectData.depsgraph_objects(depsgraph)
+
+        elif self.data == 'COLLECTION':
             for obj_col in self.collection.objects:
                 if obj_col.hdusd.is_usd:
                     continue
 
-                object.sync(root_prim, ObjectData.from_object(
-                    obj_col.evaluated_get(depsgraph)), **kwargs)
+                yield ObjectData.from_object(obj_col.evaluated_get(depsgraph))
 
         elif self.data == 'OBJECT':
-            if not self.object or self.object.hdusd.is_usd:
-                return
-
-            object.sync(root_prim, ObjectData.from_object(self.object.evaluated_get(depsgraph)),
-                        **kwargs)
-
-        return stage
+            yield ObjectData.from_object(self.object.evaluated_get(depsgraph))
 
     def depsgraph_update(self, depsgraph):
         stage = self.cached_stage()
         if not stage:
-            self.final_compute()
+            self.reset(True)
+            return
+
+        if self.use_animation:
+            # time samples can't be updated partially, exporting whole animation again
+            if any(isinstance(update.id, (bpy.types.Object, bpy.types.World, bpy.types.Collection))
+                   for update in depsgraph.updates):
+                self.reset(True)
+
             return
 
         is_updated = False
+        # instances could be changed by update of any object: instanced object, emitter, parent
+        update_instancers = False
+        geometry_updated_names = set()
 
         root_prim = stage.GetPseudoRoot()
-        kwargs = {'scene': depsgraph.scene}
+        # next nodes reference every object prim separately, so materials have to be inside them
+        kwargs = {'scene': depsgraph.scene, 'shared_materials': False}
 
         for update in depsgraph.updates:
             if isinstance(update.id, bpy.types.Scene):
@@ -237,6 +267,11 @@ class BlenderDataNode(USDNode):
                 if obj.hdusd.is_usd:
                     continue
 
+                if update.is_updated_geometry or update.is_updated_transform:
+                    update_instancers = True
+                if update.is_updated_geometry:
+                    geometry_updated_names.add(obj.name_full)
+
                 obj_data = ObjectData.from_object(obj)
                 # checking if object has to be updated
                 if self.data == 'COLLECTION':
@@ -272,8 +307,8 @@ class BlenderDataNode(USDNode):
 
                 current_keys = set(prim.GetName() for prim in root_prim.GetAllChildren())
                 required_keys = set()
-                depsgraph_keys = set(obj_data.sdf_name for obj_data in
-                                     ObjectData.depsgraph_objects(depsgraph))
+                depsgraph_keys = set(obj_data.sdf_name
+                                     for obj_data in ObjectData.depsgraph_objects(depsgraph))
 
                 if self.data == 'SCENE':
                     required_keys = depsgraph_keys
@@ -297,6 +332,7 @@ class BlenderDataNode(USDNode):
 
                 keys_to_remove = current_keys - required_keys
                 keys_to_add = required_keys - current_keys
+                update_instancers = True
 
                 if keys_to_remove:
                     for key in keys_to_remove:
@@ -318,10 +354,27 @@ class BlenderDataNode(USDNode):
 
                 continue
 
+        if update_instancers and object.sync_update_instancers(
+                root_prim, ObjectData.depsgraph_objects(depsgraph), geometry_updated_names,
+                **kwargs):
+            is_updated = True
+
         if is_updated:
             self.hdusd.usd_list.update_items()
-            self._reset_next(True)
+            self._reset_next()
+
+    def frame_change(self, depsgraph):
+        if self.use_animation:
+            # all frames are already exported as time samples
+            return
+
+        super().frame_change(depsgraph)
 
     def material_update(self, mat):
         stage = self.cached_stage()
         material.sync_update_all(stage.GetPseudoRoot(), mat)
+
+    def material_update_inputs(self, mat, mx_node_name, inputs):
+        stage = self.cached_stage()
+        if not material.sync_update_inputs(stage.GetPseudoRoot(), mat, mx_node_name, inputs):
+            material.sync_update_all(stage.GetPseudoRoot(), mat)
@@ -72,7 +72,7 @@ class FilterNode(USDNode):
 
         for i, prim in enumerate(prims, 1):
             override_prim = stage.OverridePrim(root_prim.GetPath().AppendChild(prim.GetName()))
-            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().realPath,
+            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier,
                                                        prim.GetPath())
 
         return stage
@@ -12,12 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ********************************************************************
+import numpy as np
+
 import bpy
 from mathutils import Matrix
 
-from pxr import UsdGeom, Tf, Gf
+from pxr import UsdGeom, Tf, Gf, Vt
 
 from .base_node import USDNode
+from . import log
 from .blender_data import (
     HDUSD_USD_NODETREE_OP_blender_data_link_object, HDUSD_USD_NODETREE_OP_blender_data_unlink_object)
 
@@ -73,6 +76,22 @@ class InstancingNode(USDNode):
         update=update_data
     )
 
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        description="How instances are created",
+        items=(('POINT_INSTANCER', "Point Instancer", "Single PointInstancer primitive"),
+               ('XFORMS', "Xforms", "Xform primitive with references for every instance")),
+        default='XFORMS',
+        update=update_data
+    )
+
+    scale_by_area: bpy.props.BoolProperty(
+        name="Scale by Face Area",
+        description="Scale instances by square root of face area",
+        default=False,
+        update=update_data
+    )
+
     object_transform: bpy.props.BoolProperty(
         name="Use Object Transform",
         default=True,
@@ -94,6 +113,9 @@ class InstancingNode(USDNode):
                      text=self.object.name, icon='OBJECT_DATAMODE')
             row.operator(HDUSD_USD_NODETREE_OP_blender_data_unlink_object.bl_idname, icon='X')
             layout.prop(self, 'method')
+            layout.prop(self, 'mode')
+            if self.method == 'POLYGONS':
+                layout.prop(self, 'scale_by_area')
         else:
             row.menu(HDUSD_USD_NODETREE_MT_instancing_object.bl_idname,
                      text=" ", icon='OBJECT_DATAMODE')
@@ -124,16 +146,23 @@ class InstancingNode(USDNode):
         UsdGeom.SetStageMetersPerUnit(stage, 1)
         UsdGeom.SetStageUpAxis(stage, UsdGeom.Tokens.z)
 
+        if self.mode == 'POINT_INSTANCER':
+            self._create_point_instancer(stage, input_stage, obj, distribute_items)
+            return stage
+
         for i, item in enumerate(distribute_items):
             root_xform = UsdGeom.Xform.Define(stage, f'/{Tf.MakeValidIdentifier(f"{self.name}_{i}")}')
             for prim in input_stage.GetPseudoRoot().GetAllChildren():
                 override_prim = stage.OverridePrim(root_xform.GetPath().AppendChild(prim.GetName()))
-                override_prim.GetReferences().AddReference(input_stage.GetRootLayer().realPath, prim.GetPath())
+                override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier, prim.GetPath())
 
             trans = Matrix.Translation(item.co if self.method == 'VERTICES' else item.center)
             rot = item.normal.to_track_quat().to_matrix().to_4x4()
 
             transform = trans @ rot
+            if self.method == 'POLYGONS' and self.scale_by_area:
+                transform = transform @ Matrix.Scale(item.area ** 0.5, 4)
+
             if self.object_transform:
                 transform = obj.matrix_world @ transform
 
@@ -142,6 +171,50 @@ class InstancingNode(USDNode):
 
         return stage
 
+    def _create_point_instancer(self, stage, input_stage, obj, distribute_items):
+        instancer = UsdGeom.PointInstancer.Define(stage, f'/{Tf.MakeValidIdentifier(self.name)}')
+
+        # every input root primitive is a prototype instanced at every item
+        prototypes_prim = stage.OverridePrim(instancer.GetPath().AppendChild('Prototypes'))
+        prototypes = []
+        for prim in input_stage.GetPseudoRoot().GetAllChildren():
+            override_prim = stage.OverridePrim(prototypes_prim.GetPath().AppendChild(prim.GetName()))
+            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier,
+                                                       prim.GetPath())
+            prototypes.append(override_prim.GetPath())
+
+        instancer.CreatePrototypesRel().SetTargets(prototypes)
+
+        items_count = len(distribute_items)
+        co = np.empty(items_count * 3, dtype=np.float32)
+        distribute_items.foreach_get('co' if self.method == 'VERTICES' else 'center', co)
+        normals = np.empty(items_count * 3, dtype=np.float32)
+        distribute_items.foreach_get('normal', normals)
+
+        scales = np.ones((items_count, 3), dtype=np.float32)
+        if self.method == 'POLYGONS' and self.scale_by_area:
+            areas = np.empty(items_count, dtype=np.float32)
+            distribute_items.foreach_get('area', areas)
+            scales *= np.sqrt(areas)[:, None]
+
+        positions = np.tile(co.reshape(-1, 3), (len(prototypes), 1))
+        orientations = np.tile(track_quats(normals.reshape(-1, 3)), (len(prototypes), 1))
+        scales = np.tile(scales, (len(prototypes), 1))
+        proto_indices = np.repeat(np.arange(len(prototypes), dtype=np.int32), items_count)
+
+        instancer.CreatePositionsAttr(Vt.Vec3fArray.FromNumpy(positions))
+        # GfQuath stores imaginary part first
+        instancer.CreateOrientationsAttr(Vt.QuathArray.FromNumpy(
+            orientations[:, (1, 2, 3, 0)].astype(np.float16)))
+        instancer.CreateScalesAttr(Vt.Vec3fArray.FromNumpy(scales))
+        instancer.CreateProtoIndicesAttr(Vt.IntArray.FromNumpy(proto_indices))
+
+        if self.object_transform:
+            instancer.MakeMatrixXform().Set(Gf.Matrix4d(obj.matrix_world.transposed()))
+
+        for path in prototypes:
+            log.info(f"{instancer.GetPath()}: {items_count} instances of {path.name}")
+
     def depsgraph_update(self, depsgraph):
         if not self.object:
             return
@@ -150,3 +223,40 @@ class InstancingNode(USDNode):
                     and not update.id.hdusd.is_usd and update.id.name == self.object.name), None)
         if obj:
             self.reset()
+
+
+def track_quats(vectors):
+    """
+    Returns quaternions (w, x, y, z) which rotate Z axis to vectors.
+    This is vectorized version of mathutils.Vector.to_track_quat('Z', 'Y').
+    """
+    lengths = np.linalg.norm(vectors, axis=1)
+    zero = lengths == 0.0
+    vectors = vectors / np.where(zero, 1.0, lengths)[:, None]
+    x, y, z = vectors.T
+
+    # rotation of Z axis to vector
+    axes = np.stack((-y, x, np.zeros_like(x)), axis=1)
+    axes[np.abs(x) + np.abs(y) < 1e-4] = (1.0, 0.0, 0.0)
+    axes /= np.linalg.norm(axes, axis=1)[:, None]
+    half_angles = 0.5 * np.arccos(np.clip(z, -1.0, 1.0))
+    quats = np.concatenate((np.cos(half_angles)[:, None],
+                            axes * np.sin(half_angles)[:, None]), axis=1)
+
+    # rotation around vector to keep Y axis up
+    half_angles = -0.5 * np.arctan2(-x, -y)
+    up_quats = np.concatenate((np.cos(half_angles)[:, None],
+                               vectors * np.sin(half_angles)[:, None]), axis=1)
+
+    quats = _mul_quats(up_quats, quats)
+    quats[zero] = (1.0, 0.0, 0.0, 0.0)
+    return quats
+
+
+def _mul_quats(q1, q2):
+    w1, x1, y1, z1 = q1.T
+    w2, x2, y2, z2 = q2.T
+    return np.stack((w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2), axis=1)
@@ -76,6 +76,6 @@ class MergeNode(USDNode):
         for ref_stage in ref_stages:
             for prim in ref_stage.GetPseudoRoot().GetAllChildren():
                 override_prim = stage.OverridePrim(root_prim.GetPath().AppendChild(prim.GetName()))
-                override_prim.GetReferences().AddReference(ref_stage.GetRootLayer().realPath, prim.GetPath())
+                override_prim.GetReferences().AddReference(ref_stage.GetRootLayer().identifier, prim.GetPath())
 
         return stage
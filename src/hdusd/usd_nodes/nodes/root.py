@@ -76,6 +76,6 @@ class RootNode(USDNode):
 
         for prim in input_stage.GetPseudoRoot().GetAllChildren():
             override_prim = stage.OverridePrim(root_prim.GetPath().AppendChild(prim.GetName()))
-            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().realPath, prim.GetPath())
+            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier, prim.GetPath())
 
         return stage
@@ -83,7 +83,7 @@ class TransformNode(USDNode):
 
         for prim in input_stage.GetPseudoRoot().GetAllChildren():
             override_prim = stage.OverridePrim(root_xform.GetPath().AppendChild(prim.GetName()))
-            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().realPath,
+            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier,
                                                        prim.GetPath())
 
         translation = Matrix.Translation((self.translation[:3]))
@@ -162,7 +162,7 @@ class TransformByEmptyNode(USDNode):
 
         for prim in input_stage.GetPseudoRoot().GetAllChildren():
             override_prim = stage.OverridePrim(root_xform.GetPath().AppendChild(prim.GetName()))
-            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().realPath,
+            override_prim.GetReferences().AddReference(input_stage.GetRootLayer().identifier,
                                                        prim.GetPath())
 
         if obj:
@@ -42,7 +42,7 @@ class UsdFileNode(USDNode):
     def draw_buttons(self, context, layout):
         layout.prop(self, 'filename')
 
-    def compute(self, **kwargs):
+    def _get_file_path(self):
         if not self.filename:
             return None
 
@@ -51,6 +51,23 @@ class UsdFileNode(USDNode):
             log.warn("Couldn't find USD file", self.filename, self)
             return None
 
-        stage = Usd.Stage.Open(file_path)
+        return file_path
+
+    def compute_task(self):
+        file_path = self._get_file_path()
+        if not file_path:
+            return None
+
+        return lambda: Usd.Stage.Open(file_path)
+
+    def compute(self, task_result=None, **kwargs):
+        stage = task_result
+        if not stage:
+            file_path = self._get_file_path()
+            if not file_path:
+                return None
+
+            stage = Usd.Stage.Open(file_path)
+
         self.cached_stage.insert(stage)
         return stage
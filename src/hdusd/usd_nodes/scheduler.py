@@ -0,0 +1,254 @@
+# **********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ********************************************************************
+"""
+Incremental compute of USD node tree.
+Nodes are computed in topological order. Node is recomputed only if its properties,
+linked input nodes or their versions were changed since last compute. Node version is increased
+only if its output could be changed, therefore stage passed through or recomputed from the same
+inputs stops propagation of recompute downstream.
+Compute tasks of independent nodes of the same level are run in parallel in a thread pool,
+everything which accesses Blender data is done in main thread.
+"""
+
+import time
+from concurrent import futures
+
+import bpy
+
+from ..utils import pass_node_reroute, get_properties_values
+from .. import config
+
+from . import log
+
+
+class NodeState:
+    def __init__(self):
+        self.input_key = None
+        self.output_key = None
+        self.version = 0
+        self.is_computed = False
+        self.has_stage = False
+        self.compute_time = 0.0
+
+
+class Scheduler:
+    def __init__(self):
+        self.states = {}    # node name: NodeState
+
+    def get_state(self, node):
+        state = self.states.get(node.name)
+        if state is None:
+            state = self.states[node.name] = NodeState()
+
+        return state
+
+    def update(self, nodes, dirty_nodes=(), changed_nodes=(), is_hard=False):
+        """
+        Computes nodes which have to be updated.
+          dirty_nodes - nodes to be recomputed,
+          changed_nodes - nodes which output stage was changed in place,
+          is_hard - recompute all nodes.
+        Returns list of computed nodes.
+        """
+        dirty_names = {node.name for node in dirty_nodes}
+        for node in changed_nodes:
+            self.get_state(node).version += 1
+
+        computed_nodes = []
+        sorted_nodes = self.sort(nodes)
+        for level_nodes in self.get_levels(sorted_nodes):
+            # nodes of one level don't depend on each other
+            dirty_level_nodes = []
+            for node, input_links in level_nodes:
+                state = self.get_state(node)
+                # linked nodes are identified along with their versions, otherwise relinking
+                # to another node with the same version isn't detected
+                input_key = (get_properties_key(node),
+                             tuple((link.from_node.name, link.from_socket.identifier,
+                                    self.states[link.from_node.name].version) if link else None
+                                   for link in input_links))
+
+                if not is_hard and node.name not in dirty_names and state.is_computed and \
+                        input_key == state.input_key and \
+                        state.has_stage == bool(node.cached_stage()):
+                    continue
+
+                is_dirty = is_hard or node.name in dirty_names
+                dirty_level_nodes.append((node, state, input_key, is_dirty))
+
+            task_results = run_tasks(node for node, *_ in dirty_level_nodes)
+
+            for node, state, input_key, is_dirty in dirty_level_nodes:
+                kwargs = {}
+                task_time = 0.0
+                if node.name in task_results:
+                    kwargs['task_result'], task_time = task_results[node.name]
+
+                node.free()
+                start_time = time.perf_counter()
+                stage = node.final_compute(**kwargs)
+                state.compute_time = time.perf_counter() - start_time + task_time
+                log("computed", node, f"{state.compute_time:.3f}s")
+
+                output_key = get_output_key(node, stage, input_key, is_dirty)
+                if output_key is None or output_key != state.output_key:
+                    state.version += 1
+
+                state.input_key = input_key
+                state.output_key = output_key
+                state.is_computed = True
+                state.has_stage = stage is not None
+                computed_nodes.append(node)
+
+        # removing states of deleted nodes
+        names = {node.name for node, _ in sorted_nodes}
+        for name in tuple(self.states.keys()):
+            if name not in names:
+                del self.states[name]
+
+        return computed_nodes
+
+    @staticmethod
+    def sort(nodes):
+        """
+        Returns list of (node, input_links) in topological order,
+        input link is None if nothing from nodes is linked to the input socket.
+        """
+        sorted_nodes = []
+        visited = set()
+        names = {node.name for node in nodes}
+
+        def visit(node):
+            if node.name in visited:
+                return
+
+            visited.add(node.name)
+
+            input_links = []
+            for socket in node.inputs:
+                link = pass_node_reroute(socket.links[0]) \
+                    if socket.is_linked and socket.links else None
+                if link and link.from_node.name in names:
+                    visit(link.from_node)
+                else:
+                    link = None
+
+                input_links.append(link)
+
+            sorted_nodes.append((node, input_links))
+
+        for node in nodes:
+            visit(node)
+
+        return sorted_nodes
+
+    @staticmethod
+    def get_levels(sorted_nodes):
+        """Splits sorted nodes into levels, nodes of each level depend only on previous levels"""
+        levels = []
+        node_levels = {}
+        for node, input_links in sorted_nodes:
+            level = max((node_levels[link.from_node.name] + 1 for link in input_links if link),
+                        default=0)
+            node_levels[node.name] = level
+            if level == len(levels):
+                levels.append([])
+
+            levels[level].append((node, input_links))
+
+        return levels
+
+
+def run_tasks(nodes):
+    """
+    Runs compute tasks of nodes in thread pool.
+    Returns {node name: (task result, task time)}, nodes with failed tasks are skipped.
+    """
+    tasks = {}
+    for node in nodes:
+        task = node.compute_task()
+        if task:
+            tasks[node.name] = task
+
+    if not tasks:
+        return {}
+
+    def run(task):
+        start_time = time.perf_counter()
+        return task(), time.perf_counter() - start_time
+
+    results = {}
+    with futures.ThreadPoolExecutor(max(1, min(config.node_compute_threads, len(tasks)))) \
+            as executor:
+        fs = {executor.submit(run, task): name for name, task in tasks.items()}
+        for f in futures.as_completed(fs):
+            try:
+                results[fs[f]] = f.result()
+            except Exception as e:
+                log.error("Compute task failed", fs[f], e)
+
+    return results
+
+
+def get_properties_key(node):
+    """Returns values of node's own properties"""
+    return get_properties_values(node, _base_properties())
+
+
+_base_properties_cache = None
+
+
+def _base_properties():
+    global _base_properties_cache
+    if _base_properties_cache is None:
+        _base_properties_cache = {prop.identifier for prop in bpy.types.Node.bl_rna.properties}
+        _base_properties_cache.add('hdusd')
+
+    return _base_properties_cache
+
+
+def get_output_key(node, stage, input_key, is_dirty):
+    """
+    Returns key which identifies output stage of node or None if it can't be identified.
+    Stage which is passed through from input node is identified by node's input_key.
+    Stage created by node is identified by input_key too, unless node was marked dirty:
+    it could read changed Blender data or files which aren't in input_key.
+    Stages of nodes which are updated in place (use_hard_reset is False) aren't identified.
+    """
+    if stage is None:
+        return ()
+
+    if not node.cached_stage.is_owner:
+        return input_key
+
+    if not node.use_hard_reset or is_dirty:
+        return None
+
+    return input_key
+
+
+_schedulers = {}
+
+
+def get(nodetree):
+    scheduler = _schedulers.get(nodetree.name)
+    if scheduler is None:
+        scheduler = _schedulers[nodetree.name] = Scheduler()
+
+    return scheduler
+
+
+def clear():
+    _schedulers.clear()
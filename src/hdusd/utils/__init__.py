@@ -42,6 +42,9 @@ LIBS_DIR = PLUGIN_ROOT_DIR.parent.parent / 'libs' if DEBUG_MODE else \
                  PLUGIN_ROOT_DIR / 'libs'
 
 
+TEXTURE_CACHE_DIR_NAME = "textures"
+
+
 from . import logging
 log = logging.Log('utils')
 
@@ -66,6 +69,16 @@ def temp_pid_dir():
     return d
 
 
+def texture_cache_dir():
+    """ Returns $TEMP/hdusd/textures dir of converted textures, which is kept across sessions """
+    d = temp_dir() / TEXTURE_CACHE_DIR_NAME
+    if not d.is_dir():
+        log("Creating texture cache dir", d)
+        d.mkdir()
+
+    return d
+
+
 def get_temp_file(suffix, name=None):
     if not name:
         return Path(tempfile.mktemp(suffix, "tmp", temp_pid_dir()))
@@ -76,10 +89,10 @@ def get_temp_file(suffix, name=None):
 
 
 def clear_temp_dir():
-    """ Clears whole $TEMP/rprblender temp dir """
+    """ Clears whole $TEMP/rprblender temp dir except texture cache """
 
     d = temp_dir()
-    paths = tuple(d.iterdir())
+    paths = tuple(path for path in d.iterdir() if path.name != TEXTURE_CACHE_DIR_NAME)
     if not paths:
         return
 
@@ -122,6 +135,36 @@ def code_str(str):
     return str.replace(' ', '_').replace('.', '_')
 
 
+def get_properties_values(struct, skip=()):
+    """
+    Returns tuple of values of RNA properties of struct except collections and properties
+    from skip. Pointers to ID are represented by ID name.
+    """
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in skip or prop.type == 'COLLECTION':
+            continue
+
+        value = getattr(struct, prop.identifier)
+        if prop.type == 'POINTER':
+            value = value.name_full if isinstance(value, bpy.types.ID) else None
+        elif getattr(prop, 'is_array', False):
+            value = tuple(value)
+
+        values.append(value)
+
+    return tuple(values)
+
+
+def get_node_key(node, out_key, group_nodes=()):
+    """
+    Returns key of parsed node output: node tree, path of group nodes, node and output socket.
+    The same node of node group used by different group nodes has different keys.
+    """
+    return (node.id_data.as_pointer(), tuple(n.as_pointer() for n in group_nodes),
+            node.name, out_key)
+
+
 def pass_node_reroute(link):
     while isinstance(link.from_node, bpy.types.NodeReroute):
         if not link.from_node.inputs[0].links:
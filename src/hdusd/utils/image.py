@@ -13,39 +13,435 @@
 # limitations under the License.
 #********************************************************************
 from pathlib import Path
+import os
+import json
+import hashlib
+import shutil
+import subprocess
+import threading
+from concurrent import futures
+from contextlib import contextmanager
 
 import bpy
 
-from . import get_temp_file
+from . import get_temp_file, texture_cache_dir
+from .profiler import profiler
+from .. import config
 from . import log
 
 
 SUPPORTED_FORMATS = {".png", ".jpeg", ".jpg", ".hdr", ".tga", ".bmp"}
 DEFAULT_FORMAT = ".hdr"
 BLENDER_DEFAULT_FORMAT = "HDR"
+MIPMAP_FORMAT = ".tx"
+CONVERTED_FORMATS = (".png", ".exr", ".hdr", MIPMAP_FORMAT)
+BLENDER_FORMATS = {".png": 'PNG', ".exr": 'OPEN_EXR', ".hdr": 'HDR'}
 
+REFRESH_INTERVAL = 0.5    # interval of checking of finished conversions of placeholder textures
 
-def cache_image_file(image: bpy.types.Image, cache_check=True):
+# script of background Blender process, which converts image to PNG if it has 8 bit data or
+# to float format otherwise. Alpha channel is kept by both PNG and EXR.
+CONVERT_SCRIPT = f"""
+import sys, bpy
+src, dst, float_format = sys.argv[sys.argv.index('--') + 1:]
+image = bpy.data.images.load(src)
+suffix = float_format if image.is_float else '.png'
+image.filepath_raw = dst + suffix
+image.file_format = {BLENDER_FORMATS!r}[suffix]
+image.use_half_precision = True
+image.save()
+"""
+
+# 1x1 Radiance HDR image of grey color, it is used until texture is converted
+PLACEHOLDER_DATA = b"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y 1 +X 1\n" + bytes((128, 128, 128, 128))
+
+
+class TextureCache:
+    """
+    Persistent cache of converted images. 8 bit images are converted to PNG, float images to
+    config.texture_float_format, or all images to mip-mapped .tx if config.texture_mipmaps is
+    set. Converted files are named by hash of source content, the index maps source file path,
+    mtime and size to the converted file name, so changed image file is converted again and
+    the same image is converted only once across sessions. Conversions are run in background Blender processes by worker pool, because
+    Blender data can't be accessed from threads. Size of cache is limited by
+    config.texture_cache_size, least recently used files are removed first.
+    """
+
+    def __init__(self):
+        self.index = None       # source key: converted file name
+        self.futures = {}       # source key: Future with converted file path
+        self.placeholder_keys = set()
+        self.used_files = set()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def use_placeholders(self):
+        return getattr(self._local, 'use_placeholders', False)
+
+    @contextmanager
+    def placeholders(self):
+        """Not converted textures are replaced by placeholder in current thread"""
+        self._local.use_placeholders = True
+        try:
+            yield
+
+        finally:
+            self._local.use_placeholders = False
+
+    @property
+    def dir(self):
+        return texture_cache_dir()
+
+    @property
+    def index_file(self):
+        return self.dir / "index.json"
+
+    def _load_index(self):
+        if self.index is not None:
+            return
+
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _save_index(self):
+        # packed images are identified by name, therefore they aren't kept across sessions
+        index = {key: val for key, val in self.index.items() if not key.startswith('packed|')}
+        tmp_file = self.index_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+
+        os.replace(tmp_file, self.index_file)
+
+    @staticmethod
+    def needs_conversion(image: bpy.types.Image):
+        if image.source == 'GENERATED':
+            return False
+
+        if image.packed_file or use_mipmaps():
+            return True
+
+        file_format = ".exr" if image.file_format == 'OPEN_EXR' else f".{image.file_format}"
+        return not is_supported(Path(image.filepath).suffix) or not is_supported(file_format)
+
+    @staticmethod
+    def _get_source_key(image: bpy.types.Image):
+        """Returns key of image source or None if source file is missing"""
+        if image.packed_file:
+            return f"packed|{image.name_full}|{image.packed_file.size}|{image.filepath}"
+
+        image_path = Path(image.filepath_from_user())
+        try:
+            stat = image_path.stat()
+        except OSError:
+            return None
+
+        return f"{image_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    def _get_ready_file(self, key):
+        self._load_index()
+        file_name = self.index.get(key)
+        if not file_name:
+            return None
+
+        cache_file = self.dir / file_name
+        # converted file of another mode can't be used
+        if (cache_file.suffix == MIPMAP_FORMAT) != use_mipmaps():
+            return None
+
+        return cache_file if cache_file.is_file() else None
+
+    def get(self, image: bpy.types.Image, allow_placeholder=False):
+        """
+        Returns path to converted image. If conversion isn't finished yet, returns placeholder
+        when use_placeholders is set and allow_placeholder is True, otherwise waits for it.
+        Returns None if image couldn't be converted.
+        """
+        key = self._get_source_key(image)
+        if not key:
+            log.warn("Image is missing", image, image.filepath_from_user())
+            return None
+
+        cache_file = self._get_ready_file(key)
+        if cache_file:
+            self._use_file(cache_file)
+            return cache_file
+
+        future = self._submit(image, key)
+        if self.use_placeholders and allow_placeholder and not future.done():
+            self.placeholder_keys.add(key)
+            if not bpy.app.timers.is_registered(self._refresh):
+                bpy.app.timers.register(self._refresh, first_interval=REFRESH_INTERVAL)
+
+            return get_placeholder_file()
+
+        cache_file = future.result()
+        if cache_file:
+            self._use_file(cache_file)
+
+        return cache_file
+
+    def get_state(self, image: bpy.types.Image):
+        """Returns state of image conversion which affects exported material"""
+        if not self.needs_conversion(image):
+            return None
+
+        key = self._get_source_key(image)
+        if self.use_placeholders and key and not self._get_ready_file(key):
+            return 'placeholder'
+
+        return MIPMAP_FORMAT if use_mipmaps() else 'ready'
+
+    def prefetch(self, images):
+        """Starts conversions of images in advance, so they are run in parallel"""
+        for image in images:
+            if not self.needs_conversion(image):
+                continue
+
+            key = self._get_source_key(image)
+            if key and not self._get_ready_file(key):
+                self._submit(image, key)
+
+    def _submit(self, image, key):
+        future = self.futures.get(key)
+        if future and not (future.done() and future.result() and
+                           future.result().is_file()):
+            return future
+
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(max(1, config.texture_convert_threads))
+
+        # Blender data has to be read in main thread
+        if image.packed_file:
+            src, data = Path(image.filepath or image.name).suffix or ".png", \
+                image.packed_file.data
+        else:
+            src, data = Path(image.filepath_from_user()), None
+
+        future = self.futures[key] = self._executor.submit(
+            self._convert, key, src, data, bpy.app.binary_path, use_mipmaps())
+        return future
+
+    def _convert(self, key, src, data, binary_path, mipmaps):
+        """Runs in worker thread. Returns converted file path or None"""
+        try:
+            h = hashlib.blake2b(digest_size=16)
+            if data is not None:
+                h.update(data)
+            else:
+                with open(src, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        h.update(chunk)
+
+            content_hash = h.hexdigest()
+            formats = (MIPMAP_FORMAT,) if mipmaps else \
+                ('.png', config.texture_float_format)
+            cache_file = next((f for f in (self.dir / f"{content_hash}{suffix}"
+                                           for suffix in formats) if f.is_file()), None)
+            if not cache_file:
+                src_file = None
+                if data is not None:
+                    # src contains suffix of packed image
+                    src_file = src = self.dir / f"{content_hash}.{os.getpid()}.src{src}"
+                    src_file.write_bytes(data)
+
+                # converted file is written to temporary file first, so partly written
+                # file is never used by other processes
+                tmp_base = self.dir / f"{content_hash}.{os.getpid()}.tmp"
+                try:
+                    if mipmaps:
+                        args = [shutil.which('maketx'), '--oiio', str(src),
+                                '-o', f"{tmp_base}{MIPMAP_FORMAT}"]
+                    else:
+                        args = [binary_path, '-b', '--factory-startup', '--python-exit-code',
+                                '1', '--python-expr', CONVERT_SCRIPT, '--',
+                                str(src), str(tmp_base), config.texture_float_format]
+
+                    subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   check=True)
+
+                    suffix = next(suffix for suffix in formats
+                                  if Path(f"{tmp_base}{suffix}").is_file())
+                    cache_file = self.dir / f"{content_hash}{suffix}"
+                    os.replace(f"{tmp_base}{suffix}", cache_file)
+
+                finally:
+                    if src_file:
+                        src_file.unlink(missing_ok=True)
+                    for suffix in formats:
+                        Path(f"{tmp_base}{suffix}").unlink(missing_ok=True)
+
+                log("Image converted", src, cache_file)
+
+            with self._lock:
+                self._load_index()
+                self.index[key] = cache_file.name
+                self._use_file(cache_file)
+                self._save_index()
+                self._evict()
+
+            return cache_file
+
+        except (OSError, subprocess.CalledProcessError, StopIteration) as e:
+            log.error("Couldn't convert image", src, e)
+            return None
+
+    def _use_file(self, cache_file):
+        # mtime of cache file is used as last access time for LRU eviction
+        self.used_files.add(cache_file.name)
+        try:
+            os.utime(cache_file)
+        except OSError:
+            pass
+
+    def _evict(self):
+        files = []
+        for f in self.dir.iterdir():
+            if f.suffix not in CONVERTED_FORMATS:
+                continue
+
+            try:
+                files.append((f.stat().st_mtime, f.stat().st_size, f))
+            except OSError:
+                pass
+
+        size = sum(f[1] for f in files)
+        max_size = config.texture_cache_size * 1024 ** 2
+        if size <= max_size:
+            return
+
+        removed = set()
+        for _, file_size, f in sorted(files):
+            if size <= max_size:
+                break
+
+            # files used by current session can be referenced by exported materials
+            if f.name in self.used_files or '.tmp' in f.suffixes:
+                continue
+
+            f.unlink(missing_ok=True)
+            size -= file_size
+            removed.add(f.name)
+
+        if removed:
+            log("Textures evicted", len(removed))
+            self.index = {key: val for key, val in self.index.items() if val not in removed}
+
+    def _refresh(self):
+        """Timer callback: updates materials with placeholders which textures are converted"""
+        done_keys = {key for key in self.placeholder_keys if self.futures[key].done()}
+        if done_keys:
+            self.placeholder_keys -= done_keys
+            from ..export import material
+            material.update_outdated()
+
+        return REFRESH_INTERVAL if self.placeholder_keys else None
+
+
+texture_cache = TextureCache()
+
+# image name: file used for the image by last export, it is used for texture usage report
+image_files = {}
+
+
+def is_supported(suffix):
+    suffix = suffix.lower()
+    return suffix in SUPPORTED_FORMATS or suffix == config.texture_float_format
+
+
+_maketx_warned = False
+
+
+def use_mipmaps():
+    """Mip-mapped textures are generated by maketx of OpenImageIO, if it is available"""
+    global _maketx_warned
+
+    if not config.texture_mipmaps:
+        return False
+
+    if shutil.which('maketx'):
+        return True
+
+    if not _maketx_warned:
+        log.warn("maketx isn't found, mip-mapped textures aren't generated")
+        _maketx_warned = True
+
+    return False
+
+
+def get_texture_usage(image: bpy.types.Image, path: Path):
+    """
+    Returns (disk size, estimated memory size) of texture file used for image.
+    Memory size assumes that .hdr is loaded as float RGB, .exr as half float and other formats
+    as 8 bit, mip-mapped texture takes 4/3 of its full resolution size.
+    """
+    try:
+        disk_size = path.stat().st_size
+    except OSError:
+        return 0, 0
+
+    width, height = image.size
+    suffix = path.suffix.lower()
+    if suffix == ".hdr":
+        channels, channel_size = 3, 4
+    elif suffix in (".jpg", ".jpeg"):
+        channels, channel_size = 3, 1
+    else:
+        channels = image.channels
+        channel_size = 2 if suffix == ".exr" or (suffix == MIPMAP_FORMAT and image.is_float) \
+            else 1
+
+    memory_size = width * height * channels * channel_size
+    if suffix == MIPMAP_FORMAT:
+        memory_size = memory_size * 4 // 3
+
+    return disk_size, memory_size
+
+
+def get_placeholder_file():
+    path = get_temp_file(DEFAULT_FORMAT, "hdusd_placeholder")
+    if not path.is_file():
+        path.write_bytes(PLACEHOLDER_DATA)
+
+    return path
+
+
+def cache_image_file(image: bpy.types.Image, cache_check=True, allow_placeholder=False):
+    with profiler.timer('image', image.name_full):
+        path = _cache_image_file(image, cache_check, allow_placeholder)
+
+    image_files[image.name_full] = path
+    return path
+
+
+def _cache_image_file(image: bpy.types.Image, cache_check, allow_placeholder):
     image_path = Path(image.filepath_from_user())
     if not image.packed_file and image.source != 'GENERATED':
         if not image_path.is_file():
             log.warn("Image is missing", image, image_path)
             return None
 
-        if Path(image.filepath).suffix.lower() in SUPPORTED_FORMATS and \
-                f".{image.file_format.lower()}" in SUPPORTED_FORMATS:
-            return image_path
+    if texture_cache.needs_conversion(image):
+        return texture_cache.get(image, allow_placeholder)
 
+    if image.source != 'GENERATED':
+        return image_path
+
+    # generated images exist only in Blender data, so they are saved directly
     old_filepath = image.filepath_raw
     old_file_format = image.file_format
 
-    temp_path = get_temp_file(DEFAULT_FORMAT, image.name)
-    if cache_check and image.source != 'GENERATED' and temp_path.is_file():
-        return temp_path
+    suffix = config.texture_float_format if image.is_float else ".png"
+    temp_path = get_temp_file(suffix, image.name)
 
     image_source = image.source
     image.filepath_raw = str(temp_path)
-    image.file_format = BLENDER_DEFAULT_FORMAT
+    image.file_format = BLENDER_FORMATS[suffix]
 
     try:
         image.save()
@@ -58,14 +454,9 @@ def cache_image_file(image: bpy.types.Image, cache_check=True):
 
 
 def cache_image_file_path(image_path, cache_check=True):
-    if image_path.suffix.lower() in SUPPORTED_FORMATS:
+    if is_supported(image_path.suffix) and not use_mipmaps():
         return image_path
 
-    if cache_check:
-        temp_path = get_temp_file(DEFAULT_FORMAT, image_path.name)
-        if temp_path.is_file():
-            return temp_path
-
     image = bpy.data.images.load(str(image_path))
     try:
         return cache_image_file(image, cache_check)
@@ -26,10 +26,25 @@ FORMAT_STR = "%(asctime)s %(levelname)s %(name)s [%(thread)d]:  %(message)s"
 logger = logging.getLogger('hdusd')
 logger.setLevel(config.logging_level)
 
-file_handler = logging.handlers.RotatingFileHandler(PLUGIN_ROOT_DIR / 'hdusd.log',
-                                                    mode='w', encoding='utf-8', delay=True,
-                                                    backupCount=config.logging_backups)
-file_handler.doRollover()
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rolls over log files on first write instead of on addon import to speed up startup"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_rolled_over = False
+
+    def shouldRollover(self, record):
+        if not self.is_rolled_over:
+            self.is_rolled_over = True
+            return True
+
+        return super().shouldRollover(record)
+
+
+file_handler = RotatingFileHandler(PLUGIN_ROOT_DIR / 'hdusd.log',
+                                   mode='w', encoding='utf-8', delay=True,
+                                   backupCount=config.logging_backups)
 file_handler.setFormatter(logging.Formatter(FORMAT_STR))
 logger.addHandler(file_handler)
 
@@ -67,7 +67,7 @@ def set_param_value(mx_param, val, nd_type, nd_output=None):
 
     elif nd_type == 'filename':
         if isinstance(val, bpy.types.Image):
-            image_path = cache_image_file(val)
+            image_path = cache_image_file(val, allow_placeholder=True)
             if image_path:
                 mx_param.setValueString(str(image_path))
         else:
@@ -172,6 +172,62 @@ def get_file_prefix(mx_node, file_path):
     return file_prefix.resolve()
 
 
+def remove_unused_nodes(doc):
+    """
+    Removes nodes, nodegraph outputs and nodegraphs which aren't connected to material nodes
+    of document. Returns number of removed nodes.
+    """
+    used = set()
+    nodes = [node for node in doc.getNodes() if node.getType() == 'material']
+    while nodes:
+        node = nodes.pop()
+        if node.getNamePath() in used:
+            continue
+
+        used.add(node.getNamePath())
+        parent = node.getParent()
+        for mx_input in node.getInputs():
+            nodegraph_name = mx_input.getAttribute('nodegraph')
+            if nodegraph_name:
+                mx_nodegraph = parent.getNodeGraph(nodegraph_name)
+                mx_output = mx_nodegraph.getOutput(mx_input.getAttribute('output')) \
+                    if mx_nodegraph else None
+                if mx_output:
+                    used.add(mx_output.getNamePath())
+                    input_node = mx_nodegraph.getNode(mx_output.getNodeName())
+                else:
+                    input_node = None
+            else:
+                input_node = parent.getNode(mx_input.getNodeName()) \
+                    if mx_input.getNodeName() else None
+
+            if input_node:
+                nodes.append(input_node)
+
+    def remove(mx_element):
+        count = 0
+        # nested nodegraphs are created by get_nodegraph_by_path()
+        nodegraphs = mx_element.getNodeGraphs() if hasattr(mx_element, 'getNodeGraphs') else ()
+        for mx_nodegraph in nodegraphs:
+            count += remove(mx_nodegraph)
+            if not mx_nodegraph.getNodes():
+                mx_element.removeNodeGraph(mx_nodegraph.getName())
+
+        for node in mx_element.getNodes():
+            if node.getNamePath() not in used:
+                mx_element.removeNode(node.getName())
+                count += 1
+
+        if isinstance(mx_element, mx.NodeGraph):
+            for mx_output in mx_element.getOutputs():
+                if mx_output.getNamePath() not in used:
+                    mx_element.removeOutput(mx_output.getName())
+
+        return count
+
+    return remove(doc)
+
+
 def get_nodegraph_by_path(doc, ng_path, do_create=False):
     nodegraph_names = code_str(ng_path).split('/') if ng_path else ()
     mx_nodegraph = doc
@@ -0,0 +1,159 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Export profiler. It collects time of export phases of every object, material, image and world
+during engine sync and writes report to hdusd_profile.json and hdusd_profile.csv in $TEMP/hdusd
+dir. It is enabled by 'Profile Export' render setting or HDUSD_PROFILE environment variable.
+Time of each phase excludes time of nested phases, e.g. own 'object' time is time of USD authoring
+of object without time of its 'mesh' extraction and 'material' export.
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import temp_dir, time_str
+
+from . import logging
+log = logging.Log('utils.profiler')
+
+
+PHASES = ('object', 'mesh', 'material', 'image', 'world')
+REPORT_TOP_COUNT = 10
+REPORT_NAME = 'hdusd_profile'
+
+
+def report_path():
+    """Returns path of report without suffix, report is written to temp dir"""
+    return temp_dir() / REPORT_NAME
+
+
+class Record:
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0         # time without nested phases
+        self.total_time = 0.0   # time with nested phases
+
+
+class Profiler:
+    def __init__(self):
+        self.is_enabled = False
+        self.title = ""
+        self.start_time = 0.0
+        self.records = defaultdict(Record)     # (phase, name): Record
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self, title, is_enabled):
+        self.is_enabled = is_enabled or bool(int(os.environ.get('HDUSD_PROFILE', 0)))
+        if not self.is_enabled:
+            return
+
+        self.title = title
+        self.records.clear()
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        if not self.is_enabled:
+            return
+
+        self.is_enabled = False
+        total_time = time.perf_counter() - self.start_time
+        try:
+            self.write_report(total_time)
+        except OSError as e:
+            log.error("Couldn't write profile report", REPORT_NAME, e)
+
+    @contextmanager
+    def timer(self, phase, name):
+        """Measures time of export phase of named data"""
+        if not self.is_enabled:
+            yield
+            return
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        # item[0] collects time of nested phases
+        item = [0.0]
+        stack.append(item)
+        start_time = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            elapsed = time.perf_counter() - start_time
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+
+            with self._lock:
+                record = self.records[(phase, name)]
+                record.calls += 1
+                record.time += elapsed - item[0]
+                record.total_time += elapsed
+
+    def get_top(self, phase, count=REPORT_TOP_COUNT):
+        """Returns [(name, Record)] of the slowest data of the phase"""
+        items = [(name, record) for (ph, name), record in self.records.items() if ph == phase]
+        items.sort(key=lambda item: item[1].total_time, reverse=True)
+        return items[:count]
+
+    def write_report(self, total_time):
+        phases_time = {phase: sum(record.time for (ph, _), record in self.records.items()
+                                  if ph == phase)
+                       for phase in PHASES}
+
+        def top_list(phase):
+            return [{'name': name, 'time': record.total_time, 'calls': record.calls}
+                    for name, record in self.get_top(phase)]
+
+        report = {
+            'title': self.title,
+            'total_time': total_time,
+            'phases': phases_time,
+            'top_objects': top_list('object'),
+            'top_materials': top_list('material'),
+            'records': [{'phase': phase, 'name': name, 'calls': record.calls,
+                         'time': record.time, 'total_time': record.total_time}
+                        for (phase, name), record in self.records.items()],
+        }
+
+        path = report_path()
+        with open(path.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        with open(path.with_suffix('.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('phase', 'name', 'calls', 'time', 'total_time'))
+            for (phase, name), record in sorted(self.records.items(),
+                                                key=lambda item: -item[1].time):
+                writer.writerow((phase, name, record.calls, f"{record.time:.6f}",
+                                 f"{record.total_time:.6f}"))
+
+        log.info(f"Export profile of {self.title}: {time_str(total_time)}, "
+                 f"report: {path.with_suffix('.json')}")
+        log.info("Phases:", ", ".join(f"{phase} {time_str(t)}" for phase, t in phases_time.items()))
+        for phase in ('object', 'material'):
+            for name, record in self.get_top(phase):
+                log.info(f"  {phase} {name}: {time_str(record.total_time)}")
+
+
+profiler = Profiler()
@@ -17,6 +17,7 @@ import tempfile
 from pxr import Usd
 
 from . import get_temp_file
+from .. import config
 
 
 ID_NO_STAGE = -1
@@ -30,7 +31,8 @@ class CachedStage:
 
     def create(self):
         self.clear()
-        stage = Usd.Stage.CreateNew(str(get_temp_file(".usda")))
+        stage = Usd.Stage.CreateInMemory() if config.stage_format == 'memory' else \
+            Usd.Stage.CreateNew(str(get_temp_file(f".{config.stage_format}")))
         self.id = _stage_cache.Insert(stage).ToLongInt()
         self.is_owner = True
         return stage
@@ -14,9 +14,13 @@
 #********************************************************************
 import math
 
+import numpy as np
+
 import mathutils
 import bpy
 
+from pxr import Sdf, Vt
+
 
 def get_xform_transform(xform):
     transform = mathutils.Matrix(xform.GetLocalTransformation())
@@ -57,3 +61,59 @@ def get_renderer_percent_done(renderer):
         percent = 0.0
 
     return percent
+
+
+def get_renderer_samples(renderer):
+    """
+    Returns number of completed samples of renderer. Percent done is returned if render delegate
+    doesn't report samples, it also advances only when new samples are rendered.
+    """
+    stats = renderer.GetRenderStats()
+    samples = stats.get('numCompletedSamples')
+    if samples is None:
+        return get_renderer_percent_done(renderer)
+
+    return samples
+
+
+def define_prim_spec(stage, path, type_name):
+    """
+    Defines prim in edit target layer of stage with Sdf API. Unlike Usd API it can be used
+    inside Sdf.ChangeBlock, so several prims and attributes are authored with one change
+    notification. Parent prim has to be already defined.
+    """
+    prim_spec = Sdf.CreatePrimInLayer(stage.GetEditTarget().GetLayer(),
+                                      stage.GetEditTarget().MapToSpecPath(path))
+    prim_spec.specifier = Sdf.SpecifierDef
+    prim_spec.typeName = type_name
+    return prim_spec
+
+
+def set_attr_spec(prim_spec, name, type_name, value, variability=Sdf.VariabilityVarying,
+                  **info):
+    """Sets default value and metadata of attribute spec, creates it if needed"""
+    attr_spec = prim_spec.attributes[name] if name in prim_spec.attributes else None
+    if attr_spec and attr_spec.typeName != type_name:
+        prim_spec.RemoveProperty(attr_spec)
+        attr_spec = None
+
+    if not attr_spec:
+        attr_spec = Sdf.AttributeSpec(prim_spec, name, type_name, variability)
+
+    attr_spec.default = value
+    for key, val in info.items():
+        attr_spec.SetInfo(key, val)
+
+    return attr_spec
+
+
+def set_transform_spec(prim_spec, matrix):
+    """The same as UsdGeom.Xformable.MakeMatrixXform().Set(matrix) with Sdf API"""
+    set_attr_spec(prim_spec, 'xformOp:transform', Sdf.ValueTypeNames.Matrix4d, matrix)
+    set_attr_spec(prim_spec, 'xformOpOrder', Sdf.ValueTypeNames.TokenArray,
+                  Vt.TokenArray(['xformOp:transform']), Sdf.VariabilityUniform)
+
+
+def vt_array(array_type, values, dtype=np.float32):
+    """Converts numpy array to Vt array of array_type, e.g. Vt.Vec3fArray"""
+    return array_type.FromNumpy(np.ascontiguousarray(values, dtype=dtype))
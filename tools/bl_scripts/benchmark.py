@@ -0,0 +1,829 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+
+"""
+Blender's script for measuring USD Hydra addon export performance.
+Usage:
+    blender -b --factory-startup --python tools/bl_scripts/benchmark.py -- <case> [<case> ...]
+Run without cases to see the list of available ones.
+"""
+
+from pathlib import Path
+import os
+import contextlib
+import re
+import sys
+import time
+import subprocess
+
+import bpy
+
+sys.path.append(str((Path(__file__).parent.parent.parent / 'src').resolve()))
+
+import hdusd
+
+hdusd.register()
+bpy.context.scene.render.engine = 'HdUSD'
+
+from pxr import Usd, UsdGeom
+
+from hdusd.utils import get_temp_file
+
+
+CASES = {}
+
+
+def case(func):
+    CASES[func.__name__] = func
+    return func
+
+
+class Timer:
+    def __init__(self, title):
+        self.title = title
+        self.time = 0.0
+
+    def __enter__(self):
+        self.time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.time = time.perf_counter() - self.time
+        print(f"  {self.title}: {self.time:.3f} s")
+
+
+def report_file(title, path):
+    print(f"  {title}: {Path(path).stat().st_size / 1024 ** 2:.1f} MB")
+
+
+def clear_scene():
+    for obj in tuple(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+
+    for mesh in tuple(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+
+def create_grid(name, quads_number):
+    size = int(quads_number ** 0.5)
+    bpy.ops.mesh.primitive_grid_add(x_subdivisions=size + 1, y_subdivisions=size + 1, size=10.0)
+    obj = bpy.context.active_object
+    obj.name = name
+    return obj
+
+
+@case
+def mesh_export():
+    """Exports 5M quads mesh to .usdc with and without triangulation"""
+    from hdusd.export import object, mesh
+
+    clear_scene()
+    obj = create_grid("Grid", 5_000_000)
+    print(f"Mesh: {len(obj.data.polygons)} polygons, {len(obj.data.vertices)} vertices")
+
+    for triangulate in (True, False):
+        print("Triangulated" if triangulate else "Polygons")
+        mesh.mesh_cache.clear()
+        hdusd.config.mesh_triangulate = triangulate
+
+        stage_file = get_temp_file(".usdc")
+        stage = Usd.Stage.CreateNew(str(stage_file))
+        with Timer("export"):
+            object.sync(stage.GetPseudoRoot(), object.ObjectData.from_object(obj))
+
+        with Timer("save"):
+            stage.Save()
+
+        report_file("file size", stage_file)
+        usd_mesh = UsdGeom.Mesh(next(prim for prim in stage.Traverse()
+                                     if prim.GetTypeName() == 'Mesh'))
+        print(f"  faces: {len(usd_mesh.GetFaceVertexCountsAttr().Get())}")
+
+    hdusd.config.mesh_triangulate = False
+
+
+@case
+def primvars_compaction():
+    """Exports 1M quads smooth UV sphere with and without normals/UVs compaction"""
+    from hdusd.export import object, mesh
+
+    clear_scene()
+    bpy.ops.mesh.primitive_uv_sphere_add(segments=1000, ring_count=1000)
+    obj = bpy.context.active_object
+    bpy.ops.object.shade_smooth()
+
+    for compact in (False, True):
+        print("Compacted" if compact else "Face varying")
+        mesh.mesh_cache.clear()
+        hdusd.config.mesh_compact_primvars = compact
+
+        stage_file = get_temp_file(".usdc")
+        stage = Usd.Stage.CreateNew(str(stage_file))
+        with Timer("export"):
+            object.sync(stage.GetPseudoRoot(), object.ObjectData.from_object(obj))
+
+        stage.Save()
+        report_file("file size", stage_file)
+
+    hdusd.config.mesh_compact_primvars = True
+
+
+@case
+def animation_export():
+    """Exports 250 frames shot: per frame resync against one time sampled export"""
+    from hdusd.export import object, animation
+
+    clear_scene()
+    scene = bpy.context.scene
+    scene.frame_start, scene.frame_end = 1, 250
+
+    for i in range(100):
+        bpy.ops.mesh.primitive_monkey_add(location=(i % 10 * 3, i // 10 * 3, 0))
+        obj = bpy.context.active_object
+        if i % 2:
+            obj.keyframe_insert('location', frame=1)
+            obj.location.z = 10.0
+            obj.keyframe_insert('location', frame=250)
+
+    frames = range(scene.frame_start, scene.frame_end + 1)
+
+    def get_objects():
+        yield from object.ObjectData.depsgraph_objects(bpy.context.evaluated_depsgraph_get())
+
+    print("Per frame resync")
+    with Timer("export"):
+        for frame in frames:
+            scene.frame_set(frame)
+            stage = Usd.Stage.CreateInMemory()
+            for obj_data in get_objects():
+                object.sync(stage.GetPseudoRoot(), obj_data)
+
+    print("Time samples")
+    scene.frame_set(scene.frame_start)
+    stage_file = get_temp_file(".usdc")
+    stage = Usd.Stage.CreateNew(str(stage_file))
+    with Timer("export"):
+        for obj_data in get_objects():
+            object.sync(stage.GetPseudoRoot(), obj_data)
+
+        animation.sync(stage.GetPseudoRoot(), frames, scene.frame_start, scene.frame_set,
+                       get_objects)
+
+    stage.Save()
+    report_file("file size", stage_file)
+
+
+@case
+def stage_formats():
+    """Computes USD nodes chain with 1M triangles mesh for every intermediate stage format"""
+    from hdusd.utils import temp_pid_dir
+
+    clear_scene()
+    obj = create_grid("Grid", 500_000)
+
+    nodetree = bpy.data.node_groups.new("Benchmark", 'hdusd.USDTree')
+    nodetree.no_update_call(nodetree.nodes.clear)
+    chain = []
+    for node_type in ('usd.BlenderDataNode', 'usd.TransformNode', 'usd.RootNode',
+                      'usd.FilterNode', 'usd.HydraRenderNode'):
+        node = nodetree.no_update_call(nodetree.nodes.new, node_type)
+        if chain:
+            nodetree.no_update_call(nodetree.links.new, chain[-1].outputs[0], node.inputs[0])
+        chain.append(node)
+
+    nodetree.no_update_call(setattr, chain[0], 'data', 'OBJECT')
+    nodetree.no_update_call(setattr, chain[0], 'object', obj)
+
+    for stage_format in ('usda', 'usdc', 'memory'):
+        print(stage_format)
+        hdusd.config.stage_format = stage_format
+        files_size = sum(f.stat().st_size for f in temp_pid_dir().iterdir())
+        with Timer("compute"):
+            nodetree.reset()
+
+        files_size = sum(f.stat().st_size for f in temp_pid_dir().iterdir()) - files_size
+        print(f"  temp files: {files_size / 1024 ** 2:.1f} MB")
+
+    hdusd.config.stage_format = 'usdc'
+    bpy.data.node_groups.remove(nodetree)
+
+
+@case
+def merge_usd_files():
+    """Computes Merge of 8 large USD files in main thread and in thread pool"""
+    files = []
+    for i in range(8):
+        stage_file = get_temp_file(".usda")
+        stage = Usd.Stage.CreateNew(str(stage_file))
+        for j in range(20):
+            mesh = UsdGeom.Mesh.Define(stage, f"/File{i}/Mesh{j}")
+            mesh.CreatePointsAttr([(x * 0.01, j, i) for x in range(50_000)])
+
+        stage.Save()
+        files.append(stage_file)
+
+    report_file("file size", files[0])
+
+    nodetree = bpy.data.node_groups.new("Benchmark", 'hdusd.USDTree')
+    merge_node = nodetree.no_update_call(nodetree.nodes.new, 'usd.MergeNode')
+    merge_node.inputs_number = len(files)
+    output_node = nodetree.no_update_call(nodetree.nodes.new, 'usd.HydraRenderNode')
+    nodetree.no_update_call(nodetree.links.new, merge_node.outputs[0], output_node.inputs[0])
+    for i, stage_file in enumerate(files):
+        node = nodetree.no_update_call(nodetree.nodes.new, 'usd.UsdFileNode')
+        nodetree.no_update_call(setattr, node, 'filename', str(stage_file))
+        nodetree.no_update_call(nodetree.links.new, node.outputs[0], merge_node.inputs[i])
+
+    threads = hdusd.config.node_compute_threads
+    for threads_number in (1, 8):
+        print(f"Threads: {threads_number}")
+        hdusd.config.node_compute_threads = threads_number
+        # releasing opened layers, otherwise they are reused by Usd.Stage.Open()
+        for node in nodetree.nodes:
+            node.free()
+
+        with Timer("compute"):
+            nodetree.reset()
+
+    hdusd.config.node_compute_threads = threads
+    bpy.data.node_groups.remove(nodetree)
+
+
+@case
+def node_relink():
+    """Checks that relinking between nodes of equal versions recomputes dependent nodes"""
+    from hdusd.usd_nodes import scheduler
+
+    clear_scene()
+    objects = []
+    for name in ("First", "Second"):
+        bpy.ops.mesh.primitive_cube_add()
+        obj = bpy.context.active_object
+        obj.name = name
+        objects.append(obj)
+
+    nodetree = bpy.data.node_groups.new("Benchmark", 'hdusd.USDTree')
+    nodetree.no_update_call(nodetree.nodes.clear)
+    data_nodes = []
+    for obj in objects:
+        node = nodetree.no_update_call(nodetree.nodes.new, 'usd.BlenderDataNode')
+        nodetree.no_update_call(setattr, node, 'data', 'OBJECT')
+        nodetree.no_update_call(setattr, node, 'object', obj)
+        data_nodes.append(node)
+
+    output_node = nodetree.no_update_call(nodetree.nodes.new, 'usd.HydraRenderNode')
+    nodetree.no_update_call(nodetree.links.new, data_nodes[0].outputs[0], output_node.inputs[0])
+    nodetree.reset()
+
+    versions = [scheduler.get(nodetree).get_state(node).version for node in data_nodes]
+    print(f"  data node versions: {versions}")
+    assert versions[0] == versions[1]
+
+    for node, obj in zip(reversed(data_nodes), reversed(objects)):
+        with Timer("relink"):
+            nodetree.links.new(node.outputs[0], output_node.inputs[0])
+
+        prim_names = {prim.GetName() for prim in output_node.cached_stage().Traverse()}
+        assert obj.name in prim_names, f"{obj.name} is not in output stage: {prim_names}"
+
+    print("  output stage follows relinked node")
+    bpy.data.node_groups.remove(nodetree)
+    clear_scene()
+
+
+@case
+def instancing():
+    """Computes Instancing node with 10k, 100k and 1M instances in Xforms and Point Instancer modes"""
+    clear_scene()
+    bpy.ops.mesh.primitive_monkey_add()
+    instance_obj = bpy.context.active_object
+
+    nodetree = bpy.data.node_groups.new("Benchmark", 'hdusd.USDTree')
+    data_node = nodetree.no_update_call(nodetree.nodes.new, 'usd.BlenderDataNode')
+    instancing_node = nodetree.no_update_call(nodetree.nodes.new, 'usd.InstancingNode')
+    nodetree.no_update_call(nodetree.links.new, data_node.outputs[0], instancing_node.inputs[0])
+    nodetree.no_update_call(setattr, data_node, 'data', 'OBJECT')
+    nodetree.no_update_call(setattr, data_node, 'object', instance_obj)
+
+    for count in (10_000, 100_000, 1_000_000):
+        grid = create_grid(f"Grid{count}", count)
+        nodetree.no_update_call(setattr, instancing_node, 'object', grid)
+        # Xforms mode takes minutes for bigger numbers of instances
+        for mode in ('XFORMS', 'POINT_INSTANCER') if count <= 10_000 else ('POINT_INSTANCER',):
+            print(f"{len(grid.data.vertices)} instances, {mode}")
+            nodetree.no_update_call(setattr, instancing_node, 'mode', mode)
+            with Timer("compute"):
+                nodetree.reset()
+
+            stage = instancing_node.cached_stage()
+            print(f"  prims: {sum(1 for _ in stage.Traverse())}")
+
+    bpy.data.node_groups.remove(nodetree)
+
+
+@case
+def particles_export():
+    """Exports 100k particle instances with and without PointInstancer"""
+    from hdusd.export import object, mesh
+
+    clear_scene()
+    bpy.ops.mesh.primitive_monkey_add()
+    instance_obj = bpy.context.active_object
+    instance_obj.hide_render = True
+
+    bpy.ops.mesh.primitive_plane_add(size=100.0)
+    emitter = bpy.context.active_object
+    settings = emitter.modifiers.new("Particles", 'PARTICLE_SYSTEM').particle_system.settings
+    settings.count = 100_000
+    settings.frame_start = settings.frame_end = 1
+    settings.render_type = 'OBJECT'
+    settings.instance_object = instance_obj
+    bpy.context.scene.frame_set(1)
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for use_instancing in (False, True):
+        print("PointInstancer" if use_instancing else "Xform per instance")
+        mesh.mesh_cache.clear()
+        hdusd.config.export_instancing = use_instancing
+
+        stage_file = get_temp_file(".usdc")
+        stage = Usd.Stage.CreateNew(str(stage_file))
+        with Timer("export"):
+            for obj_data in object.ObjectData.depsgraph_objects(depsgraph):
+                object.sync(stage.GetPseudoRoot(), obj_data)
+
+        stage.Save()
+        report_file("file size", stage_file)
+        print(f"  prims: {sum(1 for _ in stage.Traverse())}")
+
+    hdusd.config.export_instancing = True
+
+
+@case
+def shared_materials():
+    """Exports 1000 cubes with one material with per object and shared material prims"""
+    from hdusd.export import object, mesh, material
+
+    clear_scene()
+    mat = bpy.data.materials.new("Shared")
+    mat.use_nodes = True
+    for i in range(1000):
+        bpy.ops.mesh.primitive_cube_add(size=1.0, location=(i % 32 * 2, i // 32 * 2, 0))
+        bpy.context.active_object.data.materials.append(mat)
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for shared in (False, True):
+        print("Shared /Materials" if shared else "Per object materials")
+        mesh.mesh_cache.clear()
+        material.mx_cache.clear()
+
+        stage = Usd.Stage.CreateInMemory()
+        with Timer("export"):
+            for obj_data in object.ObjectData.depsgraph_objects(depsgraph):
+                object.sync(stage.GetPseudoRoot(), obj_data, shared_materials=shared)
+
+        # every Material prim is a separate shader network for render delegate to compile
+        prims = list(stage.Traverse())
+        print(f"  materials: {sum(1 for prim in prims if prim.GetTypeName() == 'Material')}")
+        print(f"  prims: {len(prims)}")
+
+    # material is exported once, the rest of sync is checking of its state for every binding
+    materials_prim = material.get_materials_prim(stage.GetPseudoRoot())
+    for use_scope in (False, True):
+        with Timer("1000 bindings, state hashed once" if use_scope else "1000 bindings"):
+            with material.mx_cache.sync_scope() if use_scope else contextlib.nullcontext():
+                for obj in bpy.data.objects:
+                    material.sync(materials_prim, mat, obj)
+
+
+@case
+def materials_prepare():
+    """Exports 400 materials with MaterialX pre-pass, reports time of writing MaterialX files"""
+    import MaterialX as mx
+    from hdusd.export import material
+
+    materials = []
+    for i in range(400):
+        mat = bpy.data.materials.new(f"Material{i}")
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        bsdf = nodes['Principled BSDF']
+        bsdf.inputs['Base Color'].default_value = (i / 400, 0.5, 0.5, 1.0)
+        noise = nodes.new('ShaderNodeTexNoise')
+        mat.node_tree.links.new(noise.outputs['Fac'], bsdf.inputs['Roughness'])
+        materials.append(mat)
+
+    material.mx_cache.clear()
+    with Timer("prepare"):
+        material.mx_cache.prepare(materials)
+
+    # the part of prepare which could be moved to thread pool
+    docs = [mat.hdusd.export(None) for mat in materials]
+    with Timer("write files"):
+        for doc in docs:
+            mx.writeToXmlFile(doc, str(get_temp_file(".mtlx")))
+
+    with Timer("prepare cached"):
+        material.mx_cache.prepare(materials)
+    for mat in materials:
+        bpy.data.materials.remove(mat)
+
+
+@case
+def mx_node_count():
+    """Compares MaterialX node count of materials with and without nodes optimization"""
+    mat = bpy.data.materials.new("MathNodes")
+    mat.use_nodes = True
+    nodes, links = mat.node_tree.nodes, mat.node_tree.links
+    bsdf = nodes['Principled BSDF']
+    texture = nodes.new('ShaderNodeTexImage')
+    texture.image = bpy.data.images.new("Generated", 16, 16)
+    # the same math repeated, operations with identity values
+    for input_name, operation, value in (('Roughness', 'MULTIPLY', 1.0),
+                                         ('Metallic', 'MULTIPLY', 1.0),
+                                         ('Specular', 'ADD', 0.0),
+                                         ('Clearcoat', 'POWER', 2.0),
+                                         ('Sheen', 'POWER', 2.0)):
+        math = nodes.new('ShaderNodeMath')
+        math.operation = operation
+        math.inputs[1].default_value = value
+        links.new(texture.outputs['Alpha'], math.inputs[0])
+        links.new(math.outputs[0], bsdf.inputs[input_name])
+
+    invert = nodes.new('ShaderNodeInvert')
+    links.new(texture.outputs['Color'], invert.inputs['Color'])
+    links.new(invert.outputs[0], bsdf.inputs['Base Color'])
+
+    def count_nodes(element):
+        return len(element.getNodes()) + sum(count_nodes(ng) for ng in element.getNodeGraphs()) \
+            if hasattr(element, 'getNodeGraphs') else len(element.getNodes())
+
+    materials = [m for m in bpy.data.materials if m.use_nodes]
+    optimize = hdusd.config.mx_optimize_nodes
+    for m in materials:
+        counts = []
+        for optimize_nodes in (False, True):
+            hdusd.config.mx_optimize_nodes = optimize_nodes
+            doc = m.hdusd.export(None)
+            counts.append(count_nodes(doc) if doc else 0)
+
+        print(f"  {m.name}: {counts[0]} -> {counts[1]} nodes")
+
+    hdusd.config.mx_optimize_nodes = optimize
+    bpy.data.materials.remove(mat)
+
+
+@case
+def mx_optimize_equivalence():
+    """Checks that MaterialX export with nodes optimization evaluates to the same result"""
+    import hashlib
+    import math
+
+    mat = bpy.data.materials.new("FoldedNodes")
+    mat.use_nodes = True
+    nodes, links = mat.node_tree.nodes, mat.node_tree.links
+    bsdf = nodes['Principled BSDF']
+    texture = nodes.new('ShaderNodeTexImage')
+    texture.image = bpy.data.images.new("Generated", 16, 16)
+
+    def add_math(operation, value, input_name=None, source=texture.outputs['Alpha']):
+        node = nodes.new('ShaderNodeMath')
+        node.operation = operation
+        node.inputs[1].default_value = value
+        links.new(source, node.inputs[0])
+        if input_name:
+            links.new(node.outputs[0], bsdf.inputs[input_name])
+        return node
+
+    # operations with identity values
+    add_math('MULTIPLY', 1.0, 'Roughness')
+    add_math('ADD', 0.0, 'Specular')
+    add_math('POWER', 1.0, 'Transmission')
+    add_math('DIVIDE', 1.0, 'IOR', add_math('SUBTRACT', 0.0).outputs[0])
+    # shared subgraphs: the same math repeated and chained
+    add_math('POWER', 2.0, 'Clearcoat')
+    add_math('MULTIPLY', 0.5, 'Sheen', add_math('POWER', 2.0).outputs[0])
+    add_math('MULTIPLY', 0.5, 'Metallic', add_math('POWER', 2.0).outputs[0])
+
+    # mix nodes with identity factors
+    for blend_type, fac, input_name in (('MIX', 1.0, 'Base Color'),
+                                        ('MULTIPLY', 0.0, 'Subsurface Color'),
+                                        ('ADD', 1.0, 'Emission')):
+        mix = nodes.new('ShaderNodeMixRGB')
+        mix.blend_type = blend_type
+        mix.inputs['Fac'].default_value = fac
+        links.new(texture.outputs['Color'], mix.inputs['Color1'])
+        links.new(texture.outputs['Color'], mix.inputs['Color2'])
+        links.new(mix.outputs[0], bsdf.inputs[input_name])
+
+    sizes = {'float': 1, 'vector2': 2, 'color3': 3, 'vector3': 3, 'color4': 4, 'vector4': 4}
+    binary_ops = {
+        'add': lambda a, b: a + b,
+        'subtract': lambda a, b: a - b,
+        'multiply': lambda a, b: a * b,
+        'divide': lambda a, b: a / b if not math.isclose(b, 0.0) else 0.0,
+        'power': lambda a, b: math.copysign(abs(a) ** b, a),
+        'min': min,
+        'max': max,
+    }
+
+    def input_value(parent, mx_input):
+        nodegraph_name = mx_input.getAttribute('nodegraph')
+        if nodegraph_name:
+            mx_nodegraph = parent.getNodeGraph(nodegraph_name)
+            mx_output = mx_nodegraph.getOutput(mx_input.getAttribute('output'))
+            return node_value(mx_nodegraph, mx_nodegraph.getNode(mx_output.getNodeName()),
+                              mx_output.getAttribute('output'))
+
+        if mx_input.getNodeName():
+            return node_value(parent, parent.getNode(mx_input.getNodeName()),
+                              mx_input.getAttribute('output'))
+
+        value = mx_input.getValue()
+        if isinstance(value, (bool, int, float)):
+            return (float(value),)
+        if hasattr(value, 'asTuple'):
+            return tuple(map(float, value.asTuple()))
+        return str(value)
+
+    def node_value(parent, mx_node, output):
+        """
+        Evaluates arithmetic nodes, other nodes are substituted with pseudo values
+        which depend only on node category, type and values of inputs
+        """
+        inputs = {mx_input.getName(): input_value(parent, mx_input)
+                  for mx_input in mx_node.getInputs()}
+        op = binary_ops.get(mx_node.getCategory())
+        if op and set(inputs) == {'in1', 'in2'}:
+            in1, in2 = inputs['in1'], inputs['in2']
+            size = max(len(in1), len(in2))
+            in1 = in1 * size if len(in1) == 1 else in1
+            in2 = in2 * size if len(in2) == 1 else in2
+            return tuple(map(op, in1, in2))
+
+        key = repr((mx_node.getCategory(), mx_node.getType(), output,
+                    sorted((name, tuple(round(v, 5) for v in value)
+                            if isinstance(value, tuple) else value)
+                           for name, value in inputs.items())))
+        digest = hashlib.sha1(key.encode()).digest()
+        return tuple(0.1 + digest[i] / 255 for i in range(sizes.get(mx_node.getType(), 1)))
+
+    def material_values(doc):
+        return {mx_node.getName(): input_value(doc, mx_input)
+                for mx_node in doc.getNodes() if mx_node.getType() == 'surfaceshader'
+                for mx_input in mx_node.getInputs()} if doc else {}
+
+    optimize = hdusd.config.mx_optimize_nodes
+    try:
+        for m in [m for m in bpy.data.materials if m.use_nodes]:
+            docs = []
+            for optimize_nodes in (False, True):
+                hdusd.config.mx_optimize_nodes = optimize_nodes
+                docs.append(m.hdusd.export(None))
+
+            values = [material_values(doc) for doc in docs]
+            assert values[0].keys() == values[1].keys(), m.name
+            for name, value in values[0].items():
+                optimized = values[1][name]
+                assert value == optimized if isinstance(value, str) else \
+                    len(value) == len(optimized) and \
+                    all(math.isclose(a, b, rel_tol=1e-5, abs_tol=1e-6)
+                        for a, b in zip(value, optimized)), (m.name, name, value, optimized)
+
+            print(f"  {m.name}: {len(values[0])} shader inputs are equal")
+
+    finally:
+        hdusd.config.mx_optimize_nodes = optimize
+        bpy.data.materials.remove(mat)
+
+
+@case
+def mx_slider():
+    """Measures latency of input value change of 200 nodes MaterialX node tree"""
+    from hdusd.export import material
+    from hdusd.utils import mx as mx_utils
+
+    mat = bpy.data.materials.new("Slider")
+    tree = bpy.data.node_groups.new("MX_Slider", type='hdusd.MxNodeTree')
+    tree.create_basic_nodes()
+    mat.hdusd.mx_node_tree = tree
+    surface = next(node for node in tree.nodes
+                   if node.bl_idname == 'hdusd.MxNode_PBR_standard_surface')
+
+    nodes = []
+    for i in range(200):
+        node = tree.nodes.new('hdusd.MxNode_STD_multiply')
+        node.data_type = 'float'
+        if nodes:
+            tree.links.new(nodes[-1].outputs[0], node.inputs['in1'])
+        nodes.append(node)
+
+    tree.links.new(nodes[-1].outputs[0], surface.inputs['base'])
+
+    stage = Usd.Stage.CreateInMemory()
+    root = stage.GetPseudoRoot()
+    material.sync(material.get_materials_prim(root), mat, None)
+
+    slider = nodes[0]
+    mx_node_name = mx_utils.get_node_name_by_node_path(slider.mx_node_path)
+    changes = 50
+    for patch in (False, True):
+        with Timer("patched inputs" if patch else "full update") as timer:
+            for i in range(changes):
+                val = 1.0 + i / changes
+                if patch:
+                    # MxNode.update_prop() patches cached document
+                    slider.nd_float_in_in2 = val
+                    material.sync_update_inputs(root, mat, mx_node_name, {'in2': (val, 'float')})
+                else:
+                    tree.no_update_call(setattr, slider, 'nd_float_in_in2', val)
+                    tree.update_()
+                    material.sync_update_all(root, mat)
+
+        print(f"  per change: {timer.time / changes * 1000:.1f} ms")
+
+    bpy.data.materials.remove(mat)
+    bpy.data.node_groups.remove(tree)
+
+
+@case
+def usd_authoring():
+    """Compares authoring throughput of 10000 objects with Usd API and Sdf API in change blocks"""
+    from pxr import Sdf, Gf, Vt
+    from hdusd.export import mesh
+    from hdusd.utils import usd as usd_utils
+
+    clear_scene()
+    bpy.ops.mesh.primitive_cube_add(size=1.0)
+    data = mesh.MeshData.init_from_mesh(bpy.context.active_object.data)
+    count = 10000
+    matrices = [Gf.Matrix4d(1.0).SetTranslate(Gf.Vec3d(i % 100, i // 100, 0.0))
+                for i in range(count)]
+
+    def author_usd(stage):
+        for i, matrix in enumerate(matrices):
+            xform = UsdGeom.Xform.Define(stage, f"/Object{i}")
+            xform.MakeMatrixXform().Set(matrix)
+            usd_mesh = UsdGeom.Mesh.Define(stage, f"/Object{i}/Mesh")
+            usd_mesh.CreateDoubleSidedAttr(True)
+            usd_mesh.CreatePointsAttr(data.vertices)
+            usd_mesh.CreateFaceVertexIndicesAttr(data.vertex_indices)
+            usd_mesh.CreateFaceVertexCountsAttr(data.num_face_vertices)
+            usd_mesh.CreateSubdivisionSchemeAttr(UsdGeom.Tokens.none)
+            usd_mesh.CreateNormalsAttr(data.normals)
+            usd_mesh.SetNormalsInterpolation(data.normal_interpolation)
+
+    def author_sdf(stage):
+        for i, matrix in enumerate(matrices):
+            # the same as export.object.sync() and export.mesh.sync()
+            with Sdf.ChangeBlock():
+                prim_spec = usd_utils.define_prim_spec(stage, f"/Object{i}", 'Xform')
+                usd_utils.set_transform_spec(prim_spec, matrix)
+
+            with Sdf.ChangeBlock():
+                mesh._write_mesh_spec(stage, f"/Object{i}/Mesh", data)
+
+    def author_sdf_one_block(stage):
+        with Sdf.ChangeBlock():
+            for i, matrix in enumerate(matrices):
+                prim_spec = usd_utils.define_prim_spec(stage, f"/Object{i}", 'Xform')
+                usd_utils.set_transform_spec(prim_spec, matrix)
+                mesh._write_mesh_spec(stage, f"/Object{i}/Mesh", data)
+
+    for title, author in (("Usd API", author_usd),
+                          ("Sdf API, change block per prim", author_sdf),
+                          ("Sdf API, one change block", author_sdf_one_block)):
+        stage = Usd.Stage.CreateInMemory()
+        with Timer(title) as timer:
+            author(stage)
+
+        print(f"  {count / timer.time:.0f} objects/s, prims: {len(list(stage.Traverse()))}")
+
+    clear_scene()
+
+
+@case
+def startup():
+    """Measures Blender startup time with and without addon and reports slowest imports"""
+    src_dir = Path(hdusd.__file__).parent.parent
+    expr = f"import sys; sys.path.append(r'{src_dir}'); import hdusd; hdusd.register()"
+    env = {**os.environ, 'PYTHONPROFILEIMPORTTIME': '1'}
+
+    def run(title, *args):
+        with Timer(title):
+            return subprocess.run([bpy.app.binary_path, '-b', '--factory-startup',
+                                   '--python-use-system-env', *args],
+                                  env=env, capture_output=True, text=True)
+
+    run("startup without addon", '--python-expr', "pass")
+    res = run("startup with addon", '--python-expr', expr)
+
+    # lines of python -X importtime report: "import time: self [us] | cumulative | package"
+    imports = []
+    for line in res.stderr.splitlines():
+        m = re.fullmatch(r"import time:\s*(\d+) \|\s*(\d+) \|\s*(\S+)", line)
+        if m:
+            imports.append((int(m[2]), int(m[1]), m[3]))
+
+    addon_import = next((item for item in imports if item[2] == 'hdusd'), None)
+    if addon_import:
+        print(f"  import hdusd: {addon_import[0] / 1e6:.3f} s")
+
+    print("  Slowest imports (cumulative, self):")
+    for cumulative, self_time, name in sorted(imports, reverse=True)[:20]:
+        print(f"    {name}: {cumulative / 1e6:.3f} s, {self_time / 1e6:.3f} s")
+
+
+@case
+def mx_nodedefs():
+    """Measures addon register time and first material export with nodedef index and XML"""
+    from hdusd.mx_nodes.nodes import get_mx_node_classes, nodedef_index
+
+    with Timer("register"):
+        hdusd.unregister()
+        hdusd.register()
+
+    mat = bpy.data.materials.new("Nodedefs")
+    mat.use_nodes = True
+    for use_index in (True, False):
+        print("Index" if use_index else "XML libraries")
+        nodedef_index._indexes.clear()
+        for cls in get_mx_node_classes():
+            if not use_index:
+                nodedef_index._indexes[cls.__module__] = None
+            for val in cls._data_types.values():
+                val['nd'] = None
+
+        with Timer("first material export"):
+            mat.hdusd.export(None)
+
+        with Timer("all nodedefs"):
+            for cls in get_mx_node_classes():
+                tuple(cls.get_nodedefs())
+
+    nodedef_index._indexes.clear()
+    bpy.data.materials.remove(mat)
+
+
+@case
+def final_render():
+    """Measures final render time and CPU time spent with different result update intervals"""
+    from hdusd import config
+
+    clear_scene()
+    create_grid("Grid", 10000)
+    bpy.ops.object.camera_add(location=(0.0, 0.0, 20.0))
+    scene = bpy.context.scene
+    scene.camera = bpy.context.active_object
+    scene.render.resolution_x, scene.render.resolution_y = 1920, 1080
+    scene.render.resolution_percentage = 100
+
+    update_interval = config.final_update_interval
+    for interval in (0.0, update_interval):
+        print(f"Update interval: {interval} s")
+        config.final_update_interval = interval
+        cpu_time = time.process_time()
+        with Timer("render"):
+            bpy.ops.render.render()
+
+        print(f"  cpu: {time.process_time() - cpu_time:.3f} s")
+
+    config.final_update_interval = update_interval
+
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_z = view_layer.use_pass_normal = True
+    view_layer.use_pass_diffuse_color = view_layer.use_pass_object_index = True
+    view_layer.hdusd.use_pass_variance = True
+    with Timer("render with AOVs"):
+        bpy.ops.render.render()
+
+    view_layer.use_pass_z = view_layer.use_pass_normal = False
+    view_layer.use_pass_diffuse_color = view_layer.use_pass_object_index = False
+    view_layer.hdusd.use_pass_variance = False
+    clear_scene()
+
+
+def main(*cases):
+    if not cases:
+        for name, func in CASES.items():
+            print(f"{name}: {func.__doc__}")
+        return
+
+    for name in cases:
+        print(f"=== {name} ===")
+        CASES[name]()
+
+
+main(*(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else ()))
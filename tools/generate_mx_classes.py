@@ -15,6 +15,7 @@
 import os
 import re
 import sys
+import json
 from pathlib import Path
 from collections import defaultdict
 
@@ -280,6 +281,26 @@ class {class_name}(MxNode):
     return '\n'.join(code_strings)
 
 
+def generate_nodedef_index(nodedefs):
+    """
+    Returns index of nodedefs used by generated classes, it is loaded by MxNode instead of
+    parsing library .mtlx file
+    """
+    def port_data(mx_port):
+        return {
+            'name': mx_port.getName(),
+            'type': mx_port.getType(),
+            'attrs': {name: mx_port.getAttribute(name) for name in mx_port.getAttributeNames()
+                      if name not in ('name', 'type')},
+        }
+
+    return {nd.getName(): {
+        'node': nd.getNodeString(),
+        'inputs': [port_data(mx_input) for mx_input in nd.getInputs()],
+        'outputs': [port_data(mx_output) for mx_output in nd.getOutputs()],
+    } for nd in nodedefs}
+
+
 def generate_classes_code(file_path, prefix, category):
     IGNORE_NODEDEF_DATA_TYPE = ('matrix33', 'matrix44', 'matrix33FA', 'matrix44FA')
 
@@ -335,7 +356,9 @@ FILE_PATH = r"{file_path.relative_to(libs_dir)}"
 
     # creating MxNode types
     mx_node_class_names = []
+    index_nodedefs = []
     for nodedefs_by_node in node_def_classes_by_node.values():
+        index_nodedefs.extend(nodedefs_by_node)
         code_strings.append(generate_mx_node_class_code(nodedefs_by_node, prefix, category))
         mx_node_class_names.append(get_mx_node_class_name(nodedefs_by_node[0], prefix))
 
@@ -343,13 +366,13 @@ FILE_PATH = r"{file_path.relative_to(libs_dir)}"
 mx_node_classes = [{', '.join(mx_node_class_names)}]
 """)
 
-    return '\n'.join(code_strings)
+    return '\n'.join(code_strings), generate_nodedef_index(index_nodedefs)
 
 
 def main():
     gen_code_dir = repo_dir / "src/hdusd/mx_nodes/nodes"
 
-    for f in gen_code_dir.glob("gen_*.py"):
+    for f in (*gen_code_dir.glob("gen_*.py"), *gen_code_dir.glob("gen_*.json")):
         f.unlink()
 
     files = [
@@ -366,8 +389,9 @@ def main():
         module_file = gen_code_dir / f"{module_name}.py"
 
         print(f"Generating {module_file} from {file_path}")
-        module_code = generate_classes_code(file_path, prefix, category)
+        module_code, nodedef_index = generate_classes_code(file_path, prefix, category)
         module_file.write_text(module_code)
+        module_file.with_suffix(".json").write_text(json.dumps(nodedef_index, indent=1))
 
 
 if __name__ == "__main__":